@@ -0,0 +1,228 @@
+"""
+Text-to-speech backends used by the tts module.
+
+A backend turns one chunk of text into MP3 data. Each backend describes
+itself with a BackendCapabilities tuple (the longest chunk it takes, how many
+chunks it can synthesize at once and which languages it speaks), which the
+synthesis engine uses to size chunks and its worker pool. GTTSBackend speaks
+through Google Text-to-Speech; StubBackend is a local, deterministic engine
+for benchmarks, load tests and offline environments.
+"""
+import base64
+from io import BytesIO
+import math
+import re
+import threading
+import time
+from typing import NamedTuple, Optional, FrozenSet
+
+from gtts import gTTS, gTTSError
+from gtts.lang import tts_langs, _fallback_deprecated_lang
+import requests
+
+from transport import shared_transport, EVENT_THROTTLED
+
+# MPEG-2 Layer III, 24 kHz, 32 kbps, mono: the format gTTS produces.
+MP3_SAMPLE_RATE = 24000
+MP3_SAMPLES_PER_FRAME = 576
+MP3_FRAME_BYTES = 96
+# Frame header (no CRC, no padding, original) followed by zeroed side information and main data,
+# which decoders play as silence.
+SILENT_MP3_FRAME = bytes([0xFF, 0xF3, 0x44, 0xC4]) + bytes(MP3_FRAME_BYTES - 4)
+
+# Seconds to wait for each Google Text-to-Speech response; timeouts are retried.
+GTTS_TIMEOUT = 30
+# The base64 audio in a Google Text-to-Speech response line (as matched by gTTS).
+_GTTS_AUDIO_RE = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+
+class BackendCapabilities(NamedTuple):
+    """What a backend accepts: the longest chunk, concurrent syntheses, and languages (None for any)."""
+    max_chunk_chars: int
+    max_concurrency: int
+    languages: Optional[FrozenSet[str]] = None
+
+
+class TTSBackend:
+    """
+    The interface of a text-to-speech backend.
+
+    Subclasses set `name` and `capabilities` and implement synthesize().
+    `voice` holds the settings that change the audio for a given text; it is
+    part of the audio cache key together with `name`.
+
+    Listeners are told when the engine throttles or fails a request that is
+    then retried (transport.EVENT_THROTTLED and transport.EVENT_RETRY), so
+    callers can slow down.
+    """
+    name = None
+    capabilities = None
+    voice = {}
+
+    def __init__(self):
+        self._listeners = []
+
+    def synthesize(self, chunk, lang):
+        """Returns the MP3 data of `chunk` spoken in `lang`."""
+        raise NotImplementedError
+
+    def add_listener(self, listener):
+        """Calls listener(event) for each throttled or retried request."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event):
+        for listener in list(self._listeners):
+            listener(event)
+
+    def check_language(self, lang):
+        """
+        Raises:
+            ValueError: If the backend does not speak `lang`.
+        """
+        languages = self.capabilities.languages
+        if languages is not None and lang not in languages:
+            raise ValueError(f"Language not supported: {lang}")
+
+
+class GTTSBackend(TTSBackend):
+    """
+    Google Text-to-Speech, through the gTTS library.
+
+    gTTS splits each chunk into requests of at most 100 characters, which
+    are sent one after another, so chunks are kept to a few requests and
+    several chunks are synthesized at once instead. The requests go through
+    an HTTPTransport rather than gTTS's own one-session-per-request code, so
+    connections are reused, the request rate is limited and throttled or
+    failed requests are retried.
+
+    Args:
+        slow (bool, optional): Read more slowly. Defaults to False.
+        transport (HTTPTransport, optional): Defaults to the transport shared
+            by the whole process (see transport.shared_transport).
+    """
+    name = 'gtts'
+
+    def __init__(self, slow=False, transport=None):
+        super().__init__()
+        self.voice = {'slow': slow}
+        self.transport = transport or shared_transport()
+        self.capabilities = BackendCapabilities(max_chunk_chars=500, max_concurrency=8,
+                                                languages=frozenset(tts_langs()))
+
+    def add_listener(self, listener):
+        # Listeners of a shared transport also hear about other jobs' requests,
+        # which is what throttling is about: the process shares one rate limit.
+        self.transport.add_listener(listener)
+
+    def remove_listener(self, listener):
+        self.transport.remove_listener(listener)
+
+    def check_language(self, lang):
+        # gTTS maps deprecated codes such as 'en-us' to the ones it supports before checking.
+        super().check_language(_fallback_deprecated_lang(lang))
+
+    def synthesize(self, chunk, lang):
+        tts = gTTS(text=chunk, lang=lang, **self.voice)
+        audio = BytesIO()
+        for request in tts._prepare_requests():
+            try:
+                response = self.transport.send(request, timeout=tts.timeout or GTTS_TIMEOUT)
+                response.raise_for_status()
+            except requests.HTTPError:
+                raise gTTSError(tts=tts, response=response)
+            except requests.RequestException:
+                raise gTTSError(tts=tts)
+            audio.write(_gtts_response_audio(tts, response))
+        return audio.getvalue()
+
+
+def _gtts_response_audio(tts, response):
+    """Returns the MP3 data in a Google Text-to-Speech response, as gTTS.stream() decodes it."""
+    audio = BytesIO()
+    for line in response.iter_lines(chunk_size=1024):
+        decoded_line = line.decode('utf-8')
+        if 'jQ1olc' in decoded_line:
+            match = _GTTS_AUDIO_RE.search(decoded_line)
+            if not match:
+                # Successful response without an audio stream
+                raise gTTSError(tts=tts, response=response)
+            audio.write(base64.b64decode(match.group(1).encode('ascii')))
+    return audio.getvalue()
+
+
+class StubBackend(TTSBackend):
+    """
+    A local engine that returns silence as long as the text would take to read.
+
+    The output is valid MP3 in the same format as gTTS (silent MPEG-2 Layer
+    III frames, 24 kHz, 32 kbps, mono), so it can be cached, joined and
+    served like real speech. It is deterministic: the same text always gives
+    the same bytes.
+
+    Args:
+        latency (float, optional): Seconds each call takes. Defaults to 0.
+        latency_per_char (float, optional): Additional seconds per character. Defaults to 0.
+        seconds_per_char (float, optional): Length of the audio per character. Defaults to 0.06.
+        max_chunk_chars (int, optional): Capability reported to the engine. Defaults to 500.
+        max_concurrency (int, optional): Capability reported to the engine. Defaults to 64.
+        capacity (int, optional): Calls the simulated server handles at once.
+            Beyond it, each call is throttled once: listeners get
+            EVENT_THROTTLED and the call takes throttle_delay longer, as if it
+            had been retried. Defaults to None (unlimited).
+        throttle_delay (float, optional): Seconds added to a throttled call. Defaults to 0.1.
+    """
+    name = 'stub'
+
+    def __init__(self, latency=0.0, latency_per_char=0.0, seconds_per_char=0.06,
+                 max_chunk_chars=500, max_concurrency=64, capacity=None, throttle_delay=0.1):
+        super().__init__()
+        self.latency = latency
+        self.latency_per_char = latency_per_char
+        self.capacity = capacity
+        self.throttle_delay = throttle_delay
+        self.voice = {'seconds_per_char': seconds_per_char}
+        self.capabilities = BackendCapabilities(max_chunk_chars=max_chunk_chars, max_concurrency=max_concurrency)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def synthesize(self, chunk, lang):
+        delay = self.latency + self.latency_per_char * len(chunk)
+        with self._lock:
+            self._in_flight += 1
+            throttled = self.capacity is not None and self._in_flight > self.capacity
+        try:
+            if throttled:
+                self._notify(EVENT_THROTTLED)
+                delay += self.throttle_delay
+            if delay > 0:
+                time.sleep(delay)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        seconds = len(chunk) * self.voice['seconds_per_char']
+        frames = max(1, math.ceil(seconds * MP3_SAMPLE_RATE / MP3_SAMPLES_PER_FRAME))
+        return SILENT_MP3_FRAME * frames
+
+
+# Backends selectable by name, e.g. from the command line.
+BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def create_backend(name, **options):
+    """
+    Returns a new backend of the given name.
+
+    Raises:
+        ValueError: If there is no such backend.
+    """
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown TTS backend: {name}") from None
+    return backend_class(**options)
@@ -0,0 +1,124 @@
+"""
+Benchmark for FB2 text extraction throughput.
+
+Generates a synthetic FB2 book and reports paragraphs per second for the
+recursive walker that extract_text_from_fb2 used to have ("before"), the
+iterative walker it uses now, and the streaming iter_fb2_text path.
+
+Usage:
+    python benchmarks/bench_fb2.py [--paragraphs N] [--depth D] [--repeat R]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from lxml import etree
+from parser import extract_text_from_fb2
+
+
+def legacy_extract_text_from_fb2(filepath):
+    """The recursive implementation extract_text_from_fb2 replaced (reference only)."""
+    with open(filepath, 'rb') as fb2_file:
+        tree = etree.fromstring(fb2_file.read(), parser=etree.XMLParser(huge_tree=True))
+    ns = {'fb': 'http://www.gribuser.ru/xml/fictionbook/2.0'}
+    body_element = tree.find('fb:body', namespaces=ns)
+    if body_element is None:
+        body_elements = tree.xpath('//*[local-name()="body"]')
+        if not body_elements:
+            return "Info: FB2 file has no body content or body tag is not standard."
+        body_element = body_elements[0]
+
+    def process_element(element, parts):
+        tag_name = etree.QName(element.tag).localname
+        if tag_name in ('p', 'title'):
+            text = element.xpath("string(.//text())").strip()
+            if text:
+                parts.append(text)
+                parts.append('\n' if tag_name == 'p' else '\n\n')
+        elif tag_name == 'section':
+            if parts and not "".join(parts[-2:]).endswith('\n\n'):
+                if not "".join(parts[-1:]).endswith('\n'):
+                    parts.append('\n')
+                parts.append('\n')
+            for child in element:
+                process_element(child, parts)
+            if parts and not "".join(parts[-2:]).endswith('\n\n'):
+                if not "".join(parts[-1:]).endswith('\n'):
+                    parts.append('\n')
+                parts.append('\n')
+        elif tag_name == 'empty-line':
+            parts.append('\n')
+        elif tag_name in ('epigraph', 'cite', 'poem', 'subtitle'):
+            text = element.xpath("string(.//text())").strip()
+            if text:
+                if parts and not "".join(parts[-2:]).endswith('\n\n'):
+                    if not "".join(parts[-1:]).endswith('\n'):
+                        parts.append('\n')
+                    parts.append('\n')
+                parts.append(text)
+                parts.append('\n\n')
+        else:
+            for child in element:
+                process_element(child, parts)
+
+    parts = []
+    process_element(body_element, parts)
+    text = re.sub(r'\n{3,}', '\n\n', "".join(parts)).strip()
+    return text or "Info: FB2 body was found, but no text content was extracted from it."
+
+
+def write_sample_book(path, paragraphs, depth):
+    """Writes an FB2 book with the given number of paragraphs, nested `depth` sections deep."""
+    per_section = 20
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body>\n')
+        for start in range(0, paragraphs, per_section):
+            f.write('<section>' * depth)
+            f.write(f'<title><p>Chapter {start // per_section + 1}</p></title>\n')
+            for i in range(start, min(start + per_section, paragraphs)):
+                f.write(f'<p>Paragraph {i} with <emphasis>some</emphasis> words in it.</p>\n')
+            f.write('<empty-line/></section>' + '</section>' * (depth - 1) + '\n')
+        f.write('</body>\n<binary id="cover.jpg" content-type="image/jpeg">')
+        f.write('QUJDREVGR0g=' * 50000)
+        f.write('</binary></FictionBook>\n')
+
+
+def measure(label, func, path, paragraphs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = func(path)
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<28} {best * 1000:9.1f} ms  {paragraphs / best:12,.0f} paragraphs/sec")
+    return text
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark FB2 text extraction.")
+    arg_parser.add_argument("--paragraphs", type=int, default=50000, help="Paragraphs in the sample book.")
+    arg_parser.add_argument("--depth", type=int, default=3, help="Section nesting depth.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (best is reported).")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'bench.fb2')
+        write_sample_book(path, args.paragraphs, args.depth)
+        print(f"{args.paragraphs} paragraphs, section depth {args.depth}, "
+              f"{os.path.getsize(path) / 1e6:.1f} MB")
+        before = measure("before (recursive)", legacy_extract_text_from_fb2, path, args.paragraphs, args.repeat)
+        after = measure("after (iterative)", lambda p: extract_text_from_fb2(p, streaming=False).text,
+                        path, args.paragraphs, args.repeat)
+        streamed = measure("after (streaming)", lambda p: extract_text_from_fb2(p, streaming=True).text,
+                           path, args.paragraphs, args.repeat)
+        if not before == after == streamed:
+            print("WARNING: implementations produced different text")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark for chunked text-to-speech synthesis.
+
+Runs convert_text_to_speech against the local StubBackend instead of the
+Google endpoint, so the numbers measure the chunking and scheduling rather
+than the network. The stub's latency is set per character, like gTTS, which
+sends one request per 100 characters one after another, and it returns
+silent MP3 frames in gTTS's format.
+
+"before" synthesizes the whole text in a single call, as the old single
+gTTS(...).save() call did; the other runs use the chunked engine with an
+increasing maximum number of workers. With --capacity, the stub throttles
+calls beyond that many at once, and each run reports where the adaptive
+concurrency controller settled.
+
+Usage:
+    python benchmarks/bench_tts.py [--paragraphs N] [--latency SECONDS] [--workers W ...] [--capacity C]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backends import StubBackend
+from tts import convert_text_to_speech, ConcurrencyController
+
+# Characters per request made by gTTS.
+REQUEST_CHARS = 100
+
+
+def sample_text(paragraphs):
+    sentence = "The quick brown fox jumps over the lazy dog. "
+    return "\n\n".join(f"Paragraph {i}. " + sentence * (1 + i % 5) for i in range(paragraphs))
+
+
+def single_call(text, output_path, backend):
+    """What convert_text_to_speech used to do: one synthesis of the whole text."""
+    with open(output_path, 'wb') as f:
+        f.write(backend.synthesize(text, 'en'))
+    return True, ""
+
+
+def measure(label, convert, text, output_path, backend, baseline=None, **kwargs):
+    started = time.perf_counter()
+    success, message = convert(text, output_path, backend=backend, **kwargs)
+    elapsed = time.perf_counter() - started
+    if not success:
+        raise SystemExit(message)
+    speedup = f"{baseline / elapsed:6.1f}x" if baseline else ""
+    print(f"{label:<24} {elapsed:8.2f} s  {len(text) / elapsed:10,.0f} characters/sec  "
+          f"{os.path.getsize(output_path) / 1e6:6.1f} MB{speedup}")
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark chunked text-to-speech synthesis.")
+    arg_parser.add_argument("--paragraphs", type=int, default=200, help="Paragraphs in the sample text.")
+    arg_parser.add_argument("--latency", type=float, default=0.005, help="Stub latency per request, in seconds.")
+    arg_parser.add_argument("--workers", type=int, nargs='+', default=[1, 4, 8, 16], help="Worker counts to run.")
+    arg_parser.add_argument("--capacity", type=int, help="Concurrent calls the stub serves before throttling.")
+    args = arg_parser.parse_args()
+
+    text = sample_text(args.paragraphs)
+    backend = StubBackend(latency_per_char=args.latency / REQUEST_CHARS, capacity=args.capacity,
+                          throttle_delay=args.latency * 4)
+    print(f"{args.paragraphs} paragraphs, {len(text)} characters, "
+          f"{args.latency * 1000:.1f} ms per {REQUEST_CHARS}-character request")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'bench.mp3')
+        before = measure("before (single call)", single_call, text, output_path, backend)
+        for workers in args.workers:
+            controller = ConcurrencyController(workers)
+            measure(f"chunked, {workers} workers", convert_text_to_speech, text, output_path,
+                    backend, baseline=before, workers=workers, controller=controller)
+            stats = controller.stats()
+            print(f"{'':<24} concurrency {stats['limit']}, {stats['throttled']} throttled, "
+                  f"{stats['cuts']} cuts, {stats['latency'] * 1000:.1f} ms per chunk")
+
+
+if __name__ == '__main__':
+    main()
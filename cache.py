@@ -0,0 +1,200 @@
+"""
+Persistent on-disk caches keyed by file content.
+
+DiskCache is a directory of entries with a size budget: entries are written
+atomically, optionally zlib-compressed, and the least recently used ones are
+removed once the directory grows past `max_bytes`. ExtractionCache builds on
+it to keep extracted Documents, keyed by a SHA-256 of the book file, its
+format and the parser version, so the same upload is only parsed once; the
+audio cache in tts.py builds on it to keep synthesized speech.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+
+from document import Document
+from parser import PARSER_VERSION
+
+# Default size budget of the extraction cache.
+DEFAULT_EXTRACTION_CACHE_BYTES = 512 * 1024 * 1024
+
+_ENTRY_SUFFIX = '.cache'
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def user_cache_dir(name):
+    """Returns the per-user directory of the named cache ($XDG_CACHE_HOME/morthy/<name>)."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'morthy', name)
+
+
+def default_extraction_cache_dir():
+    """Returns the per-user extraction cache directory ($XDG_CACHE_HOME/morthy/extraction)."""
+    return user_cache_dir('extraction')
+
+
+def file_sha256(filepath, chunk_size=_HASH_CHUNK_SIZE):
+    """Returns the hex SHA-256 of a file, read in chunks so large books are never held in memory."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    A directory of cache entries, evicted least-recently-used under a size budget.
+
+    Keys must be usable as file names. Reading an entry refreshes its
+    modification time, which is what the eviction order is based on, so the
+    cache survives restarts and can be shared by several processes: writes go
+    to a temporary file that is renamed into place, and entries that vanish
+    under a concurrent eviction are simply treated as misses.
+
+    The directory is only scanned when the size it is known to have, plus
+    what this instance has written since, exceeds the budget, so caches of
+    many small entries do not pay for a scan on every write. Writes made by
+    other processes in the meantime are noticed at the next scan.
+
+    Args:
+        directory (str): Where entries are stored; created if missing.
+        max_bytes (int): Size budget for all entries together.
+        compress (bool, optional): zlib-compress entries. Defaults to True.
+    """
+
+    def __init__(self, directory, max_bytes, compress=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._known_bytes = None  # size at the last scan plus what was written since
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Returns the data stored under `key`, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        if self.compress:
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                self.discard(key)
+                return None
+        return data
+
+    def put(self, key, data):
+        """Stores `data` under `key`, then evicts old entries if the budget is exceeded."""
+        if self.compress:
+            data = zlib.compress(data)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        if self._known_bytes is not None:
+            self._known_bytes += len(data)
+        if self._known_bytes is None or self._known_bytes > self.max_bytes:
+            self.evict()
+
+    def discard(self, key):
+        """Removes the entry stored under `key`, if any."""
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Removes least recently used entries until the total size fits in max_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(_ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self._known_bytes = total
+
+
+class ExtractionCache(DiskCache):
+    """
+    Extracted Documents keyed by book content, format and PARSER_VERSION.
+
+    Args:
+        directory (str): Where entries are stored; created if missing.
+        max_bytes (int, optional): Size budget for the compressed entries.
+            Defaults to DEFAULT_EXTRACTION_CACHE_BYTES.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_EXTRACTION_CACHE_BYTES):
+        super().__init__(directory, max_bytes, compress=True)
+
+    @staticmethod
+    def key(filepath, file_format):
+        """Returns the cache key for a book file; `file_format` is its extension, e.g. 'epub'."""
+        return f"{file_sha256(filepath)}-{file_format}-v{PARSER_VERSION}"
+
+    def get_document(self, key):
+        """Returns the Document stored under `key`, or None."""
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return Document.from_bytes(data)
+        except (ValueError, KeyError):
+            self.discard(key)
+            return None
+
+    def put_document(self, key, document):
+        self.put(key, document.to_bytes())
+
+    def extract(self, filepath, file_format, extractor, *args, **kwargs):
+        """
+        Returns the cached Document for the file, calling extractor(filepath, *args, **kwargs) on a miss.
+
+        Extraction errors propagate and are not cached. A cache that cannot be
+        read or written (e.g. a full disk) only costs the time it would save:
+        the error is logged and the entry treated as missing.
+        """
+        key = self.key(filepath, file_format)
+        try:
+            document = self.get_document(key)
+        except OSError as e:
+            logger.warning("Could not read the extraction cache in %s: %s", self.directory, e)
+            document = None
+        if document is None:
+            document = extractor(filepath, *args, **kwargs)
+            try:
+                self.put_document(key, document)
+            except OSError as e:
+                logger.warning("Could not write to the extraction cache in %s: %s", self.directory, e)
+        return document
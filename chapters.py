@@ -0,0 +1,139 @@
+"""
+Per-chapter conversion: one MP3 file per chapter of a book, plus a playlist.
+
+Each chapter of a Document (FB2 top-level sections, EPUB documents, PDF
+outline entries; see parser.py) is converted by its own
+convert_text_to_speech call, several at a time, so long books can be listened
+to as soon as their first chapters are done. The files are numbered in book
+order and named after the chapter titles; an extended M3U playlist lists them
+with their durations once all are done.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import re
+from typing import NamedTuple
+
+from tts import convert_text_to_speech
+from mp3 import stream_duration
+
+# Chapters converted at the same time.
+DEFAULT_CHAPTER_JOBS = 2
+PLAYLIST_EXTENSION = '.m3u8'
+
+# Longest title used in a file name.
+_FILENAME_TITLE_CHARS = 60
+# Characters that are not allowed in file names on common file systems.
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+# Enough of an MP3 file to read its Xing/Info header.
+_HEADER_BYTES = 4096
+
+
+class ChapterResult(NamedTuple):
+    """The outcome of converting one chapter; `number` counts from 1 among the chapters with text."""
+    number: int
+    title: str
+    filepath: str
+    success: bool
+    message: str
+
+
+def chapter_title(chapter):
+    """Returns the chapter's title, or its first paragraph, shortened, if it has none."""
+    if chapter.title:
+        return chapter.title
+    first = next(chapter.paragraphs(), None)
+    if first is None:
+        return f"Chapter {chapter.index + 1}"
+    if len(first) > _FILENAME_TITLE_CHARS:
+        first = first[:_FILENAME_TITLE_CHARS].rsplit(' ', 1)[0] + "..."
+    return first
+
+
+def chapter_filename(number, title, width=2):
+    """Returns e.g. '03 - The Title.mp3', with characters file systems reject replaced."""
+    safe_title = _UNSAFE_FILENAME_RE.sub('_', ' '.join(title.split()))[:_FILENAME_TITLE_CHARS].strip(' .')
+    name = f"{number:0{width}d}"
+    if safe_title:
+        name += f" - {safe_title}"
+    return name + '.mp3'
+
+
+def read_duration(filepath):
+    """Returns the duration of an MP3 file written by convert_text_to_speech, in seconds, or None."""
+    try:
+        with open(filepath, 'rb') as f:
+            return stream_duration(f.read(_HEADER_BYTES))
+    except OSError:
+        return None
+
+
+def write_playlist(filepath, entries):
+    """
+    Writes an extended M3U playlist (UTF-8), atomically.
+
+    Args:
+        filepath (str): The playlist file.
+        entries (iterable): (file path relative to the playlist, title, duration in seconds or None).
+    """
+    lines = ['#EXTM3U']
+    for path, title, duration in entries:
+        seconds = round(duration) if duration is not None else -1
+        lines.append(f"#EXTINF:{seconds},{' '.join(title.split())}")
+        lines.append(path)
+    temp_path = filepath + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(temp_path, filepath)
+
+
+def convert_chapters(document, output_dir, lang='en', jobs=DEFAULT_CHAPTER_JOBS, on_chapter=None, **options):
+    """
+    Converts each chapter of a document to its own MP3 file in output_dir.
+
+    Chapters without text are skipped. Up to `jobs` chapters are converted at
+    once, started in book order, and each file appears (atomically) as soon
+    as its chapter is done. The playlist, named after output_dir, lists the
+    chapters that were converted, in order.
+
+    Args:
+        document (Document): The book.
+        output_dir (str): Where the chapter files and playlist go; created if missing.
+        lang (str, optional): The language of the text. Defaults to 'en'.
+        jobs (int, optional): Chapters converted at the same time. Defaults to DEFAULT_CHAPTER_JOBS.
+        on_chapter (callable, optional): Called with a ChapterResult as each chapter finishes.
+        **options: Passed to convert_text_to_speech for every chapter (backend, cache, resume, ...).
+
+    Returns:
+        bool: True if every chapter was converted.
+        str: A message indicating success or failure.
+    """
+    chapters = [chapter for chapter in document.chapters if next(chapter.paragraphs(), None) is not None]
+    if not chapters:
+        return False, "Error: Input text cannot be empty."
+    os.makedirs(output_dir, exist_ok=True)
+    width = max(2, len(str(len(chapters))))
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {}
+        for number, chapter in enumerate(chapters, 1):
+            title = chapter_title(chapter)
+            filepath = os.path.join(output_dir, chapter_filename(number, title, width))
+            future = executor.submit(convert_text_to_speech, chapter.to_document(), filepath, lang, **options)
+            futures[future] = (number, title, filepath)
+        for future in as_completed(futures):
+            success, message = future.result()
+            result = ChapterResult(*futures[future], success, message)
+            results[result.number] = result
+            if on_chapter is not None:
+                on_chapter(result)
+
+    done = [results[number] for number in sorted(results) if results[number].success]
+    playlist_path = os.path.join(output_dir, os.path.basename(os.path.normpath(output_dir)) + PLAYLIST_EXTENSION)
+    write_playlist(playlist_path, [(os.path.basename(result.filepath), result.title, read_duration(result.filepath))
+                                   for result in done])
+    failed = [result for result in results.values() if not result.success]
+    if failed:
+        first = min(failed, key=lambda result: result.number)
+        return False, (f"{len(failed)} of {len(chapters)} chapters failed; "
+                       f"chapter {first.number}: {first.message}")
+    return True, f"Successfully converted {len(chapters)} chapters to {output_dir} (playlist: {playlist_path})"
@@ -0,0 +1,158 @@
+"""
+Checkpoints that let an interrupted text-to-speech conversion resume.
+
+While a book is converted, its audio is appended, chunk by chunk and in
+order, through an MP3Assembler (see mp3.py) to a partial file in a parts
+directory next to the output (`<output>.parts/audio.partial`). A manifest in
+the same directory (`manifest.jsonl`) records which chunks are done and where
+their audio lives in the partial file. The manifest is a journal: a header
+line identifying the conversion, then one line per finished chunk, appended
+after the chunk's audio has been flushed, so a crash at any point leaves a
+consistent checkpoint. A resumed conversion truncates the partial file to the
+last recorded chunk and continues from the first missing one; once every
+chunk is done the partial file is renamed over the output, so readers never
+see a torn MP3, and the parts directory is removed.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+from mp3 import MP3Assembler
+
+MANIFEST_NAME = 'manifest.jsonl'
+PARTIAL_NAME = 'audio.partial'
+# Bump when the layout of the parts directory changes.
+MANIFEST_VERSION = 3
+
+# Suffix of the parts directory of an output file.
+PARTS_SUFFIX = '.parts'
+
+
+def parts_dir_for(output_filepath):
+    """Returns the parts directory of an output file."""
+    return output_filepath + PARTS_SUFFIX
+
+
+def partial_path_for(output_filepath):
+    """Returns the partial file an output file is assembled in while it is converted."""
+    return os.path.join(parts_dir_for(output_filepath), PARTIAL_NAME)
+
+
+def conversion_fingerprint(text, lang, backend, voice, max_chunk_chars):
+    """Identifies what a conversion produces, so a checkpoint is only reused for the same one."""
+    digest = hashlib.sha256()
+    settings = json.dumps([lang, backend, voice or {}, max_chunk_chars], sort_keys=True)
+    digest.update(settings.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(str(text).encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class ConversionCheckpoint:
+    """
+    The partial output and manifest of one conversion.
+
+    A binary file-like object: each write() appends the audio frames of the
+    next chunk's MP3 segment and records them in the manifest; the Xing/Info
+    header of the whole file is written by commit(). `completed` is the number of chunks
+    done, counting the `resumed` ones of an earlier run.
+
+    Args:
+        output_filepath (str): The MP3 file being produced.
+        fingerprint (str): From conversion_fingerprint().
+        resume (bool, optional): Keep the chunks recorded by an earlier run
+            with the same fingerprint. Otherwise, or if the fingerprint
+            differs, the conversion starts over. Defaults to False.
+    """
+
+    def __init__(self, output_filepath, fingerprint, resume=False):
+        self.output_filepath = output_filepath
+        self.fingerprint = fingerprint
+        self.parts_dir = parts_dir_for(output_filepath)
+        self.partial_path = partial_path_for(output_filepath)
+        self._manifest_path = os.path.join(self.parts_dir, MANIFEST_NAME)
+        self.completed = 0
+        self.size = 0  # bytes of audio recorded in the manifest
+        segments = []  # (frames, bytes, bitrate) of each recorded chunk, for the MP3 header
+        if not (resume and self._load(segments)):
+            self._reset()
+            segments.clear()
+        self.resumed = self.completed
+        self._file = open(self.partial_path, 'r+b')
+        # Drop any audio written after the last recorded chunk
+        self._file.truncate(self.size)
+        self._file.seek(self.size)
+        self._assembler = MP3Assembler(self._file, segments)
+        self._manifest = open(self._manifest_path, 'a', encoding='utf-8')
+
+    def _load(self, segments):
+        """Reads the manifest of an earlier run; returns False if there is none for this conversion."""
+        try:
+            with open(self._manifest_path, encoding='utf-8') as manifest:
+                lines = manifest.read().splitlines()
+            partial_size = os.path.getsize(self.partial_path)
+        except FileNotFoundError:
+            return False
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return False
+        if header.get('version') != MANIFEST_VERSION or header.get('fingerprint') != self.fingerprint:
+            return False
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # torn write of the last line
+            if (entry.get('index') != self.completed or entry.get('offset') != self.size
+                    or self.size + entry.get('size', 0) > partial_size):
+                break
+            self.completed += 1
+            self.size += entry['size']
+            segments.append((entry['frames'], entry['size'], entry['bitrate']))
+        # Rewrite the manifest without the entries that were dropped, so new ones follow whole lines
+        self._write_manifest(lines[:self.completed + 1])
+        return True
+
+    def _reset(self):
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        os.mkdir(self.parts_dir)
+        open(self.partial_path, 'wb').close()
+        self._write_manifest([json.dumps({'version': MANIFEST_VERSION, 'fingerprint': self.fingerprint})])
+
+    def _write_manifest(self, lines):
+        temp_path = self._manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as manifest:
+            manifest.write(''.join(line + '\n' for line in lines))
+        os.replace(temp_path, self._manifest_path)
+
+    def write(self, audio):
+        """
+        Appends the audio of the next chunk and records it in the manifest.
+
+        Raises:
+            MP3Error: If `audio` is not MP3 data in the format of the earlier chunks.
+        """
+        frames, written = self._assembler.write(audio)
+        self._file.flush()
+        entry = {'index': self.completed, 'offset': self.size, 'size': written,
+                 'frames': frames.frames, 'bitrate': frames.bitrate}
+        self._manifest.write(json.dumps(entry) + '\n')
+        self._manifest.flush()
+        self.completed += 1
+        self.size += written
+
+    def commit(self):
+        """Moves the finished audio to the output file, atomically, and removes the parts directory."""
+        self._assembler.finish()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.close()
+        os.replace(self.partial_path, self.output_filepath)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+    def close(self):
+        """Closes the files, keeping the checkpoint for a later resume."""
+        self._file.close()
+        self._manifest.close()
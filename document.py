@@ -0,0 +1,215 @@
+"""
+Document model shared by the parsers and their consumers.
+
+A Document keeps the extracted text of a book once, as a single string, and
+describes its chapters and paragraphs with compact tables of character
+offsets into that string. Parsers build one Document per book and raise an
+ExtractionError when they cannot; consumers read the text or walk the
+paragraphs without re-scanning or copying the whole book.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+import json
+import re
+
+# A paragraph is a line with its surrounding whitespace stripped; blank lines separate nothing.
+_PARAGRAPH_RE = re.compile(r'\S(?:[^\n]*\S)?')
+
+# Leads every serialized Document; bump the digit when the layout changes.
+_SERIAL_MAGIC = b'DOC1\n'
+
+
+class ExtractionError(Exception):
+    """Raised by the parsers when no text can be extracted from a file; the message is user-facing."""
+
+
+class DocumentNotFoundError(ExtractionError):
+    """Raised when the book file does not exist."""
+
+
+class CorruptDocumentError(ExtractionError):
+    """Raised when the book file is not a valid document of its format."""
+
+
+class Chapter:
+    """A chapter of a Document: its title (or None) and the [start, end) span of its text."""
+    __slots__ = ('document', 'index', 'title', 'start', 'end')
+
+    def __init__(self, document, index, title, start, end):
+        self.document = document
+        self.index = index
+        self.title = title
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self):
+        return self.document.text[self.start:self.end]
+
+    def paragraphs(self):
+        """Yields the chapter's paragraphs, in order."""
+        return self.document.paragraphs(self.start, self.end)
+
+    def to_document(self):
+        """Returns the chapter as a Document of its own, sharing the parent's paragraph table."""
+        return self.document.slice(self.start, self.end, self.title)
+
+    def __repr__(self):
+        return f"<Chapter {self.index}: {self.title!r} [{self.start}:{self.end}]>"
+
+
+class Document:
+    """
+    The text of a book as an ordered sequence of chapters and paragraphs.
+
+    `text` is the full text, exactly as the parser produced it. Paragraph
+    spans (stripped, non-blank lines) and chapter start offsets are kept in
+    `array` tables rather than per-paragraph objects; Chapter objects and
+    paragraph strings are only created when asked for.
+
+    A Document is false when it contains no text other than whitespace.
+    """
+    __slots__ = ('text', '_paragraph_starts', '_paragraph_ends', '_chapter_starts', '_chapter_titles')
+
+    def __init__(self, text, chapter_starts=(0,), chapter_titles=None):
+        """
+        Args:
+            text (str): The full text.
+            chapter_starts (iterable of int, optional): Offset in `text` at
+                which each chapter begins, ascending. Defaults to a single
+                chapter covering the whole text.
+            chapter_titles (list, optional): Title of each chapter, or None.
+        """
+        self.text = text
+        self._paragraph_starts = array('q')
+        self._paragraph_ends = array('q')
+        for match in _PARAGRAPH_RE.finditer(text):
+            self._paragraph_starts.append(match.start())
+            self._paragraph_ends.append(match.end())
+        self._chapter_starts = array('q', chapter_starts)
+        if chapter_titles is None:
+            chapter_titles = [None] * len(self._chapter_starts)
+        elif len(chapter_titles) != len(self._chapter_starts):
+            raise ValueError("chapter_titles must have one entry per chapter")
+        self._chapter_titles = list(chapter_titles)
+
+    def to_bytes(self):
+        """
+        Serializes the document, offset tables included, for Document.from_bytes.
+
+        The layout is a JSON header line followed by the paragraph tables in
+        native byte order and the UTF-8 text, so it is meant for caches on
+        the same machine rather than for exchange.
+        """
+        header = {
+            'paragraphs': len(self._paragraph_starts),
+            'chapter_starts': list(self._chapter_starts),
+            'chapter_titles': self._chapter_titles,
+        }
+        return b''.join([_SERIAL_MAGIC, json.dumps(header).encode('utf-8'), b'\n',
+                         self._paragraph_starts.tobytes(), self._paragraph_ends.tobytes(),
+                         self.text.encode('utf-8', 'surrogatepass')])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuilds a Document from Document.to_bytes() output without re-scanning the text.
+
+        Raises:
+            ValueError: If `data` is not a serialized Document.
+        """
+        if not data.startswith(_SERIAL_MAGIC):
+            raise ValueError("not a serialized Document")
+        header_end = data.index(b'\n', len(_SERIAL_MAGIC))
+        header = json.loads(data[len(_SERIAL_MAGIC):header_end])
+        table_size = header['paragraphs'] * array('q').itemsize
+        tables_end = header_end + 1 + 2 * table_size
+        if len(data) < tables_end:
+            raise ValueError("truncated Document data")
+        document = cls.__new__(cls)
+        document._paragraph_starts = array('q', data[header_end + 1:header_end + 1 + table_size])
+        document._paragraph_ends = array('q', data[header_end + 1 + table_size:tables_end])
+        document._chapter_starts = array('q', header['chapter_starts'])
+        document._chapter_titles = header['chapter_titles']
+        document.text = data[tables_end:].decode('utf-8', 'surrogatepass')
+        return document
+
+    @classmethod
+    def from_text(cls, text):
+        """Returns a single-chapter Document for `text`."""
+        return cls(text)
+
+    @classmethod
+    def from_chapters(cls, texts, separator="\n", titles=None):
+        """
+        Returns a Document whose text is `separator.join(texts)`, one chapter per text.
+
+        Args:
+            texts (list of str): The text of each chapter, in order.
+            separator (str, optional): Inserted between chapters. Defaults to "\\n".
+            titles (list, optional): Title of each chapter, or None.
+        """
+        starts = array('q')
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(separator)
+        if not texts:
+            starts.append(0)
+            titles = None
+        return cls(separator.join(texts), starts, titles)
+
+    def __str__(self):
+        return self.text
+
+    def __bool__(self):
+        return len(self._paragraph_starts) > 0
+
+    def __repr__(self):
+        return (f"<Document: {len(self.text)} characters, {self.paragraph_count} paragraphs, "
+                f"{len(self._chapter_starts)} chapters>")
+
+    @property
+    def paragraph_count(self):
+        return len(self._paragraph_starts)
+
+    def slice(self, start, end, title=None):
+        """
+        Returns text[start:end] as a single-chapter Document.
+
+        Its paragraph table is cut from this one's, not found again in the
+        text; paragraphs that cross `start` or `end` are left out.
+        """
+        document = Document.__new__(Document)
+        document.text = self.text[start:end]
+        first = bisect_left(self._paragraph_starts, start)
+        last = bisect_right(self._paragraph_ends, end, lo=first)
+        document._paragraph_starts = array('q', (offset - start for offset in self._paragraph_starts[first:last]))
+        document._paragraph_ends = array('q', (offset - start for offset in self._paragraph_ends[first:last]))
+        document._chapter_starts = array('q', (0,))
+        document._chapter_titles = [title]
+        return document
+
+    def paragraph_spans(self, start=0, end=None):
+        """Yields the (start, end) offsets of the paragraphs within text[start:end]."""
+        if end is None:
+            end = len(self.text)
+        starts, ends = self._paragraph_starts, self._paragraph_ends
+        for i in range(bisect_left(starts, start), len(starts)):
+            if ends[i] > end:
+                break
+            yield starts[i], ends[i]
+
+    def paragraphs(self, start=0, end=None):
+        """Yields the paragraphs within text[start:end] as strings."""
+        text = self.text
+        for paragraph_start, paragraph_end in self.paragraph_spans(start, end):
+            yield text[paragraph_start:paragraph_end]
+
+    @property
+    def chapters(self):
+        """The chapters of the document, in order."""
+        starts = self._chapter_starts
+        ends = list(starts[1:]) + [len(self.text)]
+        return [Chapter(self, index, self._chapter_titles[index], start, end)
+                for index, (start, end) in enumerate(zip(starts, ends))]
@@ -0,0 +1,681 @@
+"""
+Background conversion jobs for the web app.
+
+An upload becomes a Job, identified by a random id, and is run by a JobQueue
+on a small pool of worker threads, so the HTTP request that submitted it
+returns at once and its progress is polled at /jobs/<id>. At most `workers`
+jobs run at a time and at most `max_pending` wait for a worker; beyond that
+submit() raises QueueFullError, so a burst of uploads is turned away quickly
+instead of piling up behind the running conversions.
+
+Each Job has a JobEvents log that its function publishes progress to and
+that any number of watchers read (the web app streams it as Server-Sent
+Events). Publishing appends to one shared, bounded log and wakes the
+watchers; nothing is copied per watcher, so an event costs the same however
+many browser tabs follow the job.
+
+With a JobStore, jobs are also kept in an SQLite database that several
+processes share (e.g. the workers of gunicorn, or containers on one volume),
+so a job submitted to one process can be followed from any of them: a
+process that is asked for a job it does not run loads it from the store and
+follows its events there until it is finished. A job is still run by the
+process it was submitted to.
+
+A job may have a key that says what work it does (e.g. a hash of the book
+and the conversion settings). While a job with a key is queued or running,
+submitting another with the same key does not start new work: submit()
+returns the job in flight instead, whichever process of the store runs it,
+and the submitter follows its progress and gets its result.
+
+A process could be killed while its jobs are queued or running, and their
+keys would then stay taken by jobs that never finish. So each job in the
+store has an owner, the store that added it, and a lease that the owner's
+JobQueue renews while it is alive. Adding a job first fails the queued and
+running jobs whose lease has run out, in the same transaction, so the work
+is started afresh rather than attached to a job nobody runs.
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Jobs run at the same time.
+DEFAULT_JOB_WORKERS = 2
+# Jobs waiting for a worker before uploads are refused.
+DEFAULT_MAX_PENDING_JOBS = 20
+# Finished jobs whose status is kept.
+DEFAULT_MAX_FINISHED_JOBS = 1000
+# Most recent events of a job kept for watchers that fall behind or reconnect.
+DEFAULT_EVENT_HISTORY = 64
+# Seconds a process waits for another one to finish writing to the job store.
+DEFAULT_STORE_TIMEOUT = 30
+# Seconds between checks for new events of the jobs other processes run.
+DEFAULT_STORE_POLL_SECONDS = 0.5
+# Seconds a queued or running job is considered alive after its process last renewed its lease;
+# the lease is renewed three times as often.
+DEFAULT_JOB_LEASE_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """A job failed; the message is shown to the user."""
+
+
+class QueueFullError(Exception):
+    """Too many jobs are waiting for a worker."""
+
+
+class JobEvents:
+    """
+    An append-only log of a job's events, read by any number of watchers.
+
+    Events are numbered from 1. A watcher keeps the number of the last event
+    it has seen and asks for the ones after it with wait(); only the latest
+    `history` events are kept, so a watcher that falls further behind skips
+    to the oldest one kept. Events are snapshots (the latest progress, the
+    new state), so skipping loses nothing a watcher needs. Once the log is
+    closed, no more events are published.
+
+    Args:
+        history (int, optional): Events kept. Defaults to DEFAULT_EVENT_HISTORY.
+    """
+
+    def __init__(self, history=DEFAULT_EVENT_HISTORY):
+        self._events = deque(maxlen=history)  # (number, name, data)
+        self.last_id = 0
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def publish(self, name, data, close=False, event_id=None):
+        """
+        Appends an event; with close=True, it is the last one.
+
+        The event is numbered after the last one, unless `event_id` gives its
+        number (e.g. the one it has in a JobStore), which must be higher.
+        """
+        with self._condition:
+            if self.closed:
+                return
+            self.last_id = self.last_id + 1 if event_id is None else event_id
+            self._events.append((self.last_id, name, data))
+            self.closed = close
+            self._condition.notify_all()
+
+    def close(self):
+        """Ends the log without a last event, waking the watchers."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def wait(self, after=0, timeout=None):
+        """
+        Returns the events numbered after `after`, waiting up to `timeout` seconds for one.
+
+        Returns:
+            list: (number, name, data) tuples, empty if the timeout passed or
+            the log is closed with nothing new.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.last_id > after or self.closed, timeout)
+            events = []
+            for event in reversed(self._events):
+                if event[0] <= after:
+                    break
+                events.append(event)
+            events.reverse()
+            return events
+
+
+class Job:
+    """
+    A conversion run in the background.
+
+    `state` goes from QUEUED to RUNNING to DONE or FAILED. Once DONE,
+    `result` holds what the job's function returned; once FAILED, `message`
+    says why. State changes are published to `events` as 'state' events with
+    to_dict() as their data; the last one closes the log. The job's function
+    may publish its own events and keep its latest progress in `progress`.
+    `output` is the path of the file the job produces, if any. A job that is
+    kept in a JobStore has it in `store`.
+
+    Args:
+        name (str): What the job works on, e.g. the uploaded file's name.
+        output (str, optional): The path of the file the job produces.
+        key (str, optional): Identifies the work the job does; see the module docstring.
+    """
+
+    def __init__(self, name, output=None, key=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.key = key
+        self.state = QUEUED
+        self.result = None
+        self.message = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.progress = None
+        self.output = output
+        self.store = None
+        self.events = JobEvents()
+        self._done = threading.Event()
+
+    @property
+    def is_finished(self):
+        return self.state in (DONE, FAILED)
+
+    def wait(self, timeout=None):
+        """Blocks until the job is finished; returns False if `timeout` seconds passed first."""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        """Returns the job's status as a JSON-serializable dict."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'message': self.message,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'progress': self.progress,
+        }
+
+    def report(self, name, data):
+        """Publishes an event of the job's function; 'progress' events also update `progress`."""
+        if name == 'progress':
+            self.progress = data
+        self._publish(name, data)
+
+    def _set_state(self, state, expected=None):
+        """
+        Moves the job to `state` and publishes it; returns False, changing nothing, if it was not in `expected`.
+
+        The store, if any, has the last word on the job's state: `expected` is
+        checked against it, and the change recorded, in one transaction.
+        """
+        if self.store is None and expected is not None and self.state not in expected:
+            return False
+        previous = self.state, self.finished
+        self.state = state
+        if self.is_finished:
+            self.finished = time.time()
+        if not self._publish('state', self.to_dict(), expected):
+            self.state, self.finished = previous
+            return False
+        return True
+
+    def _publish(self, name, data, expected=None):
+        event_id = None
+        if self.store is not None:
+            event_id = self.store.record(self, name, data, expected)
+            if event_id is None:
+                return False
+        self.events.publish(name, data, close=self.is_finished, event_id=event_id)
+        return True
+
+    def _replay(self, event_id, name, data):
+        """Applies an event that another process recorded in the store."""
+        if name == 'progress':
+            self.progress = data
+        elif name == 'state':
+            if data['state'] == DONE:
+                self.result = self.store.result(self.id)
+            for field in ('state', 'message', 'started', 'finished', 'progress'):
+                setattr(self, field, data[field])
+        self.events.publish(name, data, close=self.is_finished, event_id=event_id)
+        if self.is_finished:
+            self._done.set()
+
+
+class JobStore:
+    """
+    Jobs and their latest events, kept in an SQLite database that processes share.
+
+    The database is in WAL mode, so reading a job's status never waits for
+    the process that is writing its progress. Each event is recorded with
+    the job's fields as they are after it, in one transaction, and is
+    numbered per job by the store, so an event id (e.g. a Last-Event-ID)
+    means the same in every process. A state change is a compare-and-set:
+    it is only recorded if the stored state is still the expected one, so
+    two processes can never both start a job or finish it differently. At
+    most one queued or running job has a given key, which a unique index
+    enforces. The jobs a store adds are owned by it (`owner`, random per
+    store) and leased for `lease` seconds at a time; see the module docstring.
+
+    Each thread has its own connection to the database.
+
+    Args:
+        path (str): The database file; created if missing.
+        timeout (float, optional): Seconds to wait for another process's write.
+            Defaults to DEFAULT_STORE_TIMEOUT.
+        history (int, optional): Latest events kept per job. Defaults to DEFAULT_EVENT_HISTORY.
+        lease (float, optional): Seconds a job's lease lasts. Defaults to DEFAULT_JOB_LEASE_SECONDS.
+    """
+
+    _SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            state TEXT NOT NULL,
+            result TEXT,
+            message TEXT,
+            output TEXT,
+            created REAL NOT NULL,
+            started REAL,
+            finished REAL,
+            progress TEXT,
+            last_event INTEGER NOT NULL DEFAULT 0,
+            key TEXT,
+            owner TEXT,
+            lease_expires REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)",
+        """CREATE TABLE IF NOT EXISTS events (
+            job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+            id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (job_id, id)
+        ) WITHOUT ROWID""",
+    )
+
+    def __init__(self, path, timeout=DEFAULT_STORE_TIMEOUT, history=DEFAULT_EVENT_HISTORY,
+                 lease=DEFAULT_JOB_LEASE_SECONDS):
+        self.path = path
+        self.timeout = timeout
+        self.history = history
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self._local = threading.local()
+        db = self._connection()
+        db.execute('PRAGMA journal_mode = WAL')
+        with self._transaction() as db:
+            for statement in self._SCHEMA:
+                db.execute(statement)
+            # Databases created before jobs had keys or leases
+            columns = {row[1] for row in db.execute('PRAGMA table_info(jobs)')}
+            for column, kind in (('key', 'TEXT'), ('owner', 'TEXT'), ('lease_expires', 'REAL')):
+                if column not in columns:
+                    db.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+            db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS jobs_in_flight ON jobs (key)"
+                       f" WHERE state IN ('{QUEUED}', '{RUNNING}')")
+
+    def add(self, job):
+        """
+        Records a new job, owned by this store, after failing the jobs whose lease has run out.
+
+        Returns:
+            str or None: None, or the id of the queued or running job with the
+            same key, in which case nothing is recorded.
+        """
+        with self._transaction() as db:
+            now = time.time()
+            self._expire(db, now)
+            in_flight = self._in_flight(db, job.key, now)
+            if in_flight is not None:
+                return in_flight
+            db.execute('INSERT INTO jobs (id, name, state, output, created, key, owner, lease_expires)'
+                       ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                       (job.id, job.name, job.state, job.output, job.created, job.key, self.owner,
+                        now + self.lease))
+        return None
+
+    def in_flight(self, key):
+        """Returns the id of the queued or running job with the given key and a live lease, or None."""
+        return self._in_flight(self._connection(), key, time.time())
+
+    def renew(self):
+        """Extends the lease of the queued and running jobs this store added; returns how many there are."""
+        with self._transaction() as db:
+            return db.execute('UPDATE jobs SET lease_expires = ? WHERE owner = ? AND state IN (?, ?)',
+                              (time.time() + self.lease, self.owner, QUEUED, RUNNING)).rowcount
+
+    def record(self, job, name, data, expected=None):
+        """
+        Records an event of a job, with the job's current fields, and returns the event's number.
+
+        With `expected`, a tuple of states, nothing is recorded, and None is
+        returned, unless the stored state of the job is one of them. Without
+        it, the stored job must not be finished (e.g. failed for its lease).
+        """
+        query = ('UPDATE jobs SET state = ?, result = ?, message = ?, started = ?, finished = ?, progress = ?,'
+                 ' last_event = last_event + 1 WHERE id = ?')
+        params = [job.state, json.dumps(job.result), job.message, job.started, job.finished,
+                  json.dumps(job.progress), job.id]
+        if expected is None:
+            expected = (QUEUED, RUNNING)
+        query += ' AND state IN (%s)' % ', '.join('?' * len(expected))
+        params.extend(expected)
+        with self._transaction() as db:
+            if db.execute(query, params).rowcount == 0:
+                return None
+            return self._append_event(db, job.id, name, data)
+
+    def load(self, job_id):
+        """Returns the job with the given id, with its latest events, or None."""
+        with self._transaction(immediate=False) as db:
+            row = db.execute('SELECT name, state, result, message, output, created, started, finished, progress,'
+                             ' key FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            events = db.execute('SELECT id, name, data FROM events WHERE job_id = ? ORDER BY id',
+                                (job_id,)).fetchall()
+        job = Job(row[0], output=row[4], key=row[9])
+        job.id = job_id
+        job.store = self
+        job.state, job.message, job.created, job.started, job.finished = row[1], row[3], row[5], row[6], row[7]
+        job.result, job.progress = json.loads(row[2] or 'null'), json.loads(row[8] or 'null')
+        for i, (event_id, name, data) in enumerate(events):
+            job.events.publish(name, json.loads(data), close=job.is_finished and i == len(events) - 1,
+                               event_id=event_id)
+        if job.is_finished:
+            job._done.set()
+        return job
+
+    def events_after(self, job_id, after):
+        """Returns the (number, name, data) events of a job numbered after `after` that are still kept."""
+        rows = self._connection().execute('SELECT id, name, data FROM events WHERE job_id = ? AND id > ? ORDER BY id',
+                                          (job_id, after)).fetchall()
+        return [(event_id, name, json.loads(data)) for event_id, name, data in rows]
+
+    def result(self, job_id):
+        """Returns the stored result of a job."""
+        row = self._connection().execute('SELECT result FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0] or 'null') if row else None
+
+    def forget_finished(self, keep):
+        """Deletes all but the `keep` most recently finished jobs, with their events."""
+        with self._transaction() as db:
+            db.execute('DELETE FROM jobs WHERE finished <= (SELECT finished FROM jobs WHERE finished IS NOT NULL'
+                       ' ORDER BY finished DESC LIMIT 1 OFFSET ?)', (keep,))
+
+    def _append_event(self, db, job_id, name, data):
+        """Adds the event numbered by the job's last_event, dropping those beyond the history; returns its number."""
+        event_id, = db.execute('SELECT last_event FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        db.execute('INSERT INTO events (job_id, id, name, data) VALUES (?, ?, ?, ?)',
+                   (job_id, event_id, name, json.dumps(data)))
+        db.execute('DELETE FROM events WHERE job_id = ? AND id <= ?', (job_id, event_id - self.history))
+        return event_id
+
+    def _expire(self, db, now):
+        """Fails the queued and running jobs whose lease ran out, as their process is gone."""
+        rows = db.execute('SELECT id, name, created, started, progress FROM jobs WHERE state IN (?, ?)'
+                          ' AND COALESCE(lease_expires, 0) < ?', (QUEUED, RUNNING, now)).fetchall()
+        for job_id, name, created, started, progress in rows:
+            logger.warning("Job %s was abandoned by its process", job_id)
+            message = "The server stopped during the conversion. Please upload the book again."
+            db.execute('UPDATE jobs SET state = ?, message = ?, finished = ?, last_event = last_event + 1'
+                       ' WHERE id = ?', (FAILED, message, now, job_id))
+            self._append_event(db, job_id, 'state', {
+                'id': job_id,
+                'name': name,
+                'state': FAILED,
+                'message': message,
+                'created': created,
+                'started': started,
+                'finished': now,
+                'progress': json.loads(progress or 'null'),
+            })
+
+    @staticmethod
+    def _in_flight(db, key, now):
+        if key is None:
+            return None
+        row = db.execute('SELECT id FROM jobs WHERE key = ? AND state IN (?, ?) AND lease_expires >= ?',
+                         (key, QUEUED, RUNNING, now)).fetchone()
+        return row[0] if row else None
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute('PRAGMA synchronous = NORMAL')
+            db.execute('PRAGMA foreign_keys = ON')
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self, immediate=True):
+        """A transaction; an immediate one takes the write lock at once, so it never fails half way for it."""
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+
+class JobQueue:
+    """
+    Runs jobs on a pool of worker threads, in the order they were submitted.
+
+    With a `store`, submitted jobs are recorded in it, and jobs that other
+    processes submitted to the store can be looked up with get(); those that
+    are not finished yet are followed by a thread that checks the store for
+    their new events every `poll_interval` seconds. Another thread renews the
+    leases of the queue's jobs in the store until it is shut down.
+
+    Args:
+        workers (int, optional): Jobs run at the same time. Defaults to DEFAULT_JOB_WORKERS.
+        max_pending (int, optional): Jobs waiting for a worker. Defaults to DEFAULT_MAX_PENDING_JOBS.
+        max_finished (int, optional): Finished jobs whose status is kept; the oldest
+            are forgotten first. Defaults to DEFAULT_MAX_FINISHED_JOBS.
+        store (JobStore, optional): Where jobs are shared with other processes. Defaults to None.
+        poll_interval (float, optional): Seconds between checks of the store.
+            Defaults to DEFAULT_STORE_POLL_SECONDS.
+    """
+
+    def __init__(self, workers=DEFAULT_JOB_WORKERS, max_pending=DEFAULT_MAX_PENDING_JOBS,
+                 max_finished=DEFAULT_MAX_FINISHED_JOBS, store=None, poll_interval=DEFAULT_STORE_POLL_SECONDS):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.store = store
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()  # by id, in submission order
+        self._in_flight = {}  # queued and running jobs with a key, by key
+        self._followed = {}  # unfinished jobs of other processes, by id
+        self._follower = None
+        self._stopped = threading.Event()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._heartbeat_stopped = threading.Event()
+        if store is not None:
+            threading.Thread(target=self._renew_leases, name='job-heartbeat', daemon=True).start()
+
+    def submit(self, job, function, *args, **kwargs):
+        """
+        Queues function(job, *args, **kwargs) for a new Job and returns `job`.
+
+        The function's return value becomes the job's result. A JobError
+        fails the job with its message; any other exception fails it with a
+        generic one and is logged.
+
+        If a job with the same key is queued or running, here or in another
+        process of the store, nothing is queued and that job is returned
+        instead, even when the queue is full.
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting.
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(job.key) if job.key is not None else None
+            if in_flight is not None:
+                return in_flight
+            full = self._pending >= self.max_pending
+            if not full:
+                self._pending += 1
+                # Registered before the store is asked, so that the same work submitted here meanwhile joins it
+                self._jobs[job.id] = job
+                if job.key is not None:
+                    self._in_flight[job.key] = job
+        if full:
+            in_flight_id = self.store.in_flight(job.key) if self.store is not None and job.key is not None else None
+            if in_flight_id is not None:
+                in_flight = self.get(in_flight_id)
+                if in_flight is not None:
+                    return in_flight
+            raise QueueFullError(f"{self._pending} jobs are already waiting")
+        if self.store is not None:
+            job.store = self.store
+            try:
+                in_flight_id = self.store.add(job)
+            except BaseException:
+                self._withdraw(job)
+                raise
+            if in_flight_id is not None:
+                self._withdraw(job)
+                return self.get(in_flight_id)
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Returns the job with the given id, submitted here or, with a store, to any process; or None."""
+        with self._lock:
+            job = self._jobs.get(job_id) or self._followed.get(job_id)
+        if job is not None or self.store is None:
+            return job
+        job = self.store.load(job_id)
+        if job is None or job.is_finished:
+            return job
+        with self._lock:
+            job = self._followed.setdefault(job_id, job)
+            if self._follower is None and not self._stopped.is_set():
+                self._follower = threading.Thread(target=self._follow, name='job-follower', daemon=True)
+                self._follower.start()
+        return job
+
+    @property
+    def pending(self):
+        """Number of jobs waiting for a worker."""
+        with self._lock:
+            return self._pending
+
+    def shutdown(self, wait=True):
+        """Stops the workers; queued jobs that have not started are failed, so their keys are free again."""
+        self._stopped.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            queued = [job for job in self._jobs.values() if job.state == QUEUED]
+        for job in queued:
+            job.message = "The server stopped before the conversion started."
+            if job._set_state(FAILED, expected=(QUEUED,)):
+                with self._lock:
+                    self._forget_in_flight(job)
+                job._done.set()
+        self._heartbeat_stopped.set()
+
+    def _run(self, job, function, args, kwargs):
+        with self._lock:
+            self._pending -= 1
+        job.started = time.time()
+        if not job._set_state(RUNNING, expected=(QUEUED,)):
+            logger.warning("Job %s was no longer queued", job.id)
+            with self._lock:
+                self._forget_in_flight(job)
+            self._catch_up(job)
+            return
+        state = FAILED
+        try:
+            job.result = function(job, *args, **kwargs)
+            state = DONE
+        except JobError as e:
+            job.message = str(e)
+            state = FAILED
+        except Exception:
+            logger.exception("Job %s failed", job.id)
+            job.message = "An unexpected error occurred during the conversion."
+            state = FAILED
+        finally:
+            finished = job._set_state(state, expected=(RUNNING,))
+            with self._lock:
+                self._forget_in_flight(job)
+            if finished:
+                self._forget_finished()
+                job._done.set()
+            else:
+                # E.g. its lease ran out and another process failed it
+                logger.warning("Job %s was no longer running", job.id)
+                self._catch_up(job)
+
+    def _catch_up(self, job):
+        """
+        Applies to a job whose stored state another process changed (e.g.
+        failed it for its lease) the events that process recorded for it.
+
+        A job the store no longer has as finished is dropped, the store having
+        it from now on, and its watchers are let go.
+        """
+        try:
+            for event_id, name, data in self.store.events_after(job.id, job.events.last_id):
+                job._replay(event_id, name, data)
+        except sqlite3.Error:
+            logger.exception("Could not catch up with job %s", job.id)
+        if not job.is_finished:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            job.events.close()
+            job._done.set()
+
+    def _withdraw(self, job):
+        """Takes back a job that submit() did not queue."""
+        with self._lock:
+            self._pending -= 1
+            self._jobs.pop(job.id, None)
+            self._forget_in_flight(job)
+
+    def _forget_in_flight(self, job):
+        if job.key is not None and self._in_flight.get(job.key) is job:
+            del self._in_flight[job.key]
+
+    def _forget_finished(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+        if self.store is not None:
+            self.store.forget_finished(self.max_finished)
+
+    def _renew_leases(self):
+        """Renews the leases of the jobs submitted here, three times per lease, until the queue is shut down."""
+        while not self._heartbeat_stopped.wait(self.store.lease / 3):
+            try:
+                self.store.renew()
+            except sqlite3.Error:
+                logger.exception("Could not renew the leases of the jobs")
+
+    def _follow(self):
+        """Replays the new events of the followed jobs until none is left unfinished."""
+        while not self._stopped.wait(self.poll_interval):
+            with self._lock:
+                jobs = list(self._followed.values())
+            for job in jobs:
+                try:
+                    for event_id, name, data in self.store.events_after(job.id, job.events.last_id):
+                        job._replay(event_id, name, data)
+                except sqlite3.Error:
+                    logger.exception("Could not follow job %s", job.id)
+            with self._lock:
+                for job in jobs:
+                    if job.is_finished:
+                        del self._followed[job.id]
+                if not self._followed:
+                    self._follower = None
+                    return
+        with self._lock:
+            self._follower = None
@@ -30,6 +30,57 @@ def main():
                         default='en', 
                         help="Optional: Language for the text-to-speech conversion (e.g., 'en', 'es'). Defaults to 'en'.")
     
+    parser.add_argument("--jobs",
+                        type=int,
+                        default=1,
+                        help="Optional: Number of worker processes used to extract text from EPUB chapters or PDF pages. "
+                             "Use 0 for one per CPU core. Defaults to 1.")
+    
+    parser.add_argument("--tts-backend",
+                        choices=('gtts', 'stub'),
+                        default='gtts',
+                        help="Optional: Text-to-speech engine. 'gtts' uses Google Text-to-Speech; 'stub' is a "
+                             "local engine that produces silence, for testing without network access. "
+                             "Defaults to 'gtts'.")
+    
+    parser.add_argument("--hedge-percentile",
+                        type=float,
+                        help="Optional: Send a second text-to-speech request for chunks that are still running "
+                             "after this percentile of recent latencies (e.g. 95), taking whichever finishes "
+                             "first. At most 5%% extra requests are sent. Off by default.")
+    
+    parser.add_argument("--split-chapters",
+                        action="store_true",
+                        help="Optional: Write one MP3 file per chapter (FB2 sections, EPUB documents, PDF "
+                             "bookmarks) and a playlist, in a directory named after the output file. "
+                             "Each chapter is saved as soon as it is done.")
+    
+    parser.add_argument("--chapter-jobs",
+                        type=int,
+                        default=2,
+                        help="Optional: With --split-chapters, the number of chapters converted at the "
+                             "same time. Defaults to 2.")
+    
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="Optional: Continue an interrupted conversion to the same output file, synthesizing "
+                             "only the chunks that are missing. The finished chunks are kept in "
+                             "<output_file>.parts until the audiobook is complete.")
+    
+    parser.add_argument("--cache-dir",
+                        help="Optional: Directory of the extraction cache, which keeps the text of books "
+                             "already converted. Defaults to ~/.cache/morthy/extraction.")
+    
+    parser.add_argument("--audio-cache-dir",
+                        help="Optional: Directory of the audio cache, which keeps the speech synthesized for "
+                             "each paragraph, so converting a book again only synthesizes what changed. "
+                             "Defaults to ~/.cache/morthy/audio.")
+    
+    parser.add_argument("--no-cache",
+                        action="store_true",
+                        help="Optional: Always extract the text and synthesize the speech again, "
+                             "without reading or updating the caches.")
+    
     args = parser.parse_args()
     
     # Determine default output file name if not provided
@@ -45,13 +96,15 @@ def main():
     try:
         # Import parser and tts functions
         from parser import extract_text_from_epub, extract_text_from_pdf, extract_text_from_fb2
-        from tts import convert_text_to_speech
+        from document import ExtractionError
+        from cache import ExtractionCache, default_extraction_cache_dir
+        from tts import convert_text_to_speech, AudioCache, RequestHedging, default_audio_cache_dir
+        from backends import create_backend
 
         # Determine file type and extract text
         _, file_extension = os.path.splitext(args.input_file)
         file_extension = file_extension.lower()
 
-        extracted_text = None
         print(f"\nExtracting text from {args.input_file}...")
 
         if not os.path.exists(args.input_file):
@@ -59,33 +112,72 @@ def main():
             return
 
         if file_extension == '.epub':
-            extracted_text = extract_text_from_epub(args.input_file)
+            extract, options = extract_text_from_epub, {'jobs': args.jobs}
         elif file_extension == '.pdf':
-            extracted_text = extract_text_from_pdf(args.input_file)
+            extract, options = extract_text_from_pdf, {'jobs': args.jobs}
         elif file_extension == '.fb2':
-            extracted_text = extract_text_from_fb2(args.input_file)
+            extract, options = extract_text_from_fb2, {}
         else:
             print(f"Error: Unsupported file type '{file_extension}'. Only .epub, .pdf, and .fb2 are supported.")
             return
 
-        # Check if text extraction was successful (parser functions return error strings on failure)
-        if extracted_text is None or extracted_text.startswith("Error:") or extracted_text.startswith("Info: FB2 body was parsed, but no text content was found"):
-            # Handle cases where parser returns an error message or no text
-            error_message = extracted_text if extracted_text else "Unknown error during text extraction."
-            if extracted_text is not None and extracted_text.startswith("Info: FB2 body was parsed, but no text content was found"):
-                 print(f"Info: No text content found in the document by the parser: {args.input_file}") # Specific message for empty FB2
+        cache = None
+        if not args.no_cache:
+            cache_dir = args.cache_dir or default_extraction_cache_dir()
+            try:
+                cache = ExtractionCache(cache_dir)
+            except OSError as e:
+                print(f"Warning: Cannot use the extraction cache in '{cache_dir}' ({e}); extracting without it.")
+
+        try:
+            if cache is None:
+                document = extract(args.input_file, **options)
             else:
-                 print(f"Error during text extraction: {error_message}")
+                document = cache.extract(args.input_file, file_extension[1:], extract, **options)
+        except ExtractionError as e:
+            print(f"Error during text extraction: {e}")
             return
 
-        if not extracted_text.strip(): # Check if extracted text is empty or only whitespace
+        if not document: # No text other than whitespace
             print(f"Info: No text content was extracted from '{args.input_file}'. Cannot generate audiobook.")
             return
 
         print("Text extracted successfully. Converting to speech...")
         
         # Convert text to speech
-        tts_success, tts_message = convert_text_to_speech(extracted_text, output_file, args.lang)
+        tts_options = {}
+        if not args.no_cache:
+            audio_cache_dir = args.audio_cache_dir or default_audio_cache_dir()
+            try:
+                tts_options['cache'] = AudioCache(audio_cache_dir)
+            except OSError as e:
+                print(f"Warning: Cannot use the audio cache in '{audio_cache_dir}' ({e}); synthesizing without it.")
+        if args.tts_backend != 'gtts':  # convert_text_to_speech defaults to gTTS
+            tts_options['backend'] = create_backend(args.tts_backend)
+        if args.hedge_percentile:
+            tts_options['hedging'] = RequestHedging(args.hedge_percentile)
+        if args.resume:
+            tts_options['resume'] = True
+
+        if args.split_chapters:
+            from chapters import convert_chapters
+            output_dir = os.path.splitext(output_file)[0]
+
+            def report(result):
+                if result.success:
+                    print(f"Chapter {result.number} saved as {result.filepath}.")
+                else:
+                    print(f"Error converting chapter {result.number} ({result.title}): {result.message}")
+
+            tts_success, tts_message = convert_chapters(document, output_dir, args.lang, jobs=args.chapter_jobs,
+                                                        on_chapter=report, **tts_options)
+            if tts_success:
+                print(f"Audiobook chapters saved in {output_dir}.")
+            else:
+                print(f"Error during TTS conversion: {tts_message}")
+            return
+
+        tts_success, tts_message = convert_text_to_speech(document, output_file, args.lang, **tts_options)
         
         if tts_success:
             print(f"Audiobook saved as {output_file}.")
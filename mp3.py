@@ -0,0 +1,358 @@
+"""
+Frame-level MP3 handling, without decoding.
+
+Synthesized speech arrives as one MP3 segment per chunk, each of which may
+start with an ID3 tag or a Xing/Info/VBRI header frame describing only that
+segment. MP3Assembler joins the segments into one stream: it keeps their
+audio frames as they are, drops the tags and per-segment headers, and puts a
+single Xing/Info header frame at the start of the file, with the frame count,
+byte count and a seek table (TOC) of the whole stream, so players show the
+right duration and seek quickly in long audiobooks.
+"""
+from typing import NamedTuple, Optional
+
+# MPEG versions, by the value of the version bits of a frame header.
+MPEG1 = '1'
+MPEG2 = '2'
+MPEG25 = '2.5'
+_VERSIONS = {3: MPEG1, 2: MPEG2, 0: MPEG25}
+_VERSION_BITS = {version: bits for bits, version in _VERSIONS.items()}
+# Layers, by the value of the layer bits.
+_LAYERS = {3: 1, 2: 2, 1: 3}
+_LAYER_BITS = {layer: bits for bits, layer in _LAYERS.items()}
+
+# Bitrates in kbit/s, by bitrate index; 0 is the free format, which is not supported.
+_BITRATES = {
+    (MPEG1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (MPEG1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (MPEG1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (MPEG2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (MPEG2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (MPEG2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {
+    MPEG1: (44100, 48000, 32000),
+    MPEG2: (22050, 24000, 16000),
+    MPEG25: (11025, 12000, 8000),
+}
+CHANNEL_MODE_MONO = 3
+
+# Flags of a Xing/Info header: which of the optional fields follow.
+XING_FRAMES = 0x1
+XING_BYTES = 0x2
+XING_TOC = 0x4
+TOC_SIZE = 100
+
+_ID3V2_HEADER_SIZE = 10
+_ID3V1_SIZE = 128
+_VBRI_OFFSET = 36
+
+
+class MP3Error(Exception):
+    """Raised for data that is not a stream of MPEG audio frames."""
+    pass
+
+
+def _bitrates(version, layer):
+    return _BITRATES[(MPEG2 if version == MPEG25 else version, layer)]
+
+
+class FrameHeader(NamedTuple):
+    """The fields of an MPEG audio frame header; bitrate in kbit/s, sample rate in Hz."""
+    version: str
+    layer: int
+    bitrate: int
+    sample_rate: int
+    padding: int = 0
+    channel_mode: int = CHANNEL_MODE_MONO
+    protected: bool = False
+
+    @property
+    def samples(self):
+        """Samples per channel in the frame."""
+        if self.layer == 1:
+            return 384
+        if self.layer == 3 and self.version != MPEG1:
+            return 576
+        return 1152
+
+    @property
+    def length(self):
+        """Bytes in the frame, header included."""
+        if self.layer == 1:
+            return (12 * self.bitrate * 1000 // self.sample_rate + self.padding) * 4
+        return self.samples // 8 * self.bitrate * 1000 // self.sample_rate + self.padding
+
+    @property
+    def side_info_size(self):
+        """Bytes of Layer III side information after the header (and CRC)."""
+        mono = self.channel_mode == CHANNEL_MODE_MONO
+        if self.version == MPEG1:
+            return 17 if mono else 32
+        return 9 if mono else 17
+
+    def to_bytes(self):
+        bitrate_index = _bitrates(self.version, self.layer).index(self.bitrate)
+        sample_rate_index = _SAMPLE_RATES[self.version].index(self.sample_rate)
+        return bytes([
+            0xFF,
+            0xE0 | _VERSION_BITS[self.version] << 3 | _LAYER_BITS[self.layer] << 1 | (0 if self.protected else 1),
+            bitrate_index << 4 | sample_rate_index << 2 | self.padding << 1,
+            self.channel_mode << 6,
+        ])
+
+
+def parse_frame_header(data, offset=0):
+    """Returns the FrameHeader at data[offset:], or None if there is no valid frame header there."""
+    if len(data) - offset < 4:
+        return None
+    b0, b1, b2, b3 = data[offset:offset + 4]
+    if b0 != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version = _VERSIONS.get(b1 >> 3 & 3)
+    layer = _LAYERS.get(b1 >> 1 & 3)
+    bitrate_index = b2 >> 4
+    sample_rate_index = b2 >> 2 & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    return FrameHeader(version, layer, _bitrates(version, layer)[bitrate_index],
+                       _SAMPLE_RATES[version][sample_rate_index], b2 >> 1 & 1, b3 >> 6, not b1 & 1)
+
+
+def _id3v2_size(data, offset):
+    """Returns the size of the ID3v2 tag at data[offset:], footer included."""
+    flags = data[offset + 5]
+    size = 0
+    for byte in data[offset + 6:offset + 10]:
+        size = size << 7 | byte & 0x7F  # "syncsafe" integer
+    footer = _ID3V2_HEADER_SIZE if flags & 0x10 else 0
+    return _ID3V2_HEADER_SIZE + size + footer
+
+
+def _is_vbr_header(data, offset, header):
+    """Whether the frame at `offset` is a Xing, Info or VBRI header rather than audio."""
+    if header.layer != 3:
+        return False
+    tag_offset = offset + 4 + (2 if header.protected else 0) + header.side_info_size
+    return (data[tag_offset:tag_offset + 4] in (b'Xing', b'Info')
+            or data[offset + _VBRI_OFFSET:offset + _VBRI_OFFSET + 4] == b'VBRI')
+
+
+class AudioFrames(NamedTuple):
+    """The audio frames of an MP3 segment: their bytes, count, first header, and bitrate (None if it varies)."""
+    data: bytes
+    frames: int
+    header: Optional[FrameHeader]
+    bitrate: Optional[int]
+
+
+def audio_frames(data):
+    """
+    Returns the audio frames of an MP3 segment, without its tags and VBR headers.
+
+    ID3v2 tags (wherever they are), a trailing ID3v1 tag and Xing, Info or
+    VBRI header frames are dropped, as is an incomplete frame at the end.
+
+    Raises:
+        MP3Error: If something else than a frame or tag is found.
+    """
+    view = memoryview(data)
+    runs = []  # (start, end) of the runs of audio frames to keep
+    run_start = None
+    position = 0
+    frames = 0
+    first = None
+    bitrate = None
+    while position < len(data):
+        if data[position:position + 3] == b'ID3' and len(data) - position >= _ID3V2_HEADER_SIZE:
+            skip = _id3v2_size(data, position)
+        elif data[position:position + 3] == b'TAG' and len(data) - position == _ID3V1_SIZE:
+            skip = _ID3V1_SIZE
+        else:
+            header = parse_frame_header(data, position)
+            if header is None:
+                raise MP3Error(f"No MPEG audio frame at byte {position}")
+            length = header.length
+            if position + length > len(data):
+                skip = len(data) - position  # cut short
+            elif _is_vbr_header(data, position, header):
+                skip = length
+            else:
+                if first is None:
+                    first, bitrate = header, header.bitrate
+                elif header.bitrate != bitrate:
+                    bitrate = None
+                if run_start is None:
+                    run_start = position
+                frames += 1
+                position += length
+                continue
+        if run_start is not None:
+            runs.append((run_start, position))
+            run_start = None
+        position += skip
+    if run_start is not None:
+        runs.append((run_start, position))
+    return AudioFrames(b''.join(view[start:end] for start, end in runs), frames, first, bitrate)
+
+
+def xing_header_frame(header, frames, size, toc, vbr):
+    """
+    Returns a Xing (VBR) or Info (CBR) header frame in the format of `header`.
+
+    Args:
+        header (FrameHeader): Any audio frame of the stream, for its format.
+        frames (int): Audio frames in the stream, the header frame excluded.
+        size (int): Bytes in the stream, the header frame included.
+        toc (bytes): The seek table, TOC_SIZE bytes (see seek_table()).
+        vbr (bool): Whether the bitrate varies.
+    """
+    template = FrameHeader(header.version, 3, 0, header.sample_rate, channel_mode=header.channel_mode)
+    tag_offset = 4 + template.side_info_size
+    needed = tag_offset + 16 + TOC_SIZE
+    # The lowest bitrate whose frames hold the tag
+    for bitrate in _bitrates(header.version, 3)[1:]:
+        frame_header = template._replace(bitrate=bitrate)
+        if frame_header.length >= needed:
+            break
+    frame = bytearray(frame_header.length)
+    frame[:4] = frame_header.to_bytes()
+    fields = ((b'Xing' if vbr else b'Info')
+              + (XING_FRAMES | XING_BYTES | XING_TOC).to_bytes(4, 'big')
+              + frames.to_bytes(4, 'big') + size.to_bytes(4, 'big') + bytes(toc))
+    frame[tag_offset:tag_offset + len(fields)] = fields
+    return bytes(frame)
+
+
+def silent_frame(frame):
+    """
+    Returns a frame of the same format and length as `frame` whose side
+    information and data are all zeros, so it decodes as silence.
+
+    Streams whose header frame is not final yet (see MP3Assembler) can be
+    served with it in place of the header, keeping every later byte at the
+    offset it will have in the finished file.
+    """
+    header = parse_frame_header(frame)
+    if header is None:
+        raise MP3Error("Not an MP3 frame")
+    return header._replace(protected=False).to_bytes() + bytes(header.length - 4)
+
+
+def seek_table(segments):
+    """
+    Returns the TOC of a stream made of segments, given as (frames, bytes) pairs in order.
+
+    Entry i is the position of the frame i percent into the stream, in
+    1/256ths of the stream's size; positions within a segment are
+    interpolated, which is exact for constant-bitrate audio.
+    """
+    total_frames = sum(frames for frames, _ in segments)
+    total_bytes = sum(size for _, size in segments)
+    toc = bytearray(TOC_SIZE)
+    if not total_frames or not total_bytes:
+        return bytes(toc)
+    segment_iter = iter(segments)
+    start_frames = start_bytes = 0
+    frames, size = next(segment_iter)
+    for percent in range(TOC_SIZE):
+        target = total_frames * percent / TOC_SIZE
+        while start_frames + frames <= target:
+            start_frames += frames
+            start_bytes += size
+            frames, size = next(segment_iter)
+        position = start_bytes + (target - start_frames) / frames * size
+        toc[percent] = min(255, int(position * 256 / total_bytes))
+    return bytes(toc)
+
+
+class MP3Assembler:
+    """
+    Joins MP3 segments into one stream with a single Xing/Info header, without decoding.
+
+    write() appends the audio frames of a segment (see audio_frames()); the
+    first one is preceded by a placeholder header frame, which finish()
+    overwrites with the header of the whole stream, so the output file must
+    be seekable. To continue a stream, pass the file positioned at its end
+    and the `segments` it already holds.
+
+    Args:
+        output_file: A seekable binary file object.
+        segments (iterable, optional): (frames, bytes, bitrate) of each
+            segment written before, the header frame counted in the first.
+
+    Raises:
+        MP3Error: From write(), for segments that are not MP3 or whose
+            format differs from the first one's.
+    """
+
+    def __init__(self, output_file, segments=()):
+        self.output_file = output_file
+        self.segments = [tuple(segment) for segment in segments]
+        self.header = None  # of the first audio frame
+        if self.segments:
+            position = output_file.tell()
+            output_file.seek(0)
+            self.header = parse_frame_header(output_file.read(4))
+            output_file.seek(position)
+
+    def write(self, data):
+        """
+        Appends the audio frames of a segment.
+
+        Returns:
+            AudioFrames: The frames written.
+            int: Bytes written, header frame included.
+        """
+        frames = audio_frames(data)
+        written = 0
+        if frames.header is not None:
+            if self.header is None:
+                self.header = frames.header
+                placeholder = xing_header_frame(self.header, 0, 0, bytes(TOC_SIZE), vbr=False)
+                written += self.output_file.write(placeholder)
+            elif (frames.header.version, frames.header.layer, frames.header.sample_rate) != \
+                    (self.header.version, self.header.layer, self.header.sample_rate):
+                raise MP3Error(f"Segment is MPEG-{frames.header.version} Layer {frames.header.layer} at "
+                               f"{frames.header.sample_rate} Hz, the stream MPEG-{self.header.version} "
+                               f"Layer {self.header.layer} at {self.header.sample_rate} Hz")
+            written += self.output_file.write(frames.data)
+        self.segments.append((frames.frames, written, frames.bitrate))
+        return frames, written
+
+    def finish(self):
+        """Writes the header of the whole stream in place of the placeholder."""
+        if self.header is None:
+            return
+        bitrates = {bitrate for frames, _, bitrate in self.segments if frames}
+        vbr = len(bitrates) != 1 or None in bitrates
+        frames = sum(frames for frames, _, _ in self.segments)
+        size = sum(size for _, size, _ in self.segments)
+        toc = seek_table([(frames, size) for frames, size, _ in self.segments])
+        position = self.output_file.tell()
+        self.output_file.seek(0)
+        self.output_file.write(xing_header_frame(self.header, frames, size, toc, vbr))
+        self.output_file.seek(position)
+
+
+def stream_duration(data):
+    """
+    Returns the duration in seconds given by the Xing/Info header at the start of an MP3 stream.
+
+    Args:
+        data (bytes): The start of the stream; the header frame is enough.
+
+    Returns:
+        float or None: None if the stream has no header with a frame count.
+    """
+    header = parse_frame_header(data)
+    if header is None or header.layer != 3:
+        return None
+    tag_offset = 4 + (2 if header.protected else 0) + header.side_info_size
+    if data[tag_offset:tag_offset + 4] not in (b'Xing', b'Info'):
+        return None
+    flags = int.from_bytes(data[tag_offset + 4:tag_offset + 8], 'big')
+    if not flags & XING_FRAMES:
+        return None
+    frames = int.from_bytes(data[tag_offset + 8:tag_offset + 12], 'big')
+    return frames * header.samples / header.sample_rate
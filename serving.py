@@ -0,0 +1,208 @@
+"""
+Serving finished audiobooks over HTTP.
+
+send_audio() answers a request for an MP3 file with:
+
+* a strong ETag, the SHA-256 of the file's content, so a client that has the
+  file gets 304 Not Modified for `If-None-Match` instead of the whole file.
+  Hashing a large file takes a while, so the tag is computed once per version
+  of the file (its size, modification time and inode) and remembered;
+  file_etag() can be called when the file is written to have it ready;
+* single byte ranges, `If-Range` and the file itself through Werkzeug's
+  send_file, which hands the open file to the WSGI server's file wrapper, so
+  servers that support it (gunicorn, for one) use sendfile() and the worker
+  never copies the audio; with Flask's USE_X_SENDFILE the file is left to
+  the front server entirely;
+* several byte ranges at once as a multipart/byteranges response;
+* or, with `accel_redirect`, an `X-Accel-Redirect` to an internal nginx
+  location that serves the file, ranges included, after the conditional
+  check has been made here.
+"""
+from collections import OrderedDict
+import os
+import re
+import threading
+from urllib.parse import quote
+import uuid
+
+from flask import Response, request, send_file
+
+from cache import file_sha256
+
+AUDIO_MIMETYPE = 'audio/mpeg'
+# Most ranges in one request; requests for more are answered with the whole file.
+MAX_RANGES = 16
+# Files whose ETag is remembered.
+ETAG_CACHE_SIZE = 1024
+
+_BLOCK_SIZE = 64 * 1024
+_RANGE_SPEC_RE = re.compile(r'(\d*)-(\d*)$')
+
+_etags = OrderedDict()  # path -> (file version, ETag)
+_etags_lock = threading.Lock()
+
+
+def file_etag(filepath, stat=None):
+    """Returns the strong ETag of a file (its hex SHA-256), computed once per version of the file."""
+    stat = stat or os.stat(filepath)
+    version = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    with _etags_lock:
+        cached = _etags.get(filepath)
+        if cached is not None and cached[0] == version:
+            _etags.move_to_end(filepath)
+            return cached[1]
+    etag = file_sha256(filepath)
+    with _etags_lock:
+        _etags[filepath] = (version, etag)
+        _etags.move_to_end(filepath)
+        while len(_etags) > ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return etag
+
+
+def parse_ranges(header):
+    """
+    Parses a 'bytes=' Range header into (start, stop) ranges, stop exclusive.
+
+    An open range has stop None; a suffix range of the last n bytes is
+    (-n, None). Unlike Werkzeug's parser, this one accepts overlapping and
+    unordered ranges, which clients may send. Returns None for a missing or
+    malformed header.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    ranges = []
+    for spec in header[len('bytes='):].split(','):
+        match = _RANGE_SPEC_RE.match(spec.strip())
+        if match is None or match.group() == '-':
+            return None
+        first, last = match.groups()
+        if not first:
+            ranges.append((-int(last), None))
+        elif not last:
+            ranges.append((int(first), None))
+        elif int(last) >= int(first):
+            ranges.append((int(first), int(last) + 1))
+        else:
+            return None
+    return ranges
+
+
+def satisfiable_ranges(ranges, size):
+    """
+    Returns the (start, stop) ranges from parse_ranges() that lie within a file of `size` bytes.
+
+    Ranges past the end are dropped, and overlapping or adjacent ones are
+    merged, so the list is sorted and disjoint; it is empty if no range can
+    be satisfied.
+    """
+    satisfiable = []
+    for start, stop in ranges:
+        if start < 0:
+            start, stop = max(0, size + start), size
+        else:
+            stop = size if stop is None else min(stop, size)
+        if start < stop:
+            satisfiable.append((start, stop))
+    merged = []
+    for start, stop in sorted(satisfiable):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def send_audio(filepath, download_name=None, as_attachment=True, accel_redirect=None):
+    """
+    Returns the response to a GET of an audio file; see the module docstring.
+
+    Args:
+        filepath (str): The file; must exist.
+        download_name (str, optional): The file name given to the client. Defaults to the file's name.
+        as_attachment (bool, optional): Ask the browser to save the file. Defaults to True.
+        accel_redirect (str, optional): An internal nginx location the file is
+            served from by name (e.g. '/protected/audio/'). Defaults to None,
+            which serves it from here.
+    """
+    stat = os.stat(filepath)
+    etag = file_etag(filepath, stat)
+    download_name = download_name or os.path.basename(filepath)
+    ranges = parse_ranges(request.headers.get('Range'))
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+
+    if accel_redirect is not None:
+        response = Response(mimetype=AUDIO_MIMETYPE)
+        response.headers['X-Accel-Redirect'] = accel_redirect.rstrip('/') + '/' + quote(os.path.basename(filepath))
+        if as_attachment:
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    elif ranges is not None and len(ranges) > 1:
+        if len(ranges) <= MAX_RANGES and _if_range_current(etag):
+            response = _multipart_ranges(filepath, satisfiable_ranges(ranges, stat.st_size), stat.st_size)
+        else:
+            # The whole file; Werkzeug's range handling would refuse the multiple ranges
+            response = send_file(filepath, mimetype=AUDIO_MIMETYPE, as_attachment=as_attachment,
+                                 download_name=download_name, conditional=False, etag=etag)
+    else:
+        response = send_file(filepath, mimetype=AUDIO_MIMETYPE, as_attachment=as_attachment,
+                             download_name=download_name, conditional=True, etag=etag)
+    response.set_etag(etag)
+    response.accept_ranges = 'bytes'
+    # Clients keep the file but check it is current, which costs a 304 when it is
+    response.cache_control.no_cache = True
+    return response
+
+
+def _if_range_current(etag):
+    """Whether If-Range, if any, names the current file; a date is never taken as current."""
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        return True
+    return if_range.etag == etag
+
+
+def _multipart_ranges(filepath, ranges, size):
+    if not ranges:
+        return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+    if len(ranges) == 1:
+        # The ranges merged into one
+        start, stop = ranges[0]
+        response = Response(_read_ranges(filepath, [(b'', start, stop)], b''), status=206,
+                            mimetype=AUDIO_MIMETYPE)
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        response.content_length = stop - start
+        return response
+
+    boundary = uuid.uuid4().hex
+    parts = []
+    for start, stop in ranges:
+        # Each part but the first starts with the line break that ends the previous one
+        delimiter = f'\r\n--{boundary}' if parts else f'--{boundary}'
+        part_header = (f'{delimiter}\r\nContent-Type: {AUDIO_MIMETYPE}\r\n'
+                       f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n').encode('ascii')
+        parts.append((part_header, start, stop))
+    closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    response = Response(_read_ranges(filepath, parts, closing), status=206,
+                        mimetype=f'multipart/byteranges; boundary={boundary}')
+    response.content_length = sum(len(header) + stop - start for header, start, stop in parts) + len(closing)
+    return response
+
+
+def _read_ranges(filepath, parts, closing):
+    with open(filepath, 'rb') as f:
+        for part_header, start, stop in parts:
+            yield part_header
+            f.seek(start)
+            position = start
+            while position < stop:
+                data = f.read(min(_BLOCK_SIZE, stop - position))
+                if not data:
+                    return
+                yield data
+                position += len(data)
+    yield closing
@@ -0,0 +1,203 @@
+"""
+Disk quota for the files the web app keeps, such as generated audiobooks.
+
+StorageManager keeps an index of the files in a directory, with their size
+and last access, so that enforcing the quota never rescans the directory:
+it is scanned once, when the manager is created, and from then on files are
+registered with add() when they are written and touch()ed when they are
+read. Once the files take more than `max_bytes`, the least recently used
+ones are deleted. The eviction order is a heap of (last access, path)
+entries, so the next file to evict is found in O(log n). Touching a file
+pushes a new entry rather than moving the old one; entries that no longer
+match their file are skipped when they reach the top, and the heap is
+rebuilt once they outnumber the live ones.
+
+Files are pinned while a job still needs them (e.g. the output of a
+conversion in progress) and are not evicted until they are unpinned. The
+last access is also written to the file's access time, leaving its
+modification time alone, so the order survives a restart.
+
+The parts directories of conversions (`<output>.parts`, see checkpoint.py)
+count against the budget too, with the size of the files in them. One is
+pinned with its output, so only those of conversions that failed or were
+abandoned are evicted, oldest written first.
+"""
+from contextlib import contextmanager
+import heapq
+import itertools
+import os
+import shutil
+import threading
+import time
+
+from checkpoint import PARTS_SUFFIX
+
+# Default size budget of the generated audiobooks.
+DEFAULT_GENERATED_AUDIO_BYTES = 10 * 1024 * 1024 * 1024
+
+# Stale heap entries tolerated, beyond the live ones, before the heap is rebuilt.
+_STALE_HEAP_ENTRIES = 64
+
+
+class StorageManager:
+    """
+    The files of a directory, evicted least-recently-used under a size budget.
+
+    Regular files and parts directories directly in the directory are
+    managed; other directories are left alone.
+
+    Args:
+        directory (str): The managed directory; created if missing.
+        max_bytes (int): Size budget for all files together.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._files = {}  # path -> [size, last access, order of the access]
+        self._heap = []  # (last access, order, path); stale when the order differs from _files
+        self._order = itertools.count()  # breaks ties between equal access times
+        self._pins = {}  # path -> count
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        self._index(os.path.abspath(entry.path), stat.st_size, stat.st_atime)
+                    elif entry.name.endswith(PARTS_SUFFIX) and entry.is_dir(follow_symlinks=False):
+                        self._index(os.path.abspath(entry.path), *_parts_usage(entry.path))
+                except FileNotFoundError:
+                    continue
+        with self._lock:
+            self._evict()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._files
+
+    def add(self, path):
+        """Registers a file that was written (or rewritten) as just used, then evicts if over budget."""
+        path = os.path.abspath(path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._forget(path)
+            # A finished output no longer has parts
+            self._forget(path + PARTS_SUFFIX)
+            self._index(path, size, time.time())
+            return self._evict()
+
+    def touch(self, path):
+        """Marks a managed file as just used; unknown files are ignored."""
+        path = os.path.abspath(path)
+        now = time.time()
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                return
+            entry[1:] = now, next(self._order)
+            heapq.heappush(self._heap, (entry[1], entry[2], path))
+            self._compact()
+        try:
+            os.utime(path, ns=(int(now * 1e9), os.stat(path).st_mtime_ns))
+        except FileNotFoundError:
+            pass
+
+    def remove(self, path):
+        """Deletes a file or parts directory, managed or not, if it exists."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._forget(path)
+        _delete(path)
+
+    def pin(self, path):
+        """
+        Keeps a file, which need not exist yet, and its parts directory from
+        being evicted until it is unpinned as often.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def unpin(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            count = self._pins.pop(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+
+    @contextmanager
+    def pinned(self, path):
+        """Pins a file for the duration of a with block."""
+        self.pin(path)
+        try:
+            yield
+        finally:
+            self.unpin(path)
+
+    def evict(self):
+        """Deletes least recently used files until the total fits in max_bytes; returns their paths."""
+        with self._lock:
+            return self._evict()
+
+    def _index(self, path, size, accessed):
+        entry = self._files[path] = [size, accessed, next(self._order)]
+        self.total_bytes += size
+        heapq.heappush(self._heap, (accessed, entry[2], path))
+
+    def _forget(self, path):
+        entry = self._files.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+            self._compact()
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._files) + _STALE_HEAP_ENTRIES:
+            self._heap = [(accessed, order, path) for path, (_, accessed, order) in self._files.items()]
+            heapq.heapify(self._heap)
+
+    def _evict(self):
+        evicted = []
+        skipped = []  # pinned files, pushed back once done
+        while self.total_bytes > self.max_bytes and self._heap:
+            item = heapq.heappop(self._heap)
+            _, order, path = item
+            entry = self._files.get(path)
+            if entry is None or entry[2] != order:
+                continue  # stale
+            if path in self._pins or (path.endswith(PARTS_SUFFIX) and path[:-len(PARTS_SUFFIX)] in self._pins):
+                skipped.append(item)
+                continue
+            del self._files[path]
+            self.total_bytes -= entry[0]
+            _delete(path)
+            evicted.append(path)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return evicted
+
+
+def _parts_usage(path):
+    """Returns the size of the files in a parts directory and when the last of them was written."""
+    size, written = 0, os.stat(path).st_mtime
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                size += stat.st_size
+                written = max(written, stat.st_mtime)
+    return size, written
+
+
+def _delete(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,122 @@
+"""
+Progressive streaming of audiobooks that are still being converted.
+
+While a conversion runs, its audio is assembled in the checkpoint's partial
+file (see checkpoint.py), and the job's progress reports how many bytes of
+it are complete. PartialAudio reads that prefix, with the placeholder
+header frame replaced by a silent frame of the same length, so the bytes
+served for an offset are the bytes the finished file has there (apart from
+its first frame) and a player can keep the offsets it has seen across the
+end of the conversion. follow() yields a range of the audio, waiting for
+the bytes that are not written yet, until the job is finished.
+"""
+import re
+
+from checkpoint import partial_path_for
+from mp3 import parse_frame_header, silent_frame
+
+# Bytes read from the partial file at a time.
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_BYTE_RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+def parse_byte_range(header):
+    """
+    Parses a Range header with one 'bytes=start-end' or 'bytes=start-' range.
+
+    Returns:
+        tuple or None: (start, end), end inclusive or None if open; None for
+        a missing header and for ranges that cannot be served before the
+        length of the audio is known (suffix and multiple ranges), which are
+        then ignored.
+    """
+    match = _BYTE_RANGE_RE.match((header or '').replace(' ', ''))
+    if match is None:
+        return None
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else None
+    if end is not None and end < start:
+        return None
+    return start, end
+
+
+def audio_available(job):
+    """Returns the bytes of a job's audio that are complete, header frame included."""
+    return job.progress['bytes_written'] if job.progress else 0
+
+
+def wait_for_audio(job, size, timeout):
+    """
+    Waits until more than `size` bytes of a job's audio are complete or the job is finished.
+
+    Returns:
+        int: The bytes complete, which may still be `size` or less after `timeout` seconds.
+    """
+    after = job.events.last_id
+    while audio_available(job) <= size and not job.is_finished:
+        events = job.events.wait(after, timeout)
+        if not events:
+            break
+        after = events[-1][0]
+    return audio_available(job)
+
+
+class PartialAudio:
+    """
+    The audio of a conversion in progress, read from its partial file.
+
+    The file stays readable after the conversion renames it to the output
+    file. Raises FileNotFoundError if there is no partial file, e.g. because
+    the conversion has already finished.
+
+    Args:
+        output_filepath (str): The MP3 file the conversion produces.
+    """
+
+    def __init__(self, output_filepath):
+        self._file = open(partial_path_for(output_filepath), 'rb')
+        try:
+            header = self._file.read(4)
+            if parse_frame_header(header) is None:
+                raise FileNotFoundError(f"No audio in the partial file of {output_filepath}")
+            self._first_frame = silent_frame(header)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def read(self, position, size):
+        """Returns up to `size` bytes from `position`; only complete bytes should be asked for."""
+        self._file.seek(position)
+        data = self._file.read(size)
+        if position < len(self._first_frame):
+            data = self._first_frame[position:position + len(data)] + data[len(self._first_frame) - position:]
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def follow(job, audio, start, end, timeout):
+    """
+    Yields bytes start to end (inclusive; None for all) of a job's audio as they are written.
+
+    Stops at `end`, or once the job is finished and all its audio has been
+    yielded; while waiting for new bytes, yields b'' every `timeout`
+    seconds, so the caller may notice a client that went away.
+    """
+    position = start
+    while end is None or position <= end:
+        available = wait_for_audio(job, position, timeout)
+        if available <= position:
+            if job.is_finished:
+                return
+            yield b''
+            continue
+        stop = available if end is None else min(available, end + 1)
+        while position < stop:
+            data = audio.read(position, min(STREAM_BLOCK_SIZE, stop - position))
+            if not data:
+                return
+            yield data
+            position += len(data)
@@ -0,0 +1,147 @@
+import unittest
+from unittest.mock import MagicMock
+import base64
+import os
+import sys
+import time
+
+import requests
+
+# Add project root to sys.path to allow importing backends module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from backends import (GTTSBackend, StubBackend, BackendCapabilities, create_backend,
+                      MP3_FRAME_BYTES, MP3_SAMPLE_RATE, MP3_SAMPLES_PER_FRAME)
+from gtts import gTTSError
+from transport import HTTPTransport, RetryPolicy
+
+
+def gtts_response(status_code=200, audio=b'', headers=None):
+    """Builds a response like the ones Google Text-to-Speech sends."""
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = 'Too Many Requests' if status_code == 429 else 'OK'
+    response.headers.update(headers or {})
+    encoded = base64.b64encode(audio).decode('ascii')
+    response._content = (')]}\'\n\n123\n[["wrb.fr","jQ1olc","[\\"' + encoded + '\\"]",null,null,null,"generic"]]\n').encode('utf-8')
+    response._content_consumed = True
+    return response
+
+
+def parse_mp3_frames(data):
+    """Returns the (version, layer, bitrate index, sample rate index, channel mode) of each frame."""
+    frames = []
+    offset = 0
+    while offset < len(data):
+        header = int.from_bytes(data[offset:offset + 4], 'big')
+        if header >> 21 != 0x7FF:
+            raise AssertionError(f"no frame sync at offset {offset}")
+        frames.append(((header >> 19) & 3, (header >> 17) & 3, (header >> 12) & 15,
+                       (header >> 10) & 3, (header >> 6) & 3))
+        offset += MP3_FRAME_BYTES
+    return frames
+
+
+class TestStubBackend(unittest.TestCase):
+
+    def test_emits_mpeg2_layer3_24khz_32kbps_mono_frames(self):
+        data = StubBackend().synthesize("Some text to read.", 'en')
+        self.assertEqual(len(data) % MP3_FRAME_BYTES, 0)
+        frames = parse_mp3_frames(data)
+        # version 2 = MPEG-2, layer 1 = Layer III, bitrate index 4 = 32 kbps, sample rate index 1 = 24 kHz, mode 3 = mono
+        self.assertEqual(set(frames), {(2, 1, 4, 1, 3)})
+        # 32 kbps * 576 samples / 24 kHz / 8 bits = 96 bytes per frame
+        self.assertEqual(32000 * MP3_SAMPLES_PER_FRAME // MP3_SAMPLE_RATE // 8, MP3_FRAME_BYTES)
+
+    def test_audio_length_is_proportional_to_text(self):
+        backend = StubBackend(seconds_per_char=0.05)
+        for length in (20, 200, 2000):
+            frames = len(backend.synthesize("x" * length, 'en')) // MP3_FRAME_BYTES
+            seconds = frames * MP3_SAMPLES_PER_FRAME / MP3_SAMPLE_RATE
+            self.assertAlmostEqual(seconds, length * 0.05, delta=MP3_SAMPLES_PER_FRAME / MP3_SAMPLE_RATE)
+
+    def test_is_deterministic(self):
+        self.assertEqual(StubBackend().synthesize("Same text.", 'en'), StubBackend().synthesize("Same text.", 'en'))
+
+    def test_latency(self):
+        backend = StubBackend(latency=0.02, latency_per_char=0.001)
+        started = time.perf_counter()
+        backend.synthesize("x" * 10, 'en')
+        self.assertGreaterEqual(time.perf_counter() - started, 0.03)
+
+    def test_capabilities(self):
+        capabilities = StubBackend(max_chunk_chars=100, max_concurrency=3).capabilities
+        self.assertEqual(capabilities, BackendCapabilities(max_chunk_chars=100, max_concurrency=3, languages=None))
+        StubBackend().check_language('any-language')
+
+
+class TestGTTSBackend(unittest.TestCase):
+
+    def backend(self, *responses):
+        session = MagicMock()
+        session.send.side_effect = list(responses)
+        transport = HTTPTransport(retry=RetryPolicy(attempts=3), session=session, sleep=lambda seconds: None)
+        return GTTSBackend(transport=transport), session
+
+    def test_synthesize_joins_the_audio_of_each_request(self):
+        backend, session = self.backend(gtts_response(audio=b'first '), gtts_response(audio=b'second'))
+        text = "A sentence long enough to be split by gTTS into two separate requests to the API. " * 2
+        self.assertEqual(backend.synthesize(text, 'en'), b'first second')
+        self.assertEqual(session.send.call_count, 2)
+
+    def test_throttled_request_is_retried(self):
+        backend, session = self.backend(gtts_response(429, headers={'Retry-After': '0'}), gtts_response(audio=b'mp3'))
+        self.assertEqual(backend.synthesize("Hello", 'en'), b'mp3')
+        self.assertEqual(backend.transport.throttled, 1)
+        self.assertEqual(backend.transport.retries, 1)
+
+    def test_connection_error_is_retried(self):
+        backend, session = self.backend(requests.ConnectionError("reset"), gtts_response(audio=b'mp3'))
+        self.assertEqual(backend.synthesize("Hello", 'en'), b'mp3')
+
+    def test_persistent_failure_raises_gtts_error(self):
+        backend, session = self.backend(*[gtts_response(503)] * 3)
+        with self.assertRaisesRegex(gTTSError, "503"):
+            backend.synthesize("Hello", 'en')
+        self.assertEqual(session.send.call_count, 3)
+
+    def test_forbidden_is_not_retried(self):
+        backend, session = self.backend(gtts_response(403))
+        with self.assertRaisesRegex(gTTSError, "403"):
+            backend.synthesize("Hello", 'en')
+
+    def test_response_without_audio_raises_gtts_error(self):
+        response = gtts_response()
+        response._content = b'[["wrb.fr","jQ1olc",null]]\n'
+        backend, session = self.backend(response)
+        with self.assertRaises(gTTSError):
+            backend.synthesize("Hello", 'en')
+
+    def test_backends_share_the_process_transport(self):
+        self.assertIs(GTTSBackend().transport, GTTSBackend(slow=True).transport)
+
+    def test_check_language(self):
+        backend = GTTSBackend()
+        self.assertIn('en', backend.capabilities.languages)
+        backend.check_language('en')
+        backend.check_language('en-us')  # deprecated, mapped to 'en' by gTTS
+        with self.assertRaisesRegex(ValueError, "Language not supported: xx"):
+            backend.check_language('xx')
+
+
+class TestCreateBackend(unittest.TestCase):
+
+    def test_create_by_name(self):
+        self.assertIsInstance(create_backend('gtts'), GTTSBackend)
+        backend = create_backend('stub', latency=0.5)
+        self.assertIsInstance(backend, StubBackend)
+        self.assertEqual(backend.latency, 0.5)
+
+    def test_unknown_backend(self):
+        with self.assertRaisesRegex(ValueError, "Unknown TTS backend: espeak"):
+            create_backend('espeak')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+import hashlib
+import shutil
+import tempfile
+
+# Add project root to sys.path to allow importing cache module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import cache
+from cache import DiskCache, ExtractionCache, file_sha256
+from document import Document, CorruptDocumentError
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _set_age(self, store, key, seconds_ago):
+        path = store._path(key)
+        mtime = os.path.getmtime(path) - seconds_ago
+        os.utime(path, (mtime, mtime))
+
+    def test_round_trip_compressed_and_plain(self):
+        for compress in (True, False):
+            with self.subTest(compress=compress):
+                store = DiskCache(os.path.join(self.cache_dir, str(compress)), max_bytes=1 << 20, compress=compress)
+                self.assertIsNone(store.get('missing'))
+                store.put('key', b'payload ' * 100)
+                self.assertEqual(store.get('key'), b'payload ' * 100)
+
+    def test_entries_are_compressed(self):
+        store = DiskCache(self.cache_dir, max_bytes=1 << 20)
+        store.put('key', b'a' * 100000)
+        self.assertLess(os.path.getsize(store._path('key')), 1000)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        store = DiskCache(self.cache_dir, max_bytes=2500, compress=False)
+        for key, age in (('old', 30), ('used', 20), ('new', 10)):
+            store.put(key, os.urandom(1000))
+            self._set_age(store, key, age)
+        store.get('used')  # refreshes its position
+        store.put('newest', os.urandom(1000))
+        self.assertIsNone(store.get('old'))
+        self.assertIsNone(store.get('new'))
+        self.assertIsNotNone(store.get('used'))
+        self.assertIsNotNone(store.get('newest'))
+
+    def test_corrupt_entry_is_a_miss(self):
+        store = DiskCache(self.cache_dir, max_bytes=1 << 20)
+        with open(store._path('key'), 'wb') as f:
+            f.write(b'not zlib data')
+        self.assertIsNone(store.get('key'))
+        self.assertFalse(os.path.exists(store._path('key')))
+
+    def test_no_temporary_files_are_left_behind(self):
+        store = DiskCache(self.cache_dir, max_bytes=1 << 20)
+        store.put('key', b'data')
+        self.assertEqual(os.listdir(self.cache_dir), ['key.cache'])
+
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.book_path = os.path.join(self.test_dir, 'book.fb2')
+        with open(self.book_path, 'wb') as f:
+            f.write(b'book contents')
+        self.cache = ExtractionCache(os.path.join(self.test_dir, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_file_sha256_streams_the_file(self):
+        self.assertEqual(file_sha256(self.book_path, chunk_size=4), hashlib.sha256(b'book contents').hexdigest())
+
+    def test_extract_calls_the_parser_once(self):
+        document = Document("Chapter 1\nText\n\nChapter 2\nMore", [0, 16], ["Chapter 1", "Chapter 2"])
+        extractor = MagicMock(return_value=document)
+
+        first = self.cache.extract(self.book_path, 'fb2', extractor, jobs=2)
+        second = self.cache.extract(self.book_path, 'fb2', extractor, jobs=2)
+
+        extractor.assert_called_once_with(self.book_path, jobs=2)
+        self.assertIs(first, document)
+        self.assertEqual(second.text, document.text)
+        self.assertEqual(list(second.paragraphs()), list(document.paragraphs()))
+        self.assertEqual([(c.title, c.start) for c in second.chapters], [(c.title, c.start) for c in document.chapters])
+
+    def test_key_depends_on_content_format_and_parser_version(self):
+        key = ExtractionCache.key(self.book_path, 'fb2')
+        self.assertNotEqual(key, ExtractionCache.key(self.book_path, 'epub'))
+        with patch.object(cache, 'PARSER_VERSION', cache.PARSER_VERSION + 1):
+            self.assertNotEqual(key, ExtractionCache.key(self.book_path, 'fb2'))
+        with open(self.book_path, 'ab') as f:
+            f.write(b'!')
+        self.assertNotEqual(key, ExtractionCache.key(self.book_path, 'fb2'))
+
+    def test_errors_are_not_cached(self):
+        extractor = MagicMock(side_effect=CorruptDocumentError("Invalid or corrupted FB2 file."))
+        for _ in range(2):
+            with self.assertRaises(CorruptDocumentError):
+                self.cache.extract(self.book_path, 'fb2', extractor)
+        self.assertEqual(extractor.call_count, 2)
+
+    def test_unreadable_entry_is_re_extracted(self):
+        key = ExtractionCache.key(self.book_path, 'fb2')
+        self.cache.put(key, b'not a document')
+        extractor = MagicMock(return_value=Document.from_text("Text"))
+        self.assertEqual(self.cache.extract(self.book_path, 'fb2', extractor).text, "Text")
+        extractor.assert_called_once()
+
+    def test_a_cache_that_cannot_be_written_is_skipped(self):
+        # The cache directory is gone and a file is in its way, as on a disk that no longer takes writes
+        shutil.rmtree(self.cache.directory)
+        with open(self.cache.directory, 'wb'):
+            pass
+        extractor = MagicMock(return_value=Document.from_text("Text"))
+        with self.assertLogs('cache', level='WARNING'):
+            self.assertEqual(self.cache.extract(self.book_path, 'fb2', extractor).text, "Text")
+        extractor.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
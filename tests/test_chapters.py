@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# Add project root to sys.path to allow importing chapters module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from chapters import convert_chapters, chapter_filename, chapter_title, read_duration
+from backends import StubBackend
+from document import Document
+
+
+class FailingStubBackend(StubBackend):
+    """A stub backend that fails on chunks containing 'broken'."""
+
+    def synthesize(self, chunk, lang):
+        if 'broken' in chunk:
+            raise RuntimeError("synthesis failed")
+        return super().synthesize(chunk, lang)
+
+
+class TestChapters(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.tmp_dir, 'book')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_chapter_filenames(self):
+        self.assertEqual(chapter_filename(3, "The Title"), "03 - The Title.mp3")
+        self.assertEqual(chapter_filename(7, 'What? A "bad"/name', width=3), "007 - What_ A _bad_name.mp3")
+        self.assertEqual(chapter_filename(1, "..."), "01.mp3")
+
+    def test_untitled_chapters_are_named_after_their_first_paragraph(self):
+        document = Document.from_chapters(["Preface text.\nMore.", "Body."], titles=[None, "One"])
+        self.assertEqual([chapter_title(chapter) for chapter in document.chapters], ["Preface text.", "One"])
+        long_document = Document.from_text("word " * 40)
+        self.assertTrue(chapter_title(long_document.chapters[0]).endswith("word..."))
+
+    def test_each_chapter_gets_a_file_and_a_playlist_entry(self):
+        document = Document.from_chapters(["First chapter text.", "", "Second chapter, longer text."],
+                                          titles=["Beginning", "Empty", "End"])
+        reported = []
+        success, message = convert_chapters(document, self.output_dir, backend=StubBackend(),
+                                            on_chapter=reported.append)
+
+        self.assertTrue(success, message)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ["01 - Beginning.mp3", "02 - End.mp3", "book.m3u8"])
+        self.assertEqual(sorted(result.number for result in reported), [1, 2])
+        # 19 and 28 characters at the stub's 0.06 seconds each, in whole frames of 24 ms
+        self.assertAlmostEqual(read_duration(os.path.join(self.output_dir, "01 - Beginning.mp3")), 1.152)
+        with open(os.path.join(self.output_dir, "book.m3u8"), encoding='utf-8') as f:
+            self.assertEqual(f.read().splitlines(), [
+                "#EXTM3U",
+                "#EXTINF:1,Beginning", "01 - Beginning.mp3",
+                "#EXTINF:2,End", "02 - End.mp3",
+            ])
+
+    def test_chapters_are_converted_in_parallel(self):
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        class SlowBackend(StubBackend):
+            def synthesize(self, chunk, lang):
+                nonlocal in_flight, peak
+                with lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                try:
+                    return super().synthesize(chunk, lang)
+                finally:
+                    with lock:
+                        in_flight -= 1
+
+        document = Document.from_chapters([f"Chapter {i} text." for i in range(6)])
+        success, _ = convert_chapters(document, self.output_dir, jobs=3, backend=SlowBackend(latency=0.05))
+        self.assertTrue(success)
+        self.assertGreater(peak, 1)
+        self.assertLessEqual(peak, 3)
+
+    def test_chapters_are_converted_from_their_paragraph_table(self):
+        document = Document.from_chapters(["First chapter.\nMore of it.", "Second chapter."])
+        texts = []
+
+        def convert(text, output_filepath, lang, **options):
+            texts.append(text)
+            return False, "Not converted"
+
+        with patch('chapters.convert_text_to_speech', convert):
+            convert_chapters(document, self.output_dir, jobs=1)
+        self.assertTrue(all(isinstance(text, Document) for text in texts))
+        self.assertEqual(sorted(list(text.paragraphs()) for text in texts),
+                         [["First chapter.", "More of it."], ["Second chapter."]])
+
+    def test_failed_chapters_are_reported_and_left_out_of_the_playlist(self):
+        document = Document.from_chapters(["Fine text.", "A broken chapter.", "Also fine."], titles=["A", "B", "C"])
+        success, message = convert_chapters(document, self.output_dir, backend=FailingStubBackend())
+
+        self.assertFalse(success)
+        self.assertIn("1 of 3 chapters failed; chapter 2", message)
+        with open(os.path.join(self.output_dir, "book.m3u8"), encoding='utf-8') as f:
+            playlist = f.read()
+        self.assertIn("01 - A.mp3", playlist)
+        self.assertNotIn("02 - B.mp3", playlist)
+        self.assertIn("03 - C.mp3", playlist)
+
+    def test_document_without_text(self):
+        success, message = convert_chapters(Document.from_text("  \n"), self.output_dir, backend=StubBackend())
+        self.assertFalse(success)
+        self.assertEqual(message, "Error: Input text cannot be empty.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# Add project root to sys.path to allow importing checkpoint module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from checkpoint import ConversionCheckpoint, conversion_fingerprint, parts_dir_for, MANIFEST_NAME
+from backends import SILENT_MP3_FRAME
+from mp3 import audio_frames, parse_frame_header
+
+FRAME = SILENT_MP3_FRAME
+
+
+class TestConversionCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmp_dir, 'book.mp3')
+        self.fingerprint = conversion_fingerprint("Some text.", 'en', 'stub', {}, 500)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_fingerprint_covers_text_and_settings(self):
+        fingerprints = {
+            conversion_fingerprint("Some text.", 'en', 'stub', {}, 500),
+            conversion_fingerprint("Other text.", 'en', 'stub', {}, 500),
+            conversion_fingerprint("Some text.", 'fr', 'stub', {}, 500),
+            conversion_fingerprint("Some text.", 'en', 'gtts', {}, 500),
+            conversion_fingerprint("Some text.", 'en', 'stub', {'slow': True}, 500),
+            conversion_fingerprint("Some text.", 'en', 'stub', {}, 200),
+        }
+        self.assertEqual(len(fingerprints), 6)
+        self.assertIn(self.fingerprint, fingerprints)
+
+    def test_recorded_chunks_are_kept_on_resume(self):
+        checkpoint = ConversionCheckpoint(self.output, self.fingerprint)
+        checkpoint.write(FRAME * 2)
+        checkpoint.write(FRAME * 3)
+        checkpoint.close()
+        self.assertFalse(os.path.exists(self.output))
+
+        resumed = ConversionCheckpoint(self.output, self.fingerprint, resume=True)
+        self.assertEqual((resumed.resumed, resumed.completed), (2, 2))
+        resumed.write(FRAME * 4)
+        resumed.commit()
+
+        with open(self.output, 'rb') as f:
+            data = f.read()
+        self.assertEqual(audio_frames(data).data, FRAME * 9)
+        # The header counts the frames of every run
+        self.assertEqual(int.from_bytes(data[21:25], 'big'), 9)
+        self.assertFalse(os.path.exists(parts_dir_for(self.output)))
+
+    def test_manifest_records_where_chunks_live(self):
+        checkpoint = ConversionCheckpoint(self.output, self.fingerprint)
+        checkpoint.write(FRAME * 2)
+        checkpoint.write(FRAME)
+        checkpoint.close()
+        with open(os.path.join(checkpoint.parts_dir, MANIFEST_NAME)) as f:
+            entries = [json.loads(line) for line in f.read().splitlines()[1:]]
+        # The first chunk also holds the MP3 header frame of the file
+        with open(checkpoint.partial_path, 'rb') as f:
+            header_length = parse_frame_header(f.read(4)).length
+        first = header_length + 2 * len(FRAME)
+        self.assertEqual(entries, [
+            {'index': 0, 'offset': 0, 'size': first, 'frames': 2, 'bitrate': 32},
+            {'index': 1, 'offset': first, 'size': len(FRAME), 'frames': 1, 'bitrate': 32},
+        ])
+
+    def test_starts_over_without_resume_or_for_another_conversion(self):
+        checkpoint = ConversionCheckpoint(self.output, self.fingerprint)
+        checkpoint.write(FRAME)
+        checkpoint.close()
+
+        other = ConversionCheckpoint(self.output, 'another fingerprint', resume=True)
+        self.assertEqual(other.completed, 0)
+        other.close()
+        fresh = ConversionCheckpoint(self.output, 'another fingerprint')
+        self.assertEqual(fresh.completed, 0)
+        self.assertEqual(os.path.getsize(fresh.partial_path), 0)
+        fresh.close()
+
+    def test_unrecorded_and_damaged_audio_is_dropped(self):
+        checkpoint = ConversionCheckpoint(self.output, self.fingerprint)
+        checkpoint.write(FRAME)
+        checkpoint.write(FRAME)
+        checkpoint.close()
+        size = checkpoint.size
+        # The process died after writing some audio of chunk 2, and while recording it
+        with open(checkpoint.partial_path, 'ab') as f:
+            f.write(FRAME[:50])
+        with open(os.path.join(checkpoint.parts_dir, MANIFEST_NAME), 'a') as f:
+            f.write(json.dumps({'index': 2, 'offset': size, 'size': len(FRAME)})[:10])
+
+        resumed = ConversionCheckpoint(self.output, self.fingerprint, resume=True)
+        self.assertEqual(resumed.completed, 2)
+        self.assertEqual(os.path.getsize(resumed.partial_path), size)
+        resumed.write(FRAME)
+        resumed.close()
+        resumed = ConversionCheckpoint(self.output, self.fingerprint, resume=True)
+        self.assertEqual(resumed.completed, 3)
+        resumed.close()
+
+        # The partial file lost the end of chunk 1
+        with open(checkpoint.partial_path, 'r+b') as f:
+            f.truncate(size - 10)
+        resumed = ConversionCheckpoint(self.output, self.fingerprint, resume=True)
+        self.assertEqual((resumed.completed, resumed.size), (1, size - len(FRAME)))
+        resumed.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import sys
+
+# Add project root to sys.path to allow importing document module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from document import Document, ExtractionError, DocumentNotFoundError, CorruptDocumentError
+
+
+class TestDocument(unittest.TestCase):
+
+    def test_paragraphs_are_stripped_non_blank_lines(self):
+        document = Document.from_text("  First line \n\n\t\nSecond\n   \nThird  ")
+        self.assertEqual(list(document.paragraphs()), ["First line", "Second", "Third"])
+        self.assertEqual(list(document.paragraph_spans()), [(2, 12), (17, 23), (28, 33)])
+        self.assertEqual(document.paragraph_count, 3)
+
+    def test_text_is_kept_as_given(self):
+        text = "  Title\n\n\nBody text\n"
+        document = Document.from_text(text)
+        self.assertIs(document.text, text)
+        self.assertEqual(str(document), text)
+
+    def test_truthiness_reflects_non_whitespace_text(self):
+        self.assertFalse(Document.from_text(""))
+        self.assertFalse(Document.from_text(" \n\t\n"))
+        self.assertTrue(Document.from_text("\nx\n"))
+
+    def test_from_chapters(self):
+        document = Document.from_chapters(["One\nTwo", "", "Three"], titles=["A", "B", "C"])
+        self.assertEqual(document.text, "One\nTwo\n\nThree")
+        chapters = document.chapters
+        self.assertEqual([(c.index, c.title, c.start, c.end) for c in chapters],
+                         [(0, "A", 0, 8), (1, "B", 8, 9), (2, "C", 9, 14)])
+        self.assertEqual([list(c.paragraphs()) for c in chapters], [["One", "Two"], [], ["Three"]])
+        self.assertEqual(chapters[2].text, "Three")
+
+    def test_from_no_chapters(self):
+        document = Document.from_chapters([])
+        self.assertEqual(document.text, "")
+        self.assertEqual(len(document.chapters), 1)
+        self.assertFalse(document)
+
+    def test_explicit_chapter_starts(self):
+        document = Document("Intro\n\nChapter 1\nText", chapter_starts=[0, 7], chapter_titles=[None, "Chapter 1"])
+        self.assertEqual([c.text for c in document.chapters], ["Intro\n\n", "Chapter 1\nText"])
+        with self.assertRaises(ValueError):
+            Document("text", chapter_starts=[0], chapter_titles=["A", "B"])
+
+    def test_chapters_as_documents(self):
+        document = Document.from_chapters(["  One\nTwo ", "", "Three\n\nFour"], titles=["A", "B", "C"])
+        for chapter in document.chapters:
+            chapter_document = chapter.to_document()
+            self.assertEqual(chapter_document.text, chapter.text)
+            self.assertEqual(list(chapter_document.paragraph_spans()),
+                             list(Document.from_text(chapter.text).paragraph_spans()))
+            self.assertEqual([(c.title, c.start, c.end) for c in chapter_document.chapters],
+                             [(chapter.title, 0, len(chapter.text))])
+        self.assertEqual(list(document.chapters[2].to_document().paragraphs()), ["Three", "Four"])
+        self.assertFalse(document.chapters[1].to_document())
+
+    def test_serialization_round_trip(self):
+        document = Document("Intro \u00e9\n\nChapter 1\nText \ud800", [0, 9], [None, "Chapter 1"])
+        restored = Document.from_bytes(document.to_bytes())
+        self.assertEqual(restored.text, document.text)
+        self.assertEqual(list(restored.paragraph_spans()), list(document.paragraph_spans()))
+        self.assertEqual([(c.title, c.start, c.end) for c in restored.chapters],
+                         [(c.title, c.start, c.end) for c in document.chapters])
+        with self.assertRaises(ValueError):
+            Document.from_bytes(b"something else")
+        with self.assertRaises(ValueError):
+            Document.from_bytes(document.to_bytes()[:-len(document.text.encode("utf-8", "surrogatepass")) - 8])
+
+    def test_error_hierarchy(self):
+        self.assertTrue(issubclass(DocumentNotFoundError, ExtractionError))
+        self.assertTrue(issubclass(CorruptDocumentError, ExtractionError))
+
+
+if __name__ == '__main__':
+    unittest.main()
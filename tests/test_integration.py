@@ -9,6 +9,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
 import main as main_script
+import parser as parser_module
 from ebooklib import epub
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
@@ -70,9 +71,14 @@ class TestIntegration(unittest.TestCase):
         # Path for a non-existent file
         cls.non_existent_file_path = os.path.join(FIXTURES_DIR, "non_existent_book.epub")
 
+        # Keep the extraction cache out of the user's home directory
+        cls.cache_env = patch.dict(os.environ, {'XDG_CACHE_HOME': os.path.join(FIXTURES_DIR, 'cache')})
+        cls.cache_env.start()
+
 
     @classmethod
     def tearDownClass(cls):
+        cls.cache_env.stop()
         if os.path.exists(FIXTURES_DIR):
             shutil.rmtree(FIXTURES_DIR)
 
@@ -91,7 +97,7 @@ class TestIntegration(unittest.TestCase):
 
         self.assertTrue(mock_tts.called, "convert_text_to_speech was not called.")
         args, kwargs = mock_tts.call_args
-        extracted_text = args[0]
+        extracted_text = args[0].text
         output_file_called = args[1]
         lang_called = args[2]
 
@@ -121,7 +127,7 @@ class TestIntegration(unittest.TestCase):
 
         self.assertTrue(mock_tts.called)
         args, kwargs = mock_tts.call_args
-        extracted_text = args[0]
+        extracted_text = args[0].text
         output_file_called = args[1]
         lang_called = args[2] 
 
@@ -136,6 +142,28 @@ class TestIntegration(unittest.TestCase):
         if os.path.exists(expected_output_pdf_mp3_path): 
              os.remove(expected_output_pdf_mp3_path)
 
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    @patch('builtins.print')
+    def test_main_reuses_cached_extraction_integration(self, mock_print, mock_tts):
+        output_path = os.path.join(FIXTURES_DIR, "cached.mp3")
+        test_args = ['main.py', self.sample_epub_path, '--output_file', output_path]
+
+        with patch.object(sys, 'argv', test_args):
+            main_script.main()
+            with patch('parser.extract_text_from_epub') as mock_epub_parser:
+                main_script.main()
+                mock_epub_parser.assert_not_called()
+            with patch('parser.extract_text_from_epub', wraps=parser_module.extract_text_from_epub) as mock_epub_parser, \
+                 patch.object(sys, 'argv', test_args + ['--no-cache']):
+                main_script.main()
+                mock_epub_parser.assert_called_once()
+
+        self.assertEqual(mock_tts.call_count, 3)
+        first_text, cached_text, uncached_text = [c.args[0].text for c in mock_tts.call_args_list]
+        self.assertIn(self.epub_content_paragraph1, first_text)
+        self.assertEqual(cached_text, first_text)
+        self.assertEqual(uncached_text, first_text)
+
     @patch('tts.convert_text_to_speech')
     @patch('builtins.print')
     def test_main_handles_corrupted_epub_integration(self, mock_print, mock_tts):
@@ -145,9 +173,9 @@ class TestIntegration(unittest.TestCase):
             main_script.main()
 
         mock_tts.assert_not_called()
-        # The parser.py->extract_text_from_epub returns "Error: Invalid or corrupted EPUB file."
+        # parser.py->extract_text_from_epub raises CorruptDocumentError("Invalid or corrupted EPUB file.")
         # main.py prints "Error during text extraction: " + that message.
-        mock_print.assert_any_call("Error during text extraction: Error: Invalid or corrupted EPUB file.")
+        mock_print.assert_any_call("Error during text extraction: Invalid or corrupted EPUB file.")
 
     @patch('tts.convert_text_to_speech')
     @patch('builtins.print')
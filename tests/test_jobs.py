@@ -0,0 +1,315 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Add project root to sys.path to allow importing jobs module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from jobs import Job, JobQueue, JobEvents, JobStore, JobError, QueueFullError, QUEUED, RUNNING, DONE, FAILED
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = JobQueue(workers=2, max_pending=2, max_finished=3)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def test_job_result(self):
+        job = self.queue.submit(Job("book.epub"), lambda job, a, b: a + b, 2, b=3)
+        self.assertTrue(job.wait(5))
+        self.assertEqual((job.state, job.result, job.message), (DONE, 5, None))
+        self.assertIs(self.queue.get(job.id), job)
+        self.assertLessEqual(job.created, job.started)
+        self.assertLessEqual(job.started, job.finished)
+        self.assertEqual(job.to_dict()['state'], 'done')
+
+    def test_failed_jobs(self):
+        def fail(job):
+            raise JobError("No text content found.")
+
+        def crash(job):
+            raise ValueError("internal detail")
+
+        failed = self.queue.submit(Job("a.fb2"), fail)
+        with self.assertLogs('jobs', level='ERROR'):
+            crashed = self.queue.submit(Job("b.fb2"), crash)
+            self.assertTrue(crashed.wait(5))
+        self.assertTrue(failed.wait(5))
+        self.assertEqual((failed.state, failed.message), (FAILED, "No text content found."))
+        self.assertEqual(crashed.state, FAILED)
+        self.assertNotIn("internal detail", crashed.message)
+
+    def test_workers_and_pending_jobs_are_limited(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def block(job):
+            started.release()
+            release.wait(5)
+
+        running = [self.queue.submit(Job(f"{i}.pdf"), block) for i in range(2)]
+        for _ in running:
+            self.assertTrue(started.acquire(timeout=5))
+        waiting = [self.queue.submit(Job(f"{i}.pdf"), block) for i in range(2, 4)]
+        self.assertEqual([job.state for job in running + waiting], [RUNNING, RUNNING, QUEUED, QUEUED])
+        self.assertEqual(self.queue.pending, 2)
+        with self.assertRaises(QueueFullError):
+            self.queue.submit(Job("5.pdf"), block)
+
+        release.set()
+        for job in running + waiting:
+            self.assertTrue(job.wait(5))
+        self.assertEqual(self.queue.pending, 0)
+
+    def test_oldest_finished_jobs_are_forgotten(self):
+        jobs = []
+        for i in range(5):
+            jobs.append(self.queue.submit(Job(f"{i}.epub"), lambda job: None))
+            self.assertTrue(jobs[-1].wait(5))
+        self.assertEqual([self.queue.get(job.id) for job in jobs], [None, None] + jobs[2:])
+
+    def test_jobs_with_the_same_key_are_coalesced(self):
+        release = threading.Event()
+        first = self.queue.submit(Job("book.epub", key="k"), lambda job: release.wait(5) and "book.mp3")
+        self.assertIs(self.queue.submit(Job("copy.epub", key="k"), lambda job: "copy.mp3"), first)
+        self.queue.submit(Job("other.epub"), lambda job: release.wait(5))
+        # Joining a job in flight needs no room in the queue
+        self.queue.max_pending = 0
+        self.assertIs(self.queue.submit(Job("copy.epub", key="k"), lambda job: "copy.mp3"), first)
+        with self.assertRaises(QueueFullError):
+            self.queue.submit(Job("copy.epub", key="other"), lambda job: "copy.mp3")
+
+        release.set()
+        self.assertTrue(first.wait(5))
+        self.assertEqual(first.result, "book.mp3")
+        self.queue.max_pending = 2
+        again = self.queue.submit(Job("book.epub", key="k"), lambda job: "again.mp3")
+        self.assertIsNot(again, first)
+        self.assertTrue(again.wait(5))
+        self.assertEqual(again.result, "again.mp3")
+
+    def test_queued_jobs_are_failed_on_shutdown(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def block(job):
+            started.release()
+            release.wait(5)
+
+        running = [self.queue.submit(Job(f"{i}.pdf"), block) for i in range(2)]
+        for _ in running:
+            self.assertTrue(started.acquire(timeout=5))
+        queued = self.queue.submit(Job("2.pdf", key="k"), lambda job: None)
+        self.queue.shutdown(wait=False)
+        self.assertTrue(queued.wait(0))
+        self.assertEqual(queued.state, FAILED)
+        release.set()
+        for job in running:
+            self.assertTrue(job.wait(5))
+            self.assertEqual(job.state, DONE)
+
+    def test_state_changes_are_published(self):
+        job = self.queue.submit(Job("book.fb2"), lambda job: job.report('progress', {'chunks_done': 1}))
+        self.assertTrue(job.wait(5))
+        events = job.events.wait(0, timeout=0)
+        self.assertEqual([(name, data.get('state')) for _, name, data in events],
+                         [('state', RUNNING), ('progress', None), ('state', DONE)])
+        self.assertEqual(events[-1][2]['progress'], {'chunks_done': 1})
+        self.assertTrue(job.events.closed)
+
+
+class TestJobEvents(unittest.TestCase):
+
+    def test_watchers_get_the_events_after_the_last_one_seen(self):
+        events = JobEvents()
+        events.publish('progress', 1)
+        events.publish('progress', 2)
+        self.assertEqual(events.wait(0, timeout=0), [(1, 'progress', 1), (2, 'progress', 2)])
+        self.assertEqual(events.wait(1, timeout=0), [(2, 'progress', 2)])
+        self.assertEqual(events.wait(2, timeout=0), [])
+
+    def test_waiting_watchers_are_woken(self):
+        events = JobEvents()
+        received = []
+        watchers = [threading.Thread(target=lambda: received.append(events.wait(0, timeout=5))) for _ in range(5)]
+        for watcher in watchers:
+            watcher.start()
+        events.publish('state', 'done', close=True)
+        for watcher in watchers:
+            watcher.join(5)
+        self.assertEqual(received, [[(1, 'state', 'done')]] * 5)
+        # Nothing is published once the log is closed, and waiting returns at once
+        events.publish('progress', 3)
+        self.assertEqual(events.wait(1), [])
+
+    def test_watchers_that_fall_behind_skip_to_the_oldest_event_kept(self):
+        events = JobEvents(history=3)
+        for i in range(1, 6):
+            events.publish('progress', i)
+        self.assertEqual([data for _, _, data in events.wait(0, timeout=0)], [3, 4, 5])
+        self.assertEqual([data for _, _, data in events.wait(3, timeout=0)], [4, 5])
+
+
+class TestJobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'jobs.sqlite3')
+        self.queue = JobQueue(workers=1, max_finished=2, store=JobStore(self.path))
+        # Another process, with its own connections to the same database
+        self.other = JobQueue(workers=1, store=JobStore(self.path), poll_interval=0.01)
+
+    def tearDown(self):
+        self.queue.shutdown()
+        self.other.shutdown()
+        shutil.rmtree(self.directory)
+
+    def test_jobs_are_followed_from_other_processes(self):
+        release = threading.Event()
+
+        def convert(job):
+            job.report('progress', {'chunks_done': 1})
+            self.assertTrue(release.wait(5))
+            job.report('progress', {'chunks_done': 2})
+            return 'book.mp3'
+
+        job = self.queue.submit(Job("book.fb2", output='/audio/book.mp3'), convert)
+        events = job.events.wait(1, timeout=5)
+        self.assertEqual(events[-1][1:], ('progress', {'chunks_done': 1}))
+
+        remote = self.other.get(job.id)
+        self.assertIsNot(remote, job)
+        self.assertEqual((remote.name, remote.state, remote.output), ("book.fb2", RUNNING, '/audio/book.mp3'))
+        self.assertEqual(remote.progress, {'chunks_done': 1})
+        self.assertEqual(remote.events.wait(0, timeout=0), job.events.wait(0, timeout=0))
+        self.assertIs(self.other.get(job.id), remote)
+
+        release.set()
+        self.assertTrue(remote.wait(5))
+        self.assertEqual((remote.state, remote.result, remote.progress), (DONE, 'book.mp3', {'chunks_done': 2}))
+        self.assertEqual(remote.events.wait(0, timeout=0), job.events.wait(0, timeout=0))
+        self.assertTrue(remote.events.closed)
+        self.assertEqual(self.other.get(job.id).to_dict(), job.to_dict())
+        self.assertIsNone(self.other.get('0123456789abcdef'))
+
+    def test_state_changes_are_atomic(self):
+        job = Job("book.epub")
+        self.queue.store.add(job)
+        first, second = self.queue.store.load(job.id), self.other.store.load(job.id)
+        self.assertTrue(first._set_state(RUNNING, expected=(QUEUED,)))
+        self.assertFalse(second._set_state(RUNNING, expected=(QUEUED,)))
+        self.assertEqual(second.state, QUEUED)
+        self.assertEqual(second.events.last_id, 0)
+        self.assertEqual(self.other.store.load(job.id).state, RUNNING)
+
+    def test_latest_events_are_kept(self):
+        store = JobStore(self.path, history=3)
+        job = Job("book.pdf")
+        job.store = store
+        store.add(job)
+        for i in range(1, 6):
+            job.report('progress', i)
+        self.assertEqual(store.events_after(job.id, 0), [(3, 'progress', 3), (4, 'progress', 4), (5, 'progress', 5)])
+        self.assertEqual(store.events_after(job.id, 4), [(5, 'progress', 5)])
+        self.assertEqual(store.load(job.id).progress, 5)
+
+    def test_jobs_with_the_same_key_are_coalesced_across_processes(self):
+        release = threading.Event()
+        job = self.queue.submit(Job("book.fb2", key="k"), lambda job: release.wait(5) and "book.mp3")
+        calls = []
+        joined = self.other.submit(Job("copy.fb2", key="k"), calls.append)
+        self.assertEqual((joined.id, joined.name), (job.id, "book.fb2"))
+        self.assertEqual(self.other.pending, 0)
+
+        release.set()
+        self.assertTrue(joined.wait(5))
+        self.assertEqual((joined.state, joined.result), (DONE, "book.mp3"))
+        again = self.other.submit(Job("copy.fb2", key="k"), lambda job: "copy.mp3")
+        self.assertNotEqual(again.id, job.id)
+        self.assertTrue(again.wait(5))
+        self.assertEqual(calls, [])
+
+    def test_jobs_of_dead_processes_are_failed_when_their_lease_runs_out(self):
+        # A process that added a job and started it, then died without renewing its lease
+        dead_store = JobStore(self.path, lease=0.05)
+        dead = Job("book.fb2", key="k")
+        dead.store = dead_store
+        dead_store.add(dead)
+        self.assertTrue(dead._set_state(RUNNING, expected=(QUEUED,)))
+        followed = self.queue.get(dead.id)
+        time.sleep(0.1)
+
+        job = self.other.submit(Job("copy.fb2", key="k"), lambda job: "copy.mp3")
+        self.assertNotEqual(job.id, dead.id)
+        self.assertTrue(job.wait(5))
+        self.assertEqual((job.state, job.result), (DONE, "copy.mp3"))
+        self.assertTrue(followed.wait(5))
+        self.assertEqual(followed.state, FAILED)
+        self.assertTrue(followed.message.startswith("The server stopped during the conversion."))
+        # Nothing the dead job's process records afterwards changes it
+        dead.report('progress', {'chunks_done': 1})
+        self.assertEqual(dead_store.load(dead.id).state, FAILED)
+
+    def test_jobs_whose_lease_runs_out_while_they_run_are_failed(self):
+        release = threading.Event()
+        stalled = JobQueue(workers=1, store=JobStore(self.path, lease=0.05))
+        job = stalled.submit(Job("book.fb2", key="k"), lambda job: release.wait(5) and "book.mp3")
+        self.assertTrue(job.events.wait(0, timeout=5))
+        # The process stalls, and its leases are not renewed
+        stalled._heartbeat_stopped.set()
+        time.sleep(0.15)
+        again = self.other.submit(Job("copy.fb2", key="k"), lambda job: "copy.mp3")
+        self.assertNotEqual(again.id, job.id)
+
+        release.set()
+        self.assertTrue(job.wait(5))
+        stalled.shutdown()
+        self.assertEqual(job.state, FAILED)
+        self.assertTrue(job.message.startswith("The server stopped during the conversion."))
+        self.assertTrue(job.events.closed)
+        self.assertIs(stalled.get(job.id), job)
+        self.assertEqual(job.to_dict(), self.other.get(job.id).to_dict())
+
+    def test_leases_of_live_jobs_are_renewed(self):
+        release = threading.Event()
+        queue = JobQueue(workers=1, store=JobStore(self.path, lease=0.2))
+        job = queue.submit(Job("book.fb2", key="k"), lambda job: release.wait(5) and "book.mp3")
+        time.sleep(0.5)
+        joined = self.other.submit(Job("copy.fb2", key="k"), lambda job: "copy.mp3")
+        release.set()
+        queue.shutdown()
+        self.assertEqual(joined.id, job.id)
+        self.assertTrue(joined.wait(5))
+        self.assertEqual(joined.result, "book.mp3")
+
+    def test_databases_without_keys_are_upgraded(self):
+        path = os.path.join(self.directory, 'old.sqlite3')
+        db = sqlite3.connect(path)
+        db.execute('CREATE TABLE jobs (id TEXT PRIMARY KEY, name TEXT NOT NULL, state TEXT NOT NULL, result TEXT,'
+                   ' message TEXT, output TEXT, created REAL NOT NULL, started REAL, finished REAL, progress TEXT,'
+                   ' last_event INTEGER NOT NULL DEFAULT 0)')
+        db.commit()
+        db.close()
+        store = JobStore(path)
+        job = Job("book.epub", key="k")
+        self.assertIsNone(store.add(job))
+        self.assertEqual(store.add(Job("copy.epub", key="k")), job.id)
+
+    def test_oldest_finished_jobs_are_deleted(self):
+        jobs = []
+        for i in range(4):
+            jobs.append(self.queue.submit(Job(f"{i}.epub"), lambda job: None))
+            self.assertTrue(jobs[-1].wait(5))
+        self.assertEqual([self.other.get(job.id) is not None for job in jobs], [False, False, True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
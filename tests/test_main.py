@@ -9,82 +9,333 @@ sys.path.insert(0, project_root)
 
 # We will need to import 'main' to call 'main.main()'
 import main as main_script # Use an alias to avoid confusion
+from document import Document, ExtractionError, CorruptDocumentError
 
 class TestMainArgParsing(unittest.TestCase):
 
     @patch('main.argparse.ArgumentParser.parse_args')
     @patch('main.os.path.exists', return_value=True) 
-    @patch('parser.extract_text_from_epub', return_value="Mocked text")
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
     @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
     def test_argparse_input_file_only(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args): # Renamed mock_parser to mock_parser_epub
         mock_args_instance = MagicMock()
         mock_args_instance.input_file = "test.epub"
         mock_args_instance.output_file = None
         mock_args_instance.lang = "en"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = False
         mock_parse_args.return_value = mock_args_instance
 
         main_script.main()
 
         mock_parse_args.assert_called_once()
         # self.assertEqual(main_script.get_parser_func(".epub"), main_script.extract_text_from_epub) # Removed get_parser_func
-        mock_parser_epub.assert_called_with("test.epub")
+        mock_parser_epub.assert_called_with("test.epub", jobs=1)
         expected_output_file = "test.mp3"
-        mock_tts.assert_called_with("Mocked text", expected_output_file, "en")
+        mock_tts.assert_called_with(mock_parser_epub.return_value, expected_output_file, "en")
 
     @patch('main.argparse.ArgumentParser.parse_args')
     @patch('main.os.path.exists', return_value=True)
-    @patch('parser.extract_text_from_epub', return_value="Mocked text")
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
     @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
     def test_argparse_with_output_file(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args): # Renamed mock_parser to mock_parser_epub
         mock_args_instance = MagicMock()
         mock_args_instance.input_file = "test.epub"
         mock_args_instance.output_file = "custom.mp3"
         mock_args_instance.lang = "en"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = False
         mock_parse_args.return_value = mock_args_instance
 
         main_script.main()
 
         mock_parse_args.assert_called_once()
         # self.assertEqual(main_script.get_parser_func(".epub"), main_script.extract_text_from_epub) # Removed get_parser_func
-        mock_parser_epub.assert_called_with("test.epub")
-        mock_tts.assert_called_with("Mocked text", "custom.mp3", "en")
+        mock_parser_epub.assert_called_with("test.epub", jobs=1)
+        mock_tts.assert_called_with(mock_parser_epub.return_value, "custom.mp3", "en")
 
     @patch('main.argparse.ArgumentParser.parse_args')
     @patch('main.os.path.exists', return_value=True)
-    @patch('parser.extract_text_from_epub', return_value="Mocked text")
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
     @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
     def test_argparse_with_lang(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args): # Renamed mock_parser to mock_parser_epub
         mock_args_instance = MagicMock()
         mock_args_instance.input_file = "test.epub"
         mock_args_instance.output_file = None
         mock_args_instance.lang = "fr"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = False
         mock_parse_args.return_value = mock_args_instance
 
         main_script.main()
 
         mock_parse_args.assert_called_once()
         # self.assertEqual(main_script.get_parser_func(".epub"), main_script.extract_text_from_epub) # Removed get_parser_func
-        mock_parser_epub.assert_called_with("test.epub")
-        mock_tts.assert_called_with("Mocked text", "test.mp3", "fr")
+        mock_parser_epub.assert_called_with("test.epub", jobs=1)
+        mock_tts.assert_called_with(mock_parser_epub.return_value, "test.mp3", "fr")
     
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    def test_argparse_with_jobs(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args):
+        mock_args_instance = MagicMock()
+        mock_args_instance.input_file = "test.epub"
+        mock_args_instance.output_file = None
+        mock_args_instance.lang = "en"
+        mock_args_instance.jobs = 4
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = False
+        mock_parse_args.return_value = mock_args_instance
+
+        main_script.main()
+
+        mock_parser_epub.assert_called_with("test.epub", jobs=4)
+        mock_tts.assert_called_with(mock_parser_epub.return_value, "test.mp3", "en")
+
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    def test_argparse_with_audio_cache_dir(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args):
+        import tempfile
+        from tts import AudioCache
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "test.epub")
+            with open(input_file, 'wb') as f:
+                f.write(b'book contents')  # hashed by the extraction cache
+            mock_args_instance = MagicMock()
+            mock_args_instance.input_file = input_file
+            mock_args_instance.output_file = "test.mp3"
+            mock_args_instance.lang = "en"
+            mock_args_instance.jobs = 1
+            mock_args_instance.no_cache = False
+            mock_args_instance.tts_backend = 'gtts'
+            mock_args_instance.hedge_percentile = None
+            mock_args_instance.resume = False
+            mock_args_instance.split_chapters = False
+            mock_args_instance.cache_dir = os.path.join(tmp_dir, 'extraction')
+            mock_args_instance.audio_cache_dir = os.path.join(tmp_dir, 'audio')
+            mock_parse_args.return_value = mock_args_instance
+
+            main_script.main()
+
+            audio_cache = mock_tts.call_args.kwargs['cache']
+            self.assertIsInstance(audio_cache, AudioCache)
+            self.assertEqual(audio_cache.directory, os.path.join(tmp_dir, 'audio'))
+            mock_tts.assert_called_with(mock_parser_epub.return_value, "test.mp3", "en", cache=audio_cache)
+
+    @patch('builtins.print')
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    def test_unwritable_extraction_cache_is_skipped(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args,
+                                                    mock_print):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "test.epub")
+            with open(input_file, 'wb') as f:
+                f.write(b'book contents')
+            # The cache directory cannot be created: a file is in the way
+            blocker = os.path.join(tmp_dir, 'blocker')
+            with open(blocker, 'wb'):
+                pass
+            mock_args_instance = MagicMock()
+            mock_args_instance.input_file = input_file
+            mock_args_instance.output_file = "test.mp3"
+            mock_args_instance.lang = "en"
+            mock_args_instance.jobs = 1
+            mock_args_instance.no_cache = False
+            mock_args_instance.tts_backend = 'gtts'
+            mock_args_instance.hedge_percentile = None
+            mock_args_instance.resume = False
+            mock_args_instance.split_chapters = False
+            mock_args_instance.cache_dir = os.path.join(blocker, 'extraction')
+            mock_args_instance.audio_cache_dir = os.path.join(tmp_dir, 'audio')
+            mock_parse_args.return_value = mock_args_instance
+
+            main_script.main()
+
+            mock_parser_epub.assert_called_once_with(input_file, jobs=1)
+            mock_tts.assert_called_once()
+            printed = [c.args[0] for c in mock_print.call_args_list if c.args]
+            self.assertTrue(any(line.startswith("Warning: Cannot use the extraction cache") for line in printed))
+            self.assertIn("Audiobook saved as test.mp3.", printed)
+
+    @patch('builtins.print')
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    def test_unwritable_audio_cache_is_skipped(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args,
+                                               mock_print):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, "test.epub")
+            with open(input_file, 'wb') as f:
+                f.write(b'book contents')
+            # The cache directory cannot be created: a file is in the way
+            blocker = os.path.join(tmp_dir, 'blocker')
+            with open(blocker, 'wb'):
+                pass
+            mock_args_instance = MagicMock()
+            mock_args_instance.input_file = input_file
+            mock_args_instance.output_file = "test.mp3"
+            mock_args_instance.lang = "en"
+            mock_args_instance.jobs = 1
+            mock_args_instance.no_cache = False
+            mock_args_instance.tts_backend = 'gtts'
+            mock_args_instance.hedge_percentile = None
+            mock_args_instance.resume = False
+            mock_args_instance.split_chapters = False
+            mock_args_instance.cache_dir = os.path.join(tmp_dir, 'extraction')
+            mock_args_instance.audio_cache_dir = os.path.join(blocker, 'audio')
+            mock_parse_args.return_value = mock_args_instance
+
+            main_script.main()
+
+            mock_tts.assert_called_once_with(mock_parser_epub.return_value, "test.mp3", "en")
+            printed = [c.args[0] for c in mock_print.call_args_list if c.args]
+            self.assertTrue(any(line.startswith("Warning: Cannot use the audio cache") for line in printed))
+            self.assertIn("Audiobook saved as test.mp3.", printed)
+
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    def test_argparse_with_stub_tts_backend(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args):
+        from backends import StubBackend
+        mock_args_instance = MagicMock()
+        mock_args_instance.input_file = "test.epub"
+        mock_args_instance.output_file = None
+        mock_args_instance.lang = "en"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'stub'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = False
+        mock_parse_args.return_value = mock_args_instance
+
+        main_script.main()
+
+        self.assertIsInstance(mock_tts.call_args.kwargs['backend'], StubBackend)
+
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    def test_argparse_with_hedge_percentile(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args):
+        from tts import RequestHedging
+        mock_args_instance = MagicMock()
+        mock_args_instance.input_file = "test.epub"
+        mock_args_instance.output_file = None
+        mock_args_instance.lang = "en"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = 99.0
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = False
+        mock_parse_args.return_value = mock_args_instance
+
+        main_script.main()
+
+        hedging = mock_tts.call_args.kwargs['hedging']
+        self.assertIsInstance(hedging, RequestHedging)
+        self.assertEqual(hedging.percentile, 99.0)
+
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Mocked text"))
+    @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
+    def test_argparse_with_resume(self, mock_tts, mock_parser_epub, mock_exists, mock_parse_args):
+        mock_args_instance = MagicMock()
+        mock_args_instance.input_file = "test.epub"
+        mock_args_instance.output_file = None
+        mock_args_instance.lang = "en"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = True
+        mock_args_instance.split_chapters = False
+        mock_parse_args.return_value = mock_args_instance
+
+        main_script.main()
+
+        mock_tts.assert_called_once_with(mock_parser_epub.return_value, "test.mp3", "en", resume=True)
+
+    @patch('main.argparse.ArgumentParser.parse_args')
+    @patch('main.os.path.exists', return_value=True)
+    @patch('parser.extract_text_from_epub', return_value=Document.from_chapters(["One.", "Two."]))
+    @patch('chapters.convert_chapters', return_value=(True, "Success"))
+    @patch('tts.convert_text_to_speech')
+    def test_argparse_with_split_chapters(self, mock_tts, mock_chapters, mock_parser_epub, mock_exists,
+                                          mock_parse_args):
+        mock_args_instance = MagicMock()
+        mock_args_instance.input_file = "books/test.epub"
+        mock_args_instance.output_file = None
+        mock_args_instance.lang = "en"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = True
+        mock_args_instance.chapter_jobs = 3
+        mock_parse_args.return_value = mock_args_instance
+
+        with patch('builtins.print') as mock_print:
+            main_script.main()
+
+        mock_tts.assert_not_called()
+        args, kwargs = mock_chapters.call_args
+        self.assertEqual(args, (mock_parser_epub.return_value, "books/test", "en"))
+        self.assertEqual(kwargs['jobs'], 3)
+        self.assertTrue(callable(kwargs['on_chapter']))
+        mock_print.assert_any_call("Audiobook chapters saved in books/test.")
+
     @patch('main.argparse.ArgumentParser.parse_args')
     @patch('main.os.path.exists', return_value=True) 
-    @patch('parser.extract_text_from_pdf', return_value="Mocked PDF text")
+    @patch('parser.extract_text_from_pdf', return_value=Document.from_text("Mocked PDF text"))
     @patch('tts.convert_text_to_speech', return_value=(True, "Success"))
     def test_argparse_input_file_pdf(self, mock_tts, mock_pdf_parser, mock_exists, mock_parse_args):
         mock_args_instance = MagicMock()
         mock_args_instance.input_file = "path/to/document.pdf"
         mock_args_instance.output_file = None
         mock_args_instance.lang = "de"
+        mock_args_instance.jobs = 1
+        mock_args_instance.no_cache = True
+        mock_args_instance.tts_backend = 'gtts'
+        mock_args_instance.hedge_percentile = None
+        mock_args_instance.resume = False
+        mock_args_instance.split_chapters = False
         mock_parse_args.return_value = mock_args_instance
 
         main_script.main()
 
         mock_parse_args.assert_called_once()
         # self.assertEqual(main_script.get_parser_func(".pdf"), main_script.extract_text_from_pdf) # Removed get_parser_func
-        mock_pdf_parser.assert_called_with("path/to/document.pdf")
+        mock_pdf_parser.assert_called_with("path/to/document.pdf", jobs=1)
         expected_output_file = "path/to/document.mp3"
-        mock_tts.assert_called_with("Mocked PDF text", expected_output_file, "de")
+        mock_tts.assert_called_with(mock_pdf_parser.return_value, expected_output_file, "de")
 
     @patch('main.argparse.ArgumentParser.parse_args')
     def test_argparse_missing_input_file(self, mock_parse_args):
@@ -124,14 +375,20 @@ class TestMainDispatchAndErrors(unittest.TestCase):
         mock_args.input_file = "book.epub"
         mock_args.output_file = None
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
-        mock_epub_parser.return_value = "epub text"
+        mock_epub_parser.return_value = Document.from_text("epub text")
 
         main_script.main()
-        mock_epub_parser.assert_called_once_with("book.epub")
+        mock_epub_parser.assert_called_once_with("book.epub", jobs=1)
         mock_pdf_parser.assert_not_called()
         mock_fb2_parser.assert_not_called()
-        mock_tts.assert_called_once_with("epub text", "book.mp3", "en")
+        mock_tts.assert_called_once_with(mock_epub_parser.return_value, "book.mp3", "en")
 
     @patch('main.argparse.ArgumentParser.parse_args')
     @patch('main.os.path.exists', return_value=True)
@@ -144,14 +401,20 @@ class TestMainDispatchAndErrors(unittest.TestCase):
         mock_args.input_file = "doc.pdf"
         mock_args.output_file = None
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
-        mock_pdf_parser.return_value = "pdf text"
+        mock_pdf_parser.return_value = Document.from_text("pdf text")
 
         main_script.main()
-        mock_pdf_parser.assert_called_once_with("doc.pdf")
+        mock_pdf_parser.assert_called_once_with("doc.pdf", jobs=1)
         mock_epub_parser.assert_not_called()
         mock_fb2_parser.assert_not_called()
-        mock_tts.assert_called_once_with("pdf text", "doc.mp3", "en")
+        mock_tts.assert_called_once_with(mock_pdf_parser.return_value, "doc.mp3", "en")
 
     @patch('main.argparse.ArgumentParser.parse_args')
     @patch('main.os.path.exists', return_value=True)
@@ -164,14 +427,20 @@ class TestMainDispatchAndErrors(unittest.TestCase):
         mock_args.input_file = "story.fb2"
         mock_args.output_file = None
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
-        mock_fb2_parser.return_value = "fb2 text"
+        mock_fb2_parser.return_value = Document.from_text("fb2 text")
 
         main_script.main()
         mock_fb2_parser.assert_called_once_with("story.fb2")
         mock_epub_parser.assert_not_called()
         mock_pdf_parser.assert_not_called()
-        mock_tts.assert_called_once_with("fb2 text", "story.mp3", "en")
+        mock_tts.assert_called_once_with(mock_fb2_parser.return_value, "story.mp3", "en")
 
     @patch('main.argparse.ArgumentParser.parse_args')
     @patch('main.os.path.exists', return_value=True)
@@ -185,6 +454,12 @@ class TestMainDispatchAndErrors(unittest.TestCase):
         mock_args.input_file = "archive.zip" 
         mock_args.output_file = None
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
 
         main_script.main()
@@ -205,14 +480,20 @@ class TestMainDispatchAndErrors(unittest.TestCase):
         mock_args.input_file = "bad.epub"
         mock_args.output_file = None
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
         
-        mock_parser_epub.return_value = "Error: Corrupted EPUB" 
+        mock_parser_epub.side_effect = CorruptDocumentError("Invalid or corrupted EPUB file.")
 
         main_script.main()
 
-        mock_parser_epub.assert_called_once_with("bad.epub")
-        mock_print.assert_any_call("Error during text extraction: Error: Corrupted EPUB")
+        mock_parser_epub.assert_called_once_with("bad.epub", jobs=1)
+        mock_print.assert_any_call("Error during text extraction: Invalid or corrupted EPUB file.")
         mock_tts.assert_not_called()
 
     @patch('main.argparse.ArgumentParser.parse_args')
@@ -220,18 +501,24 @@ class TestMainDispatchAndErrors(unittest.TestCase):
     @patch('builtins.print')
     @patch('tts.convert_text_to_speech')
     @patch('parser.extract_text_from_pdf')
-    def test_main_handles_parser_returns_none(self, mock_parser_pdf, mock_tts, mock_print, mock_exists, mock_parse_args): # Renamed mock_parser to mock_parser_pdf
+    def test_main_handles_unexpected_parser_error(self, mock_parser_pdf, mock_tts, mock_print, mock_exists, mock_parse_args):
         mock_args = MagicMock()
         mock_args.input_file = "empty_or_failed.pdf"
         mock_args.output_file = None
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
         
-        mock_parser_pdf.return_value = None 
+        mock_parser_pdf.side_effect = ExtractionError("An unexpected error occurred during PDF parsing: boom")
 
         main_script.main()
-        mock_parser_pdf.assert_called_once_with("empty_or_failed.pdf")
-        mock_print.assert_any_call("Error during text extraction: Unknown error during text extraction.")
+        mock_parser_pdf.assert_called_once_with("empty_or_failed.pdf", jobs=1)
+        mock_print.assert_any_call("Error during text extraction: An unexpected error occurred during PDF parsing: boom")
         mock_tts.assert_not_called()
 
     @patch('main.argparse.ArgumentParser.parse_args')
@@ -244,12 +531,18 @@ class TestMainDispatchAndErrors(unittest.TestCase):
         mock_args.input_file = "whitespace.epub"
         mock_args.output_file = None
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
         
-        mock_parser_epub.return_value = "   " 
+        mock_parser_epub.return_value = Document.from_text("   ") 
 
         main_script.main()
-        mock_parser_epub.assert_called_once_with("whitespace.epub")
+        mock_parser_epub.assert_called_once_with("whitespace.epub", jobs=1)
         mock_print.assert_any_call("Info: No text content was extracted from 'whitespace.epub'. Cannot generate audiobook.")
         mock_tts.assert_not_called()
 
@@ -257,20 +550,26 @@ class TestMainDispatchAndErrors(unittest.TestCase):
     @patch('main.os.path.exists', return_value=True)
     @patch('builtins.print')
     @patch('tts.convert_text_to_speech')
-    @patch('parser.extract_text_from_epub', return_value="Valid text for TTS")
+    @patch('parser.extract_text_from_epub', return_value=Document.from_text("Valid text for TTS"))
     def test_main_handles_tts_failure(self, mock_parser_epub, mock_tts, mock_print, mock_exists, mock_parse_args):
         mock_args = MagicMock()
         mock_args.input_file = "tts_fail.epub"
         mock_args.output_file = "output.mp3" 
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args
         
         mock_tts.return_value = (False, "TTS API Error") 
 
         main_script.main()
         
-        mock_parser_epub.assert_called_once_with("tts_fail.epub")
-        mock_tts.assert_called_once_with("Valid text for TTS", "output.mp3", "en")
+        mock_parser_epub.assert_called_once_with("tts_fail.epub", jobs=1)
+        mock_tts.assert_called_once_with(mock_parser_epub.return_value, "output.mp3", "en")
         mock_print.assert_any_call("Error during TTS conversion: TTS API Error")
 
     @patch('main.argparse.ArgumentParser.parse_args')
@@ -285,6 +584,12 @@ class TestMainDispatchAndErrors(unittest.TestCase):
         # However, parse_args returns them, so they should be attributes of the mock_args object.
         mock_args.output_file = None 
         mock_args.lang = "en"
+        mock_args.jobs = 1
+        mock_args.no_cache = True
+        mock_args.tts_backend = 'gtts'
+        mock_args.hedge_percentile = None
+        mock_args.resume = False
+        mock_args.split_chapters = False
         mock_parse_args.return_value = mock_args 
 
         main_script.main()
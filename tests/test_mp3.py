@@ -0,0 +1,156 @@
+import unittest
+from io import BytesIO
+import os
+import sys
+
+# Add project root to sys.path to allow importing mp3 module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from mp3 import (FrameHeader, MP3Assembler, MP3Error, MPEG1, MPEG2, audio_frames, parse_frame_header,
+                 seek_table, silent_frame, stream_duration, xing_header_frame)
+from backends import SILENT_MP3_FRAME
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, joint stereo: 417 bytes, or 418 when padded
+MPEG1_HEADER = FrameHeader(MPEG1, 3, 128, 44100, channel_mode=1)
+
+
+def frame(header, fill=0x55):
+    return header.to_bytes() + bytes([fill]) * (header.length - 4)
+
+
+def id3v2_tag(size):
+    syncsafe = bytes([size >> 21 & 0x7F, size >> 14 & 0x7F, size >> 7 & 0x7F, size & 0x7F])
+    return b'ID3\x04\x00\x00' + syncsafe + bytes(size)
+
+
+def xing_fields(data):
+    header = parse_frame_header(data)
+    offset = 4 + header.side_info_size
+    tag = data[offset:offset + 4]
+    frames = int.from_bytes(data[offset + 8:offset + 12], 'big')
+    size = int.from_bytes(data[offset + 12:offset + 16], 'big')
+    toc = data[offset + 16:offset + 116]
+    return tag, frames, size, toc
+
+
+class TestFrames(unittest.TestCase):
+
+    def test_parse_gtts_frame_header(self):
+        header = parse_frame_header(SILENT_MP3_FRAME)
+        self.assertEqual((header.version, header.layer, header.bitrate, header.sample_rate),
+                         (MPEG2, 3, 32, 24000))
+        self.assertEqual((header.length, header.samples), (96, 576))
+        self.assertEqual(header.to_bytes()[:3], SILENT_MP3_FRAME[:3])
+
+    def test_frame_lengths(self):
+        self.assertEqual(MPEG1_HEADER.length, 417)
+        self.assertEqual(MPEG1_HEADER._replace(padding=1).length, 418)
+        self.assertEqual(parse_frame_header(MPEG1_HEADER.to_bytes()), MPEG1_HEADER)
+        self.assertEqual(FrameHeader(MPEG1, 1, 32, 32000).length, 48)
+
+    def test_invalid_headers(self):
+        self.assertIsNone(parse_frame_header(b'\xff\xf3'))
+        self.assertIsNone(parse_frame_header(b'ID3\x04'))
+        self.assertIsNone(parse_frame_header(b'\xff\xf3\x04\xc4'))  # free format
+        self.assertIsNone(parse_frame_header(b'\xff\xf3\xf4\xc4'))  # bad bitrate
+
+    def test_tags_and_vbr_headers_are_dropped(self):
+        header_frame = xing_header_frame(parse_frame_header(SILENT_MP3_FRAME), 3, 500, bytes(100), vbr=False)
+        id3v1 = b'TAG' + bytes(125)
+        data = id3v2_tag(20) + header_frame + SILENT_MP3_FRAME * 2 + id3v2_tag(5) + SILENT_MP3_FRAME + id3v1
+        frames = audio_frames(data)
+        self.assertEqual(frames.data, SILENT_MP3_FRAME * 3)
+        self.assertEqual((frames.frames, frames.bitrate), (3, 32))
+
+    def test_padded_and_mixed_bitrate_frames(self):
+        padded = MPEG1_HEADER._replace(padding=1)
+        faster = MPEG1_HEADER._replace(bitrate=192)
+        data = frame(MPEG1_HEADER) + frame(padded) + frame(faster)
+        frames = audio_frames(data)
+        self.assertEqual(frames.data, data)
+        self.assertEqual(frames.frames, 3)
+        self.assertIsNone(frames.bitrate)
+
+    def test_incomplete_last_frame_is_dropped(self):
+        self.assertEqual(audio_frames(SILENT_MP3_FRAME * 2 + SILENT_MP3_FRAME[:40]).frames, 2)
+
+    def test_garbage_is_an_error(self):
+        with self.assertRaises(MP3Error):
+            audio_frames(SILENT_MP3_FRAME + b'not audio')
+
+    def test_silent_frame_keeps_the_format_and_length(self):
+        header_frame = xing_header_frame(MPEG1_HEADER, 10, 4170, bytes(100), vbr=False)
+        silent = silent_frame(header_frame)
+        self.assertEqual(len(silent), len(header_frame))
+        self.assertEqual(parse_frame_header(silent), parse_frame_header(header_frame))
+        self.assertEqual(silent[4:], bytes(len(silent) - 4))
+        with self.assertRaises(MP3Error):
+            silent_frame(b'ID3\x04')
+
+
+class TestMP3Assembler(unittest.TestCase):
+
+    def test_segments_are_joined_under_one_header(self):
+        output = BytesIO()
+        assembler = MP3Assembler(output)
+        per_segment_header = xing_header_frame(parse_frame_header(SILENT_MP3_FRAME), 2, 192, bytes(100), False)
+        for count in (2, 3, 5):
+            assembler.write(id3v2_tag(10) + per_segment_header + SILENT_MP3_FRAME * count)
+        assembler.finish()
+
+        data = output.getvalue()
+        self.assertEqual(audio_frames(data).data, SILENT_MP3_FRAME * 10)
+        tag, frames, size, toc = xing_fields(data)
+        self.assertEqual((tag, frames, size), (b'Info', 10, len(data)))
+        self.assertEqual(toc[0], 0)
+        self.assertEqual(list(toc), sorted(toc))
+        self.assertEqual(data.count(b'ID3'), 0)
+
+    def test_varying_bitrates_give_a_xing_header(self):
+        output = BytesIO()
+        assembler = MP3Assembler(output)
+        assembler.write(frame(MPEG1_HEADER) * 2)
+        assembler.write(frame(MPEG1_HEADER._replace(bitrate=320)) * 2)
+        assembler.finish()
+        tag, frames, _, _ = xing_fields(output.getvalue())
+        self.assertEqual((tag, frames), (b'Xing', 4))
+
+    def test_resumed_stream_keeps_its_header(self):
+        output = BytesIO()
+        assembler = MP3Assembler(output)
+        assembler.write(SILENT_MP3_FRAME * 4)
+        resumed = MP3Assembler(output, assembler.segments)
+        resumed.write(SILENT_MP3_FRAME * 6)
+        resumed.finish()
+        data = output.getvalue()
+        self.assertEqual(xing_fields(data)[1:3], (10, len(data)))
+
+    def test_format_change_is_an_error(self):
+        assembler = MP3Assembler(BytesIO())
+        assembler.write(SILENT_MP3_FRAME)
+        with self.assertRaises(MP3Error):
+            assembler.write(frame(MPEG1_HEADER))
+
+    def test_seek_table_follows_the_frames(self):
+        # The first half of the frames takes a quarter of the bytes
+        toc = seek_table([(50, 100), (50, 300)])
+        self.assertEqual(toc[0], 0)
+        self.assertEqual(toc[25], 32)
+        self.assertEqual(toc[50], 64)
+        self.assertEqual(toc[75], 160)
+        self.assertEqual(seek_table([]), bytes(100))
+
+    def test_stream_duration_comes_from_the_header(self):
+        output = BytesIO()
+        assembler = MP3Assembler(output)
+        assembler.write(SILENT_MP3_FRAME * 125)
+        assembler.finish()
+        # 125 frames of 576 samples at 24 kHz
+        self.assertAlmostEqual(stream_duration(output.getvalue()), 3.0)
+        self.assertIsNone(stream_duration(SILENT_MP3_FRAME * 2))
+        self.assertIsNone(stream_duration(b'not audio'))
+
+
+if __name__ == '__main__':
+    unittest.main()
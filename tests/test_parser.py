@@ -7,7 +7,14 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
 from parser import extract_text_from_epub, extract_text_from_pdf, extract_text_from_fb2
+from document import DocumentNotFoundError, CorruptDocumentError
+from parser import iter_fb2_text, FB2BodyNotFoundError, html_to_text, EpubArchive
+from parser import iter_pdf_pages, PdfDecryptionError, _iter_pdf_reader_pages
+from bs4 import BeautifulSoup
 from ebooklib import epub # For creating dummy EPUB
+from unittest.mock import patch
+import zipfile
+import PyPDF2
 from reportlab.pdfgen import canvas # For creating dummy PDF
 from reportlab.lib.pagesizes import letter
 
@@ -23,6 +30,7 @@ class TestEpubParser(unittest.TestCase):
         cls.sample_epub_path = os.path.join(FIXTURES_DIR, "sample.epub")
         cls.malformed_epub_path = os.path.join(FIXTURES_DIR, "malformed.epub")
         cls.empty_content_epub_path = os.path.join(FIXTURES_DIR, "empty_content.epub")
+        cls.chapters_epub_path = os.path.join(FIXTURES_DIR, "chapters.epub")
 
         # Valid EPUB
         book = epub.EpubBook()
@@ -54,43 +62,161 @@ class TestEpubParser(unittest.TestCase):
         book_empty.spine = ['nav', c_empty]
         epub.write_epub(cls.empty_content_epub_path, book_empty, {})
 
+        # EPUB with several chapters of mixed markup, for the parallel mode
+        book_chapters = epub.EpubBook()
+        book_chapters.set_identifier('id_chapters_epub')
+        book_chapters.set_title('Chapters EPUB')
+        book_chapters.set_language('en')
+        chapters = []
+        for i in range(1, 7):
+            chapter = epub.EpubHtml(title=f'Chapter {i}', file_name=f'chap{i}.xhtml', lang='en')
+            chapter.content = (f'<h1>Chapter {i}</h1>\n<p>Text of chapter {i} with <em>emphasis</em> &amp; entities.</p>'
+                               '<pre>  keep\n  spacing  </pre><style>p {{ color: red; }}</style>'
+                               '<script>var hidden = 1;</script><ul>\n  <li>Item</li>\n</ul>')
+            book_chapters.add_item(chapter)
+            chapters.append(chapter)
+        book_chapters.add_item(epub.EpubImage(uid='plate', file_name='images/plate.png',
+                                              media_type='image/png', content=b'\x89PNG' + b'\0' * 4096))
+        book_chapters.add_item(epub.EpubItem(uid='css', file_name='style/book.css',
+                                             media_type='text/css', content=b'p { margin: 0; }'))
+        book_chapters.add_item(epub.EpubNcx())
+        book_chapters.add_item(epub.EpubNav())
+        book_chapters.spine = ['nav'] + chapters
+        epub.write_epub(cls.chapters_epub_path, book_chapters, {})
+
+        # EPUB with a table of contents, in a subdirectory of the package
+        cls.toc_epub_path = os.path.join(FIXTURES_DIR, "toc.epub")
+        book_toc = epub.EpubBook()
+        book_toc.set_identifier('id_toc_epub')
+        book_toc.set_title('TOC EPUB')
+        book_toc.set_language('en')
+        toc_chapters = []
+        for i, title in enumerate(['Opening', 'Middle Part', 'Closing'], 1):
+            chapter = epub.EpubHtml(title=title, file_name=f'text/part{i}.xhtml', lang='en')
+            chapter.content = f'<h1>{title}</h1><p>Text of part {i}.</p>'
+            book_toc.add_item(chapter)
+            toc_chapters.append(chapter)
+        book_toc.toc = toc_chapters
+        book_toc.add_item(epub.EpubNcx())
+        book_toc.add_item(epub.EpubNav())
+        book_toc.spine = ['nav'] + toc_chapters
+        epub.write_epub(cls.toc_epub_path, book_toc, {})
+
 
     def test_extract_text_from_valid_epub(self):
-        text = extract_text_from_epub(self.sample_epub_path)
+        text = extract_text_from_epub(self.sample_epub_path).text
         self.assertIn("This is sample EPUB content.", text)
         self.assertIn("Second paragraph.", text)
         self.assertNotIn("Error:", text)
 
     def test_extract_text_from_non_existent_epub(self):
-        text = extract_text_from_epub("non_existent.epub")
-        self.assertEqual(text, "Error: EPUB file not found.")
+        with self.assertRaises(DocumentNotFoundError) as cm:
+            extract_text_from_epub("non_existent.epub")
+        self.assertEqual(str(cm.exception), "EPUB file not found.")
 
     def test_extract_text_from_malformed_epub(self):
-        text = extract_text_from_epub(self.malformed_epub_path)
-        self.assertTrue(text.startswith("Error: Invalid or corrupted EPUB file.") or \
-                        text.startswith("An unexpected error occurred"), # ebooklib can raise different errors
-                        f"Unexpected message: {text}")
+        with self.assertRaises(CorruptDocumentError) as cm:
+            extract_text_from_epub(self.malformed_epub_path)
+        self.assertEqual(str(cm.exception), "Invalid or corrupted EPUB file.")
 
 
     def test_extract_text_from_empty_content_epub(self):
-        text = extract_text_from_epub(self.empty_content_epub_path)
-        # The current parser extracts titles from chapters even if paragraph text is empty.
-        # The sample "empty_content.epub" has a chapter titled "Empty".
-        # It also includes the book title "Empty Content EPUB" from the <title> tag in the xhtml file.
-        # The epub library might also add book title to text items.
-        # Let's check if it contains the chapter title or book title.
-        # Upon inspection of how ebooklib and BeautifulSoup extract text,
-        # it will include text from <title> tags within the XHTML files.
-        # The c_empty.content was '<h1></h1><p></p>', but it's wrapped in an XHTML structure
-        # by ebooklib which includes a <head><title>Empty Content EPUB</title></head> if not specified,
-        # or uses the chapter title.
-        # The actual content string is 'Empty Content EPUB\n\n\nEmpty\n\n\n'
-        # So, we expect the title of the book or chapter.
-        self.assertIn("Empty Content EPUB", text, "Text from empty content EPUB should include title.")
-        self.assertIn("Empty", text, "Text from empty content EPUB should include chapter title.")
-        # Check that there isn't more than just titles and whitespace
-        cleaned_text = text.replace("Empty Content EPUB", "").replace("Empty", "").strip()
-        self.assertEqual(cleaned_text, "", "Text from empty content EPUB should primarily be titles.")
+        # The book's only chapter has empty elements; the navigation page, which
+        # repeats the book and chapter titles, is not part of the text.
+        document = extract_text_from_epub(self.empty_content_epub_path)
+        self.assertEqual(document.text.strip(), "")
+        self.assertFalse(document)
+
+    def test_parallel_extraction_matches_sequential(self):
+        sequential = extract_text_from_epub(self.chapters_epub_path).text
+        for jobs in (2, 0):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(extract_text_from_epub(self.chapters_epub_path, jobs=jobs).text, sequential)
+        positions = [sequential.index(f"Text of chapter {i} ") for i in range(1, 7)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertNotIn("hidden", sequential)
+
+    def test_documents_are_chapters(self):
+        document = extract_text_from_epub(self.chapters_epub_path)
+        chapter_texts = [chapter.text for chapter in document.chapters]
+        self.assertEqual(len(chapter_texts), 6)  # the navigation page is not a chapter
+        self.assertIn("Text of chapter 1 ", chapter_texts[0])
+        self.assertIn("Item", list(document.chapters[5].paragraphs()))
+
+    def test_parallel_extraction_reports_errors(self):
+        with self.assertRaises(DocumentNotFoundError):
+            extract_text_from_epub("non_existent.epub", jobs=2)
+
+    def test_chapters_are_titled_from_the_table_of_contents(self):
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                document = extract_text_from_epub(self.toc_epub_path, jobs=jobs)
+                titled = [(chapter.title, chapter.text.split()[-1]) for chapter in document.chapters if chapter.title]
+                self.assertEqual(titled, [('Opening', '1.'), ('Middle Part', '2.'), ('Closing', '3.')])
+        # Without a navigation document, the NCX is read
+        with EpubArchive(self.toc_epub_path) as archive:
+            archive.nav = None
+            self.assertEqual(sorted(archive.toc_titles().values()), ['Closing', 'Middle Part', 'Opening'])
+
+    def test_epub_archive_matches_ebooklib(self):
+        book = epub.read_epub(self.chapters_epub_path)
+        items = [book.get_item_with_id(idref) for idref, _ in book.spine]
+        expected = [item.get_content() for item in items if not isinstance(item, epub.EpubNav)]
+        with EpubArchive(self.chapters_epub_path) as archive:
+            self.assertEqual(list(archive.iter_contents()), expected)
+
+    def test_chapters_follow_the_spine(self):
+        path = os.path.join(FIXTURES_DIR, "spine.epub")
+        book = epub.EpubBook()
+        book.set_identifier('id_spine_epub')
+        book.set_title('Spine EPUB')
+        book.set_language('en')
+        chapters = {}
+        for name, title in [('b', 'Second'), ('a', 'First'), ('notes', 'Notes')]:
+            chapters[name] = epub.EpubHtml(title=title, file_name=f'{name}.xhtml', lang='en')
+            chapters[name].content = f'<h1>{title}</h1><p>The {title.lower()} text.</p>'
+            book.add_item(chapters[name])
+        book.toc = [chapters['a'], chapters['b']]
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        book.spine = ['nav', chapters['a'], chapters['b'], ('notes', 'no')]
+        epub.write_epub(path, book, {})
+        try:
+            document = extract_text_from_epub(path)
+        finally:
+            os.remove(path)
+        self.assertEqual([chapter.title for chapter in document.chapters], ['First', 'Second'])
+        self.assertNotIn("Notes", document.text)
+
+    def test_epub_archive_reads_only_documents(self):
+        read_members = []
+        original_read = zipfile.ZipFile.read
+
+        def recording_read(zip_file, name, *args, **kwargs):
+            read_members.append(name)
+            return original_read(zip_file, name, *args, **kwargs)
+
+        with patch.object(zipfile.ZipFile, 'read', recording_read):
+            extract_text_from_epub(self.chapters_epub_path)
+        self.assertIn('META-INF/container.xml', read_members)
+        self.assertTrue(all(name.endswith(('.xml', '.opf', '.xhtml')) for name in read_members), read_members)
+
+    def test_epub_archive_rejects_non_zip_file(self):
+        with self.assertRaises(epub.EpubException):
+            EpubArchive(self.malformed_epub_path)
+
+    def test_html_to_text_matches_beautifulsoup(self):
+        documents = [
+            b'<?xml version="1.0"?>\n<!DOCTYPE html>\n<html><head><title>T</title></head>'
+            b'<body>\n  <p>One <b>two</b></p>\n\t<p>three</p>\n</body></html>\n',
+            b'<html><body><pre>\n  a  \n</pre><textarea> </textarea><div> \t </div></body></html>',
+            b'<html><body><template><p>hidden</p></template> tail<!-- c --> after</body></html>',
+            b'<html><body><p>&#160; &#xA0;</p><?pi x?> <script>x &lt; y</script></body></html>',
+            b'<html><body><p>tag soup<br></body></html>',  # not XML: BeautifulSoup fallback
+        ]
+        for document in documents:
+            with self.subTest(document=document):
+                self.assertEqual(html_to_text(document), BeautifulSoup(document, 'html.parser').get_text())
 
 
     @classmethod
@@ -98,6 +224,8 @@ class TestEpubParser(unittest.TestCase):
         os.remove(cls.sample_epub_path)
         os.remove(cls.malformed_epub_path)
         os.remove(cls.empty_content_epub_path)
+        os.remove(cls.chapters_epub_path)
+        os.remove(cls.toc_epub_path)
 
 class TestPdfParser(unittest.TestCase):
 
@@ -122,34 +250,129 @@ class TestPdfParser(unittest.TestCase):
         with open(cls.malformed_pdf_path, "w") as f:
             f.write("This is not a PDF file.")
 
+        # Longer PDF for the page-parallel mode
+        cls.long_pdf_path = os.path.join(FIXTURES_DIR, "long.pdf")
+        c = canvas.Canvas(cls.long_pdf_path, pagesize=letter)
+        for page in range(1, 8):
+            c.drawString(100, 750, f"Text of page {page}.")
+            c.showPage()
+        c.save()
+
+        # Copy with bookmarks: a title page, then parts starting on pages 2 and 5
+        cls.outline_pdf_path = os.path.join(FIXTURES_DIR, "outline.pdf")
+        writer = PyPDF2.PdfWriter()
+        for page in PyPDF2.PdfReader(cls.long_pdf_path).pages:
+            writer.add_page(page)
+        part_one = writer.add_outline_item("Part One", 1)
+        writer.add_outline_item("Section", 2, parent=part_one)
+        writer.add_outline_item("Part Two", 4)
+        with open(cls.outline_pdf_path, "wb") as f:
+            writer.write(f)
+
+        # Encrypted copies: one opens with an empty user password, one needs a real password
+        cls.empty_password_pdf_path = os.path.join(FIXTURES_DIR, "empty_password.pdf")
+        cls.password_pdf_path = os.path.join(FIXTURES_DIR, "password.pdf")
+        for path, password in ((cls.empty_password_pdf_path, ""), (cls.password_pdf_path, "secret")):
+            writer = PyPDF2.PdfWriter()
+            for page in PyPDF2.PdfReader(cls.long_pdf_path).pages:
+                writer.add_page(page)
+            writer.encrypt(password, "owner")
+            with open(path, "wb") as f:
+                writer.write(f)
+
     def test_extract_text_from_valid_pdf(self):
-        text = extract_text_from_pdf(self.sample_pdf_path)
+        text = extract_text_from_pdf(self.sample_pdf_path).text
         self.assertIn("Hello PDF.", text)
         self.assertIn("This is a test PDF document.", text)
         self.assertIn("Page two content.", text)
         self.assertFalse(text.startswith("Error:"))
 
     def test_extract_text_from_non_existent_pdf(self):
-        text = extract_text_from_pdf("non_existent.pdf")
-        self.assertEqual(text, "Error: PDF file not found at path: non_existent.pdf")
+        with self.assertRaises(DocumentNotFoundError) as cm:
+            extract_text_from_pdf("non_existent.pdf")
+        self.assertEqual(str(cm.exception), "PDF file not found at path: non_existent.pdf")
 
     def test_extract_text_from_malformed_pdf(self):
-        text = extract_text_from_pdf(self.malformed_pdf_path)
-        self.assertTrue(text.startswith("Error: Could not read PDF."), f"Unexpected message: {text}")
+        with self.assertRaises(CorruptDocumentError) as cm:
+            extract_text_from_pdf(self.malformed_pdf_path)
+        self.assertTrue(str(cm.exception).startswith("Could not read PDF."), f"Unexpected message: {cm.exception}")
     
+    def test_parallel_extraction_matches_sequential(self):
+        sequential = extract_text_from_pdf(self.long_pdf_path).text
+        self.assertIn("Text of page 7.", sequential)
+        for jobs in (2, 3, 0, 20):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(extract_text_from_pdf(self.long_pdf_path, jobs=jobs).text, sequential)
+
+    def test_outline_entries_are_chapters(self):
+        expected = extract_text_from_pdf(self.long_pdf_path)
+        self.assertEqual(len(expected.chapters), 1)
+        for jobs in (1, 3):
+            with self.subTest(jobs=jobs):
+                document = extract_text_from_pdf(self.outline_pdf_path, jobs=jobs)
+                self.assertEqual(document.text, expected.text)
+                chapters = document.chapters
+                self.assertEqual([chapter.title for chapter in chapters], [None, "Part One", "Part Two"])
+                self.assertEqual(list(chapters[1].paragraphs()), ["Text of page 2.", "Text of page 3.",
+                                                                  "Text of page 4."])
+                self.assertTrue(chapters[2].text.startswith("Text of page 5."))
+
+    def test_empty_password_pdf_is_decrypted_in_every_mode(self):
+        expected = extract_text_from_pdf(self.long_pdf_path).text
+        for jobs in (1, 3):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(extract_text_from_pdf(self.empty_password_pdf_path, jobs=jobs).text, expected)
+
+    def test_password_protected_pdf(self):
+        for jobs in (1, 3):
+            with self.subTest(jobs=jobs):
+                with self.assertRaises(PdfDecryptionError) as cm:
+                    extract_text_from_pdf(self.password_pdf_path, jobs=jobs)
+                self.assertEqual(str(cm.exception),
+                                 "PDF file is encrypted and could not be decrypted with an empty password.")
+
+    def test_iter_pdf_pages_yields_numbered_pages_lazily(self):
+        pages = iter_pdf_pages(self.long_pdf_path)
+        number, first_text = next(pages)
+        self.assertEqual((number, first_text.strip()), (1, "Text of page 1."))
+        rest = list(pages)
+        self.assertEqual([number for number, _ in rest], list(range(2, 8)))
+        self.assertEqual("\n".join([first_text] + [text for _, text in rest]),
+                         extract_text_from_pdf(self.long_pdf_path).text)
+
+    def test_iter_pdf_pages_releases_parsed_objects(self):
+        with open(self.long_pdf_path, 'rb') as pdf_file:
+            reader = PyPDF2.PdfReader(pdf_file)
+            len(reader.pages)
+            cached = len(reader.resolved_objects)
+            for _ in _iter_pdf_reader_pages(reader, 0, len(reader.pages)):
+                self.assertEqual(len(reader.resolved_objects), cached)
+
+    def test_iter_pdf_pages_errors(self):
+        with self.assertRaises(FileNotFoundError):
+            list(iter_pdf_pages("non_existent.pdf"))
+        with self.assertRaises(PdfDecryptionError):
+            list(iter_pdf_pages(self.password_pdf_path))
+        self.assertEqual(len(list(iter_pdf_pages(self.empty_password_pdf_path))), 7)
+
     # Placeholder for encrypted PDF test - actual encryption is hard to setup simply
     # For now, this will behave like a malformed PDF if PyPDF2 can't open it.
     # If PyPDF2 *can* open it (e.g. passwordless but restricted), text might be empty.
     def test_extract_text_from_non_pdf_file(self):
         # Use the malformed_pdf_path (which is just a text file)
         # This tests how extract_text_from_pdf handles a file that is not a PDF.
-        text = extract_text_from_pdf(self.malformed_pdf_path)
-        self.assertTrue(text.startswith("Error: Could not read PDF."), 
-                        f"Unexpected message for non-PDF file test: {text}")
+        with self.assertRaises(CorruptDocumentError) as cm:
+            extract_text_from_pdf(self.malformed_pdf_path)
+        self.assertTrue(str(cm.exception).startswith("Could not read PDF."),
+                        f"Unexpected message for non-PDF file test: {cm.exception}")
 
     @classmethod
     def tearDownClass(cls):
         os.remove(cls.sample_pdf_path)
+        os.remove(cls.long_pdf_path)
+        os.remove(cls.outline_pdf_path)
+        os.remove(cls.empty_password_pdf_path)
+        os.remove(cls.password_pdf_path)
         os.remove(cls.malformed_pdf_path)
 
 # FB2 tests are omitted for now due to persistent ImportError with the fb2 library in the environment.
@@ -186,6 +409,9 @@ class TestFB2Parser(unittest.TestCase):
             f.write(cls._create_sample_fb2_special_chars_content())
         with open(cls.malformed_xml_path, "w", encoding="utf-8") as f:
             f.write(cls._create_malformed_xml_content())
+        cls.structured_fb2_path = os.path.join(cls.test_dir, "structured.fb2")
+        with open(cls.structured_fb2_path, "w", encoding="utf-8") as f:
+            f.write(cls._create_sample_fb2_structured_content())
         with open(cls.non_fb2_path, "w", encoding="utf-8") as f:
             f.write("This is a plain text file, not FB2 or XML.")
         
@@ -250,6 +476,27 @@ class TestFB2Parser(unittest.TestCase):
 # Note: The current parser implementation normalizes spaces, so "A  B  C" -> "A B C"
 # and "\n" -> " ".
 
+    @staticmethod
+    def _create_sample_fb2_structured_content():
+        return """<?xml version="1.0" encoding="utf-8"?>
+<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0">
+<description><title-info><book-title>Structured Book</book-title></title-info></description>
+<body>
+    <title><p>Part One</p></title>
+    <epigraph><p>An epigraph</p></epigraph>
+    <section><title><p>Chapter 1</p></title>
+        <p>First paragraph.</p>
+        <empty-line/>
+        <section><subtitle>Nested</subtitle>
+            <p>Deep paragraph.</p>
+            <poem><stanza><v>A verse line</v></stanza></poem>
+        </section>
+    </section>
+</body>
+<body name="notes"><section><p>A note that is not read.</p></section></body>
+<binary id="cover.jpg" content-type="image/jpeg">QUJDREVGR0g=</binary>
+</FictionBook>"""
+
     @staticmethod
     def _create_malformed_xml_content():
         return """<?xml version="1.0" encoding="utf-8"?>
@@ -267,16 +514,18 @@ class TestFB2Parser(unittest.TestCase):
                          "This is paragraph two with\n\n" # End of section 1, start of section 2 - "emphasis." removed
                          "Chapter 2\n\n"
                          "Another paragraph.") # Final .strip() removes trailing \n from last <p> if no more content
-        text = extract_text_from_fb2(self.sample_fb2_path)
+        text = extract_text_from_fb2(self.sample_fb2_path).text
         self.assertEqual(text, expected_text)
 
     def test_extract_text_no_body(self):
-        text = extract_text_from_fb2(self.no_body_fb2_path)
-        self.assertEqual(text, "Info: FB2 file has no body content or body tag is not standard.")
+        with self.assertRaises(FB2BodyNotFoundError) as cm:
+            extract_text_from_fb2(self.no_body_fb2_path)
+        self.assertEqual(str(cm.exception), "FB2 file has no body content or body tag is not standard.")
 
     def test_extract_text_empty_body(self):
-        text = extract_text_from_fb2(self.empty_body_fb2_path)
-        self.assertEqual(text, "Info: FB2 body was found, but no text content was extracted from it.")
+        document = extract_text_from_fb2(self.empty_body_fb2_path)
+        self.assertFalse(document)
+        self.assertEqual(document.text, "")
 
     def test_extract_text_special_chars(self):
         # Expected output based on new structured parsing:
@@ -288,29 +537,82 @@ class TestFB2Parser(unittest.TestCase):
                          "Some\n" # "bold and italic text." removed
                          "A line with preserved spaces:  A  B  C\n" # Expect multiple internal spaces to be preserved
                          "A\nnewline character (should become space).") # \n within text node is preserved
-        text = extract_text_from_fb2(self.special_chars_fb2_path)
+        text = extract_text_from_fb2(self.special_chars_fb2_path).text
         self.assertEqual(text, expected_text)
 
     def test_extract_text_from_non_fb2_file(self):
         # This will raise XMLSyntaxError because plain text is not valid XML
-        text = extract_text_from_fb2(self.non_fb2_path)
-        self.assertTrue(text.startswith("Error: Invalid or corrupted FB2 file. XMLSyntaxError:"), f"Unexpected message: {text}")
+        with self.assertRaises(CorruptDocumentError) as cm:
+            extract_text_from_fb2(self.non_fb2_path)
+        self.assertTrue(str(cm.exception).startswith("Invalid or corrupted FB2 file. XMLSyntaxError:"), f"Unexpected message: {cm.exception}")
 
     def test_extract_text_file_not_found(self):
-        text = extract_text_from_fb2("non_existent_file.fb2")
-        self.assertEqual(text, "Error: FB2 file not found at path: non_existent_file.fb2")
+        with self.assertRaises(DocumentNotFoundError) as cm:
+            extract_text_from_fb2("non_existent_file.fb2")
+        self.assertEqual(str(cm.exception), "FB2 file not found at path: non_existent_file.fb2")
 
     def test_extract_text_malformed_xml(self):
-        text = extract_text_from_fb2(self.malformed_xml_path)
-        self.assertTrue(text.startswith("Error: Invalid or corrupted FB2 file. XMLSyntaxError:"), f"Unexpected message: {text}")
+        with self.assertRaises(CorruptDocumentError) as cm:
+            extract_text_from_fb2(self.malformed_xml_path)
+        self.assertTrue(str(cm.exception).startswith("Invalid or corrupted FB2 file. XMLSyntaxError:"), f"Unexpected message: {cm.exception}")
 
     def test_extract_text_from_windows1251_fb2(self):
         # lxml should handle XML-declared encodings.
         # The parser extracts text from <p> and adds a newline.
         expected_text = "Привет мир" # The final .strip() in the main function removes the trailing \n
-        text = extract_text_from_fb2(self.cp1251_fb2_path)
+        text = extract_text_from_fb2(self.cp1251_fb2_path).text
         self.assertEqual(text, expected_text)
 
+    def test_streaming_matches_tree_parser(self):
+        for path in (self.sample_fb2_path, self.empty_body_fb2_path,
+                     self.special_chars_fb2_path, self.cp1251_fb2_path, self.structured_fb2_path):
+            with self.subTest(path=os.path.basename(path)):
+                streamed, parsed = extract_text_from_fb2(path, streaming=True), extract_text_from_fb2(path, streaming=False)
+                self.assertEqual(streamed.text, parsed.text)
+                self.assertEqual([(c.title, c.start, c.end) for c in streamed.chapters],
+                                 [(c.title, c.start, c.end) for c in parsed.chapters])
+
+    def test_streaming_reports_errors_like_tree_parser(self):
+        with self.assertRaises(DocumentNotFoundError) as cm:
+            extract_text_from_fb2("non_existent_file.fb2", streaming=True)
+        self.assertEqual(str(cm.exception), "FB2 file not found at path: non_existent_file.fb2")
+        with self.assertRaises(FB2BodyNotFoundError):
+            extract_text_from_fb2(self.no_body_fb2_path, streaming=True)
+        for path in (self.malformed_xml_path, self.non_fb2_path):
+            with self.assertRaises(CorruptDocumentError) as cm:
+                extract_text_from_fb2(path, streaming=True)
+            self.assertTrue(str(cm.exception).startswith("Invalid or corrupted FB2 file. XMLSyntaxError:"), f"Unexpected message: {cm.exception}")
+
+    def test_iter_fb2_text_yields_blocks_and_skips_binaries(self):
+        chunks = list(iter_fb2_text(self.structured_fb2_path))
+        self.assertEqual(chunks[:4], ["Part One", "\n\n", "An epigraph", "\n\n"])
+        self.assertNotIn("QUJD", "".join(chunks))
+        self.assertEqual("".join(chunks), extract_text_from_fb2(self.structured_fb2_path).text)
+
+    def test_deeply_nested_sections(self):
+        # Deeper than Python's default recursion limit.
+        depth = 1500
+        path = os.path.join(self.test_dir, "deep.fb2")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body>')
+            f.write('<section><p>Level</p>' * depth)
+            f.write('</section>' * depth)
+            f.write('</body></FictionBook>')
+        expected_text = "\n\n".join(["Level"] * depth)
+        self.assertEqual(extract_text_from_fb2(path, streaming=False).text, expected_text)
+        self.assertEqual(extract_text_from_fb2(path, streaming=True).text, expected_text)
+
+    def test_top_level_sections_are_chapters(self):
+        document = extract_text_from_fb2(self.sample_fb2_path)
+        self.assertEqual([chapter.title for chapter in document.chapters], ["Chapter 1", "Chapter 2"])
+        self.assertEqual(list(document.chapters[1].paragraphs()), ["Chapter 2", "Another paragraph."])
+        structured = extract_text_from_fb2(self.structured_fb2_path)
+        self.assertEqual([chapter.title for chapter in structured.chapters], ["Part One", "Chapter 1"])
+
+    def test_iter_fb2_text_without_body(self):
+        with self.assertRaises(FB2BodyNotFoundError):
+            list(iter_fb2_text(self.no_body_fb2_path))
+
 
 if __name__ == '__main__':
     unittest.main()
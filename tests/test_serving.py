@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from serving import send_audio, file_etag, parse_ranges, MAX_RANGES
+
+AUDIO = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    filepath = tmp_path / 'book.mp3'
+    filepath.write_bytes(AUDIO)
+    return str(filepath)
+
+
+@pytest.fixture
+def client(audio_file):
+    app = Flask(__name__)
+    app.config['ACCEL_REDIRECT'] = None
+
+    @app.route('/audio')
+    def audio():
+        return send_audio(audio_file, accel_redirect=app.config['ACCEL_REDIRECT'])
+
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_etag_is_the_content_hash(client, audio_file):
+    response = client.get('/audio')
+    assert response.status_code == 200
+    assert response.data == AUDIO
+    assert response.headers['ETag'] == '"%s"' % hashlib.sha256(AUDIO).hexdigest()
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert 'attachment; filename=book.mp3' == response.headers['Content-Disposition']
+    response.close()
+
+
+def test_current_copies_are_not_sent_again(client):
+    etag = client.get('/audio').headers['ETag']
+    response = client.get('/audio', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert client.get('/audio', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_etag_follows_the_file_content(audio_file):
+    etag = file_etag(audio_file)
+    assert file_etag(audio_file) == etag
+    with open(audio_file, 'ab') as f:
+        f.write(b'more')
+    assert file_etag(audio_file) != etag
+
+
+def test_single_range(client):
+    response = client.get('/audio', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(AUDIO)}'
+    assert response.data == AUDIO[100:200]
+    response.close()
+
+
+def test_multiple_ranges(client):
+    response = client.get('/audio', headers={'Range': 'bytes=0-9, 500-509, -5'})
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    boundary = response.mimetype_params['boundary']
+    assert int(response.headers['Content-Length']) == len(response.data)
+    parts = response.data.split(f'--{boundary}'.encode())
+    assert parts[0] == b'' and parts[-1] == b'--\r\n'
+    expected = [(0, 9), (500, 509), (len(AUDIO) - 5, len(AUDIO) - 1)]
+    for part, (start, end) in zip(parts[1:-1], expected):
+        headers, body = part.split(b'\r\n\r\n', 1)
+        assert f'Content-Range: bytes {start}-{end}/{len(AUDIO)}'.encode() in headers
+        assert body == AUDIO[start:end + 1] + b'\r\n'
+
+
+def test_overlapping_ranges_are_merged(client):
+    response = client.get('/audio', headers={'Range': 'bytes=10-19,15-29'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 10-29/{len(AUDIO)}'
+    assert response.data == AUDIO[10:30]
+
+
+def test_unsatisfiable_and_excessive_ranges(client):
+    response = client.get('/audio', headers={'Range': f'bytes={len(AUDIO)}-,{len(AUDIO) + 10}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(AUDIO)}'
+    many = ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(MAX_RANGES + 1))
+    response = client.get('/audio', headers={'Range': f'bytes={many}'})
+    assert response.status_code == 200
+    assert response.data == AUDIO
+    response.close()
+
+
+def test_ranges_of_a_changed_file_are_not_served(client):
+    response = client.get('/audio', headers={'Range': 'bytes=0-9,20-29', 'If-Range': '"old"'})
+    assert response.status_code == 200
+    assert response.data == AUDIO
+    response.close()
+
+
+def test_accel_redirect(client):
+    client.application.config['ACCEL_REDIRECT'] = '/protected/audio/'
+    response = client.get('/audio', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/protected/audio/book.mp3'
+    assert response.data == b''
+    assert response.headers['ETag'] == '"%s"' % hashlib.sha256(AUDIO).hexdigest()
+    etag = response.headers['ETag']
+    assert client.get('/audio', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_parse_ranges():
+    assert parse_ranges('bytes=0-9,20-,-5') == [(0, 10), (20, None), (-5, None)]
+    assert parse_ranges('bytes=15-29, 10-19') == [(15, 30), (10, 20)]
+    for header in (None, '', 'items=0-1', 'bytes=-', 'bytes=9-5', 'bytes=a-b'):
+        assert parse_ranges(header) is None
@@ -0,0 +1,152 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add project root to sys.path to allow importing storage module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from storage import StorageManager
+
+
+class TestStorageManager(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, size):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * size)
+        return path
+
+    def test_least_recently_used_files_are_evicted(self):
+        storage = StorageManager(self.directory, max_bytes=300)
+        paths = [self.write(f"{i}.mp3", 100) for i in range(3)]
+        for path in paths:
+            self.assertEqual(storage.add(path), [])
+        storage.touch(paths[0])
+
+        new = self.write("3.mp3", 150)
+        self.assertEqual(storage.add(new), [os.path.abspath(paths[1]), os.path.abspath(paths[2])])
+        self.assertEqual(sorted(os.listdir(self.directory)), ["0.mp3", "3.mp3"])
+        self.assertEqual((storage.total_bytes, len(storage)), (250, 2))
+
+    def test_pinned_files_are_kept(self):
+        storage = StorageManager(self.directory, max_bytes=250)
+        old = self.write("old.mp3", 100)
+        middle = self.write("middle.mp3", 100)
+        storage.add(old)
+        storage.add(middle)
+        with storage.pinned(old):
+            self.assertEqual(storage.add(self.write("new.mp3", 100)), [os.path.abspath(middle)])
+            self.assertTrue(os.path.exists(old))
+            storage.max_bytes = 150
+            self.assertEqual(storage.evict(), [os.path.abspath(os.path.join(self.directory, "new.mp3"))])
+            self.assertEqual(storage.total_bytes, 100)
+        self.assertIn(old, storage)
+        storage.max_bytes = 50
+        self.assertEqual(storage.evict(), [os.path.abspath(old)])
+
+    def test_pins_are_counted(self):
+        storage = StorageManager(self.directory, max_bytes=0)
+        path = self.write("book.mp3", 10)
+        storage.pin(path)
+        storage.pin(path)
+        storage.add(path)
+        storage.unpin(path)
+        self.assertEqual(storage.evict(), [])
+        storage.unpin(path)
+        self.assertEqual(storage.evict(), [os.path.abspath(path)])
+
+    def test_existing_files_are_indexed_in_access_order(self):
+        paths = [self.write(f"{i}.mp3", 100) for i in range(3)]
+        now = time.time()
+        for age, path in zip((10, 30, 20), paths):
+            os.utime(path, (now - age, now))
+        os.mkdir(os.path.join(self.directory, "covers"))
+
+        storage = StorageManager(self.directory, max_bytes=200)
+        self.assertEqual(storage.total_bytes, 200)
+        self.assertFalse(os.path.exists(paths[1]))
+        self.assertEqual(storage.add(self.write("3.mp3", 50)), [os.path.abspath(paths[2])])
+        self.assertTrue(os.path.isdir(os.path.join(self.directory, "covers")))
+
+    def write_parts(self, output_name, size, age):
+        parts_dir = os.path.join(self.directory, output_name + ".parts")
+        os.mkdir(parts_dir)
+        then = time.time() - age
+        for name in ("audio.partial", "manifest.jsonl"):
+            path = os.path.join(parts_dir, name)
+            with open(path, 'wb') as f:
+                f.write(b'\0' * (size // 2))
+            os.utime(path, (then, then))
+        os.utime(parts_dir, (then, then))
+        return parts_dir
+
+    def test_abandoned_parts_directories_are_counted_and_evicted(self):
+        abandoned = self.write_parts("abandoned.mp3", 200, age=60)
+        running = self.write_parts("running.mp3", 200, age=120)
+        path = self.write("book.mp3", 100)
+        os.utime(path, (time.time() - 30, time.time()))
+
+        storage = StorageManager(self.directory, max_bytes=1000)
+        self.assertEqual((storage.total_bytes, len(storage)), (500, 3))
+        storage.pin(os.path.join(self.directory, "running.mp3"))
+        storage.max_bytes = 150
+        self.assertEqual(storage.evict(), [os.path.abspath(abandoned), os.path.abspath(path)])
+        self.assertFalse(os.path.exists(abandoned))
+        self.assertTrue(os.path.isdir(running))
+
+        # Once the conversion is done, its parts directory is gone and its output is counted instead
+        output = self.write("running.mp3", 100)
+        shutil.rmtree(running)
+        storage.add(output)
+        self.assertEqual((storage.total_bytes, len(storage)), (100, 1))
+
+    def test_removing_a_parts_directory(self):
+        parts_dir = self.write_parts("failed.mp3", 100, age=0)
+        storage = StorageManager(self.directory, max_bytes=1000)
+        storage.remove(parts_dir)
+        self.assertEqual((storage.total_bytes, len(storage)), (0, 0))
+        self.assertFalse(os.path.exists(parts_dir))
+
+    def test_touching_keeps_the_modification_time(self):
+        storage = StorageManager(self.directory, max_bytes=1000)
+        path = self.write("book.mp3", 10)
+        os.utime(path, (1000000000, 1000000000))
+        storage.add(path)
+        storage.touch(path)
+        stat = os.stat(path)
+        self.assertEqual(stat.st_mtime, 1000000000)
+        self.assertGreater(stat.st_atime, 1000000000)
+
+    def test_rewritten_and_removed_files(self):
+        storage = StorageManager(self.directory, max_bytes=1000)
+        path = self.write("book.mp3", 100)
+        storage.add(path)
+        self.write("book.mp3", 300)
+        storage.add(path)
+        self.assertEqual((storage.total_bytes, len(storage)), (300, 1))
+        storage.remove(path)
+        self.assertEqual((storage.total_bytes, len(storage)), (0, 0))
+        self.assertFalse(os.path.exists(path))
+        storage.remove(path)
+
+    def test_stale_heap_entries_are_dropped(self):
+        storage = StorageManager(self.directory, max_bytes=1000)
+        path = self.write("book.mp3", 10)
+        storage.add(path)
+        for _ in range(1000):
+            storage.touch(path)
+        self.assertLess(len(storage._heap), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# Add project root to sys.path to allow importing streaming module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from streaming import PartialAudio, follow, parse_byte_range
+from checkpoint import ConversionCheckpoint
+from jobs import Job, DONE
+from backends import SILENT_MP3_FRAME
+from mp3 import silent_frame
+
+
+class TestByteRanges(unittest.TestCase):
+
+    def test_single_ranges(self):
+        self.assertEqual(parse_byte_range('bytes=0-99'), (0, 99))
+        self.assertEqual(parse_byte_range('bytes=100-'), (100, None))
+        self.assertEqual(parse_byte_range('bytes = 5-5'), (5, 5))
+
+    def test_ranges_that_are_ignored(self):
+        for header in (None, '', 'bytes=-500', 'bytes=0-1,5-9', 'bytes=9-5', 'items=0-1'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_byte_range(header))
+
+
+class TestFollow(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmp_dir, 'book.mp3')
+        self.checkpoint = ConversionCheckpoint(self.output, 'fingerprint')
+        self.job = Job('book.epub')
+
+    def tearDown(self):
+        self.checkpoint.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, frames):
+        self.checkpoint.write(SILENT_MP3_FRAME * frames)
+        self.job.report('progress', {'bytes_written': self.checkpoint.size})
+
+    def test_partial_audio_starts_with_a_silent_frame(self):
+        self.write(2)
+        audio = PartialAudio(self.output)
+        data = audio.read(0, self.checkpoint.size)
+        audio.close()
+        header_length = self.checkpoint.size - 2 * len(SILENT_MP3_FRAME)
+        with open(self.checkpoint.partial_path, 'rb') as f:
+            placeholder = f.read(header_length)
+        self.assertIn(b'Info', placeholder)
+        self.assertEqual(data[:header_length], silent_frame(placeholder))
+        self.assertEqual(data[4:header_length], bytes(header_length - 4))
+        self.assertEqual(data[header_length:], SILENT_MP3_FRAME * 2)
+
+    def test_audio_without_partial_file(self):
+        with self.assertRaises(FileNotFoundError):
+            PartialAudio(os.path.join(self.tmp_dir, 'other.mp3'))
+
+    def test_new_audio_is_yielded_until_the_job_is_finished(self):
+        self.write(2)
+        audio = PartialAudio(self.output)
+        received = []
+        reader = threading.Thread(target=lambda: received.extend(follow(self.job, audio, 0, None, timeout=5)))
+        reader.start()
+        self.write(3)
+        self.job._set_state(DONE)
+        reader.join(5)
+        audio.close()
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(len(b''.join(received)), self.checkpoint.size)
+
+    def test_ranges_stop_at_their_end(self):
+        self.write(3)
+        audio = PartialAudio(self.output)
+        data = b''.join(follow(self.job, audio, 200, 299, timeout=0))
+        audio.close()
+        with open(self.checkpoint.partial_path, 'rb') as f:
+            f.seek(200)
+            self.assertEqual(data, f.read(100))
+
+    def test_waiting_readers_yield_nothing_while_no_audio_comes(self):
+        self.write(1)
+        audio = PartialAudio(self.output)
+        stream = follow(self.job, audio, self.checkpoint.size, None, timeout=0.01)
+        self.assertEqual(next(stream), b'')
+        stream.close()
+        audio.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
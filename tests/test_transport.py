@@ -0,0 +1,147 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+import threading
+import time
+
+import requests
+
+# Add project root to sys.path to allow importing transport module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from transport import TokenBucket, RetryPolicy, HTTPTransport, retry_after, shared_transport
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def response(status_code, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = b''
+    result._content_consumed = True
+    return result
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2, capacity=3, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_then_rate(self):
+        waits = [self.bucket.acquire() for _ in range(5)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 0.5)
+        self.assertAlmostEqual(waits[4], 0.5)
+
+    def test_refills_up_to_capacity(self):
+        for _ in range(3):
+            self.bucket.acquire()
+        self.clock.now += 60
+        self.assertEqual([self.bucket.acquire() for _ in range(3)], [0, 0, 0])
+        self.assertGreater(self.bucket.acquire(), 0)
+
+    def test_pause_holds_every_caller(self):
+        self.bucket.pause(5)
+        self.assertAlmostEqual(self.bucket.acquire(), 5)
+        # The saved-up burst was dropped, so the next token comes at the refill rate
+        self.assertAlmostEqual(self.bucket.acquire(), 0.5)
+
+    def test_rate_is_shared_between_threads(self):
+        bucket = TokenBucket(rate=200, capacity=1)
+        started = time.perf_counter()
+        threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(10)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 40 tokens, one of them from the initial burst, at 200 per second
+        self.assertGreaterEqual(time.perf_counter() - started, 39 / 200 * 0.9)
+
+    def test_rate_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_delays_are_jittered_and_capped(self):
+        policy = RetryPolicy(base_delay=1, max_delay=10)
+        for retry in range(8):
+            delays = [policy.delay(retry) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= min(10, 2 ** retry) for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_retry_after(self):
+        self.assertEqual(retry_after(response(429, {'Retry-After': '7'})), 7)
+        self.assertEqual(retry_after(response(429)), 0)
+        self.assertEqual(retry_after(response(429, {'Retry-After': 'soon'})), 0)
+        self.assertGreater(retry_after(response(429, {'Retry-After': 'Fri, 31 Dec 2100 23:59:59 GMT'})), 0)
+
+
+class TestHTTPTransport(unittest.TestCase):
+
+    def transport(self, *outcomes, attempts=4, rate_limiter=None):
+        self.session = MagicMock()
+        self.session.send.side_effect = list(outcomes)
+        self.slept = []
+        return HTTPTransport(rate_limiter=rate_limiter, retry=RetryPolicy(attempts=attempts, base_delay=1),
+                             session=self.session, sleep=self.slept.append)
+
+    def test_success_is_returned_at_once(self):
+        transport = self.transport(response(200))
+        self.assertEqual(transport.send('request', timeout=5).status_code, 200)
+        self.session.send.assert_called_once_with('request', timeout=5)
+        self.assertEqual((transport.requests, transport.retries), (1, 0))
+
+    def test_client_errors_are_not_retried(self):
+        transport = self.transport(response(404))
+        self.assertEqual(transport.send('request').status_code, 404)
+        self.assertEqual(transport.retries, 0)
+
+    def test_transient_failures_are_retried(self):
+        transport = self.transport(requests.Timeout(), response(502), response(200))
+        self.assertEqual(transport.send('request').status_code, 200)
+        self.assertEqual(transport.retries, 2)
+        self.assertEqual(len(self.slept), 2)
+
+    def test_last_failure_is_returned_or_raised(self):
+        transport = self.transport(*[response(503)] * 4)
+        self.assertEqual(transport.send('request').status_code, 503)
+        transport = self.transport(*[requests.ConnectionError()] * 4)
+        with self.assertRaises(requests.ConnectionError):
+            transport.send('request')
+        self.assertEqual(self.session.send.call_count, 4)
+
+    def test_throttling_honours_retry_after_and_pauses_the_bucket(self):
+        bucket = MagicMock()
+        transport = self.transport(response(429, {'Retry-After': '120'}), response(200), rate_limiter=bucket)
+        self.assertEqual(transport.send('request').status_code, 200)
+        self.assertEqual(self.slept, [120])
+        bucket.pause.assert_called_once_with(120)
+        self.assertEqual(bucket.acquire.call_count, 2)
+        self.assertEqual(transport.throttled, 1)
+
+    def test_shared_transport_is_a_singleton(self):
+        self.assertIs(shared_transport(), shared_transport())
+        self.assertIsNotNone(shared_transport().rate_limiter)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
+import threading
+import time
 import os
 import sys
 
@@ -7,13 +9,51 @@ import sys
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
-from tts import convert_text_to_speech, gTTS # Import gTTS for isinstance check if needed, or gTTSError
+from tts import convert_text_to_speech, gTTSError
+from tts import split_text_into_chunks, count_chunks, synthesize_chunks, AudioCache, ConcurrencyController, RequestHedging
+from tts import OrderedSegmentWriter
+from concurrent.futures import ThreadPoolExecutor
+import shutil
+import tempfile
+from document import Document
+from backends import TTSBackend, BackendCapabilities, StubBackend, SILENT_MP3_FRAME
+from mp3 import audio_frames
 
 # Define a directory for test output (if any files are temporarily created)
 TEST_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'output')
 if not os.path.exists(TEST_OUTPUT_DIR):
     os.makedirs(TEST_OUTPUT_DIR)
 
+FRAME_HEADER = SILENT_MP3_FRAME[:4]
+FRAME_PAYLOAD = len(SILENT_MP3_FRAME) - 4
+
+
+def mp3_frames(payload):
+    """Returns MP3 frames that carry `payload` in place of their audio data, for spoken()."""
+    return b''.join(FRAME_HEADER + payload[i:i + FRAME_PAYLOAD].ljust(FRAME_PAYLOAD, b'\0')
+                    for i in range(0, len(payload), FRAME_PAYLOAD))
+
+
+def spoken(data):
+    """Returns the payloads of the MP3 frames in data, in order."""
+    frames = audio_frames(data).data
+    return b''.join(frames[i + 4:i + len(SILENT_MP3_FRAME)].rstrip(b'\0')
+                    for i in range(0, len(frames), len(SILENT_MP3_FRAME)))
+
+
+class FunctionBackend(TTSBackend):
+    """A backend that calls the given synthesize(chunk, lang) function and wraps its result in MP3 frames."""
+    name = 'function'
+
+    def __init__(self, synthesize, max_chunk_chars=500, max_concurrency=64):
+        super().__init__()
+        self.function = synthesize
+        self.capabilities = BackendCapabilities(max_chunk_chars, max_concurrency)
+
+    def synthesize(self, chunk, lang):
+        return mp3_frames(self.function(chunk, lang))
+
+
 class TestTextToSpeech(unittest.TestCase):
 
     def tearDown(self):
@@ -25,11 +65,14 @@ class TestTextToSpeech(unittest.TestCase):
         error_mp3_file = os.path.join(TEST_OUTPUT_DIR, "error_audio.mp3")
         if os.path.exists(error_mp3_file):
             os.remove(error_mp3_file)
+        # Failed conversions leave their checkpoint behind
+        shutil.rmtree(error_mp3_file + '.parts', ignore_errors=True)
 
-    @patch('tts.gTTS') # Mock the gTTS class in the tts module
+    @patch('backends.gTTS') # Mock the gTTS class in the tts module
     def test_convert_text_to_speech_success(self, mock_gtts_class):
-        # Configure the mock gTTS instance and its save method
+        # Configure the mock gTTS instance; it prepares no HTTP requests, so nothing is sent
         mock_gtts_instance = MagicMock()
+        mock_gtts_instance._prepare_requests.return_value = []
         mock_gtts_class.return_value = mock_gtts_instance
         
         text = "Hello world"
@@ -40,9 +83,9 @@ class TestTextToSpeech(unittest.TestCase):
         self.assertTrue(success)
         self.assertEqual(message, f"Successfully converted text to speech and saved to {output_filepath}")
         mock_gtts_class.assert_called_once_with(text=text, lang='en', slow=False)
-        mock_gtts_instance.save.assert_called_once_with(output_filepath)
-        # We don't check for os.path.exists here because gTTS().save() is mocked.
-        # If we wanted to test file creation, we'd need a more complex mock or allow file creation.
+        # The backend sends the requests gTTS prepares for each chunk through its own transport.
+        mock_gtts_instance._prepare_requests.assert_called_once_with()
+        self.assertTrue(os.path.exists(output_filepath))
 
     def test_convert_text_to_speech_empty_text(self):
         output_filepath = os.path.join(TEST_OUTPUT_DIR, "error_audio.mp3")
@@ -55,11 +98,8 @@ class TestTextToSpeech(unittest.TestCase):
         self.assertFalse(success)
         self.assertEqual(message, "Error: Output filepath must end with .mp3")
 
-    @patch('tts.gTTS')
+    @patch('backends.gTTS')
     def test_convert_text_to_speech_invalid_language(self, mock_gtts_class):
-        # Simulate gTTS raising a ValueError for an invalid language
-        mock_gtts_class.side_effect = ValueError("Language not supported: xx")
-        
         text = "This will fail"
         output_filepath = os.path.join(TEST_OUTPUT_DIR, "error_audio.mp3")
         
@@ -67,16 +107,29 @@ class TestTextToSpeech(unittest.TestCase):
         
         self.assertFalse(success)
         self.assertEqual(message, "ValueError (likely unsupported language): Language not supported: xx")
-        mock_gtts_class.assert_called_once_with(text=text, lang='xx', slow=False)
+        # The backend's language list is checked before anything is synthesized.
+        mock_gtts_class.assert_not_called()
+        self.assertFalse(os.path.exists(output_filepath))
 
-    @patch('tts.gTTS')
-    def test_convert_text_to_speech_gtts_error(self, mock_gtts_class):
-        # Import gTTSError from tts module for this test
-        from tts import gTTSError as TTS_gTTSError 
+    @patch('backends.gTTS')
+    def test_convert_text_to_speech_gtts_value_error(self, mock_gtts_class):
+        # Simulate gTTS raising a ValueError the language check did not anticipate
+        mock_gtts_class.side_effect = ValueError("Language not supported: en")
+        
+        text = "This will fail"
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "error_audio.mp3")
+        
+        success, message = convert_text_to_speech(text, output_filepath, lang='en')
+        
+        self.assertFalse(success)
+        self.assertEqual(message, "ValueError (likely unsupported language): Language not supported: en")
+        mock_gtts_class.assert_called_once_with(text=text, lang='en', slow=False)
 
-        # Configure the mock to raise gTTSError on save
+    @patch('backends.gTTS')
+    def test_convert_text_to_speech_gtts_error(self, mock_gtts_class):
+        # Configure the mock to raise gTTSError while synthesizing
         mock_gtts_instance = MagicMock()
-        mock_gtts_instance.save.side_effect = TTS_gTTSError("Failed to connect or other API error")
+        mock_gtts_instance._prepare_requests.side_effect = gTTSError("Failed to connect or other API error")
         mock_gtts_class.return_value = mock_gtts_instance
         
         text = "Another test"
@@ -87,16 +140,16 @@ class TestTextToSpeech(unittest.TestCase):
         self.assertFalse(success)
         self.assertEqual(message, "gTTS Error: Failed to connect or other API error")
         mock_gtts_class.assert_called_once_with(text=text, lang='en', slow=False)
-        mock_gtts_instance.save.assert_called_once_with(output_filepath)
+        mock_gtts_instance._prepare_requests.assert_called_once_with()
 
     # Test for unexpected error (e.g., permission denied to write file, if not mocking .save())
     # This is harder to test reliably with mocks for .save() unless the mock itself raises an OSError.
     # For now, we assume that if .save() was not mocked and failed with OSError,
     # the `except Exception as e:` in tts.py would catch it.
-    @patch('tts.gTTS')
+    @patch('backends.gTTS')
     def test_convert_text_to_speech_unexpected_error_on_save(self, mock_gtts_class):
         mock_gtts_instance = MagicMock()
-        mock_gtts_instance.save.side_effect = OSError("Simulated permission denied")
+        mock_gtts_instance._prepare_requests.side_effect = OSError("Simulated permission denied")
         mock_gtts_class.return_value = mock_gtts_instance
 
         text = "Text for unexpected error test"
@@ -107,6 +160,601 @@ class TestTextToSpeech(unittest.TestCase):
         self.assertFalse(success)
         self.assertEqual(message, "An unexpected error occurred: Simulated permission denied")
 
+    def test_convert_text_to_speech_whitespace_only_text(self):
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "error_audio.mp3")
+        success, message = convert_text_to_speech("  \n\n ", output_filepath)
+        self.assertFalse(success)
+        self.assertEqual(message, "Error: Input text cannot be empty.")
+        self.assertFalse(os.path.exists(output_filepath))
+
+    def test_convert_text_to_speech_writes_chunks_in_order(self):
+        # Earlier chunks finish last, so out-of-order completion must not reorder the output.
+        paragraphs = [f"Paragraph {i}." for i in range(12)]
+
+        def synthesize(chunk, lang):
+            time.sleep(0.002 * (12 - int(chunk.split()[1].rstrip('.'))))
+            return f"[{lang}:{chunk}]".encode('utf-8')
+
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "test_audio.mp3")
+        success, _ = convert_text_to_speech("\n\n".join(paragraphs), output_filepath,
+                                            lang='fr', workers=4, backend=FunctionBackend(synthesize))
+
+        self.assertTrue(success)
+        with open(output_filepath, 'rb') as f:
+            self.assertEqual(spoken(f.read()), "".join(f"[fr:{p}]" for p in paragraphs).encode('utf-8'))
+
+    def test_convert_text_to_speech_accepts_document(self):
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "test_audio.mp3")
+        document = Document.from_chapters(["One.", "Two."])
+        backend = FunctionBackend(lambda chunk, lang: chunk.encode('utf-8'))
+        success, _ = convert_text_to_speech(document, output_filepath, backend=backend)
+        self.assertTrue(success)
+        with open(output_filepath, 'rb') as f:
+            self.assertEqual(spoken(f.read()), b"One.Two.")
+
+    def test_convert_text_to_speech_respects_backend_capabilities(self):
+        chunks = []
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def synthesize(chunk, lang):
+            nonlocal in_flight, peak
+            with lock:
+                chunks.append(chunk)
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.001)
+            with lock:
+                in_flight -= 1
+            return b''
+
+        text = "\n".join(f"Sentence {i} of this paragraph. Another sentence follows it." for i in range(40))
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "test_audio.mp3")
+        backend = FunctionBackend(synthesize, max_chunk_chars=40, max_concurrency=2)
+        success, _ = convert_text_to_speech(text, output_filepath, workers=16, backend=backend)
+
+        self.assertTrue(success)
+        self.assertEqual(len(chunks), 80)
+        self.assertTrue(all(len(chunk) <= 40 for chunk in chunks))
+        self.assertLessEqual(peak, 2)
+
+    def test_convert_text_to_speech_with_stub_backend(self):
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "test_audio.mp3")
+        success, _ = convert_text_to_speech("A short paragraph.\nAnother one.", output_filepath, backend=StubBackend())
+        self.assertTrue(success)
+        with open(output_filepath, 'rb') as f:
+            data = f.read()
+        # One Info header for the whole file, then the stub's 45 + 30 silent frames
+        self.assertEqual(data[13:17], b'Info')
+        self.assertEqual(int.from_bytes(data[21:25], 'big'), 75)
+        self.assertEqual(int.from_bytes(data[25:29], 'big'), len(data))
+        self.assertEqual(audio_frames(data).data, SILENT_MP3_FRAME * 75)
+
+    def test_interrupted_conversion_resumes_from_missing_chunks(self):
+        calls = []
+        fail = True
+
+        def synthesize(chunk, lang):
+            calls.append(chunk)
+            if fail and chunk == "Paragraph 6.":
+                raise RuntimeError("connection lost")
+            return chunk.encode('utf-8')
+
+        text = "\n".join(f"Paragraph {i}." for i in range(10))
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "error_audio.mp3")
+        backend = FunctionBackend(synthesize)
+        success, message = convert_text_to_speech(text, output_filepath, workers=1, backend=backend)
+        self.assertFalse(success)
+        self.assertIn("connection lost", message)
+        self.assertFalse(os.path.exists(output_filepath))
+        self.assertTrue(os.path.isdir(output_filepath + '.parts'))
+
+        calls.clear()
+        fail = False
+        success, _ = convert_text_to_speech(text, output_filepath, workers=1, backend=backend, resume=True)
+        self.assertTrue(success)
+        self.assertEqual(calls, [f"Paragraph {i}." for i in range(6, 10)])
+        with open(output_filepath, 'rb') as f:
+            self.assertEqual(spoken(f.read()), "".join(f"Paragraph {i}." for i in range(10)).encode('utf-8'))
+        self.assertFalse(os.path.exists(output_filepath + '.parts'))
+
+        # Without resume, a conversion starts over
+        calls.clear()
+        success, _ = convert_text_to_speech(text, output_filepath, workers=1, backend=backend)
+        self.assertEqual(len(calls), 10)
+
+    def test_progress_is_reported_after_each_chunk(self):
+        fail = True
+
+        def synthesize(chunk, lang):
+            if fail and chunk == "Paragraph 3.":
+                raise RuntimeError("connection lost")
+            return chunk.encode('utf-8')
+
+        text = "\n".join(f"Paragraph {i}." for i in range(5))
+        output_filepath = os.path.join(TEST_OUTPUT_DIR, "error_audio.mp3")
+        backend = FunctionBackend(synthesize)
+        convert_text_to_speech(text, output_filepath, workers=1, backend=backend)
+
+        fail = False
+        reports = []
+        success, _ = convert_text_to_speech(text, output_filepath, workers=3, backend=backend, resume=True,
+                                            on_progress=reports.append)
+        self.assertTrue(success)
+        # The three chunks kept from the first run are reported first
+        self.assertEqual([(report.chunks_done, report.chunks_total) for report in reports],
+                         [(3, 5), (4, 5), (5, 5)])
+        written = [report.bytes_written for report in reports]
+        self.assertEqual(written, sorted(written))
+        self.assertEqual(reports[-1].bytes_written, os.path.getsize(output_filepath))
+
+
+class TestSynthesisChunks(unittest.TestCase):
+
+    def test_split_keeps_paragraphs_separate(self):
+        text = "  First paragraph.  \n\nSecond one.\nThird."
+        self.assertEqual(list(split_text_into_chunks(text)), ["First paragraph.", "Second one.", "Third."])
+
+    def test_split_long_paragraph_on_sentences(self):
+        sentences = [f"Sentence number {i} is here." for i in range(20)]
+        chunks = list(split_text_into_chunks(" ".join(sentences), max_chars=80))
+        self.assertTrue(all(len(chunk) <= 80 for chunk in chunks))
+        self.assertEqual(" ".join(chunks), " ".join(sentences))
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith("here."))
+
+    def test_split_long_sentence_on_words(self):
+        words = ["word"] * 50 + ["x" * 25]
+        chunks = list(split_text_into_chunks(" ".join(words), max_chars=20))
+        self.assertTrue(all(len(chunk) <= 20 for chunk in chunks))
+        self.assertEqual("".join(chunks).replace(" ", ""), "".join(words))
+
+    def test_count_chunks_matches_the_split(self):
+        sentences = ["This is sentence number %d here." % i for i in range(10)]
+        document = Document.from_chapters([" ".join(sentences), "Short.", " ".join(["word"] * 50 + ["x" * 25])])
+        for max_chars in (20, 80, 5000):
+            with self.subTest(max_chars=max_chars):
+                self.assertEqual(count_chunks(document, max_chars),
+                                 len(list(split_text_into_chunks(document, max_chars))))
+
+    def test_synthesize_chunks_bounds_work_in_flight(self):
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def synthesize(chunk, lang):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.001)
+            with lock:
+                in_flight -= 1
+            return chunk.encode('utf-8')
+
+        class Output:
+            data = b''
+            def write(self, data):
+                self.data += data
+
+        output = Output()
+        written = synthesize_chunks((str(i) for i in range(50)), output, 'en', workers=3, synthesize=synthesize)
+        self.assertEqual(written, 50)
+        self.assertEqual(output.data, "".join(str(i) for i in range(50)).encode('utf-8'))
+        self.assertLessEqual(peak, 3)
+
+    def test_slow_chunk_holds_back_the_chunks_after_it(self):
+        release = threading.Event()
+        started = []
+
+        def synthesize(chunk, lang):
+            started.append(chunk)
+            if chunk == "0":
+                release.wait(5)
+            return chunk.encode('utf-8')
+
+        output = MagicMock()
+        thread = threading.Thread(target=synthesize_chunks,
+                                  args=((str(i) for i in range(100)), output, 'en'),
+                                  kwargs={'workers': 2, 'synthesize': synthesize})
+        thread.start()
+        time.sleep(0.1)
+        # The window of 2 * workers chunks is full, and nothing could be written
+        self.assertEqual(len(started), 4)
+        output.write.assert_not_called()
+        release.set()
+        thread.join(5)
+        self.assertEqual([c.args[0] for c in output.write.call_args_list],
+                         [str(i).encode('utf-8') for i in range(100)])
+
+    def test_synthesize_chunks_stops_on_error(self):
+        calls = []
+
+        def synthesize(chunk, lang):
+            calls.append(chunk)
+            if chunk == "3":
+                raise RuntimeError("boom")
+            return b''
+
+        output = MagicMock()
+        with self.assertRaises(RuntimeError):
+            synthesize_chunks((str(i) for i in range(1000)), output, 'en', workers=2, synthesize=synthesize)
+        self.assertLess(len(calls), 1000)
+
+
+class TestOrderedSegmentWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.output = MagicMock()
+        self.writer = OrderedSegmentWriter(self.output, window=3)
+
+    def written(self):
+        return [c.args[0] for c in self.output.write.call_args_list]
+
+    def test_segments_are_written_in_order_as_soon_as_possible(self):
+        self.writer.put(1, b'1')
+        self.writer.put(2, b'2')
+        self.assertEqual(self.written(), [])
+        self.writer.put(0, b'0')
+        self.assertEqual(self.written(), [b'0', b'1', b'2'])
+        self.writer.put(3, b'3')
+        self.assertEqual(self.written(), [b'0', b'1', b'2', b'3'])
+        self.assertEqual(self.writer.peak_buffered, 3)
+
+    def test_wait_for_room_blocks_beyond_the_window(self):
+        self.writer.wait_for_room(2)  # returns at once
+        waited = threading.Event()
+
+        def wait():
+            self.writer.wait_for_room(3)
+            waited.set()
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        self.writer.put(1, b'1')
+        self.assertFalse(waited.wait(0.05))
+        self.writer.put(0, b'0')
+        self.assertTrue(waited.wait(5))
+        thread.join()
+
+    def test_a_slow_write_does_not_hold_back_other_threads(self):
+        release = threading.Event()
+        writing = threading.Event()
+
+        def write(segment):
+            if segment == b'0':
+                writing.set()
+                self.assertTrue(release.wait(5))
+
+        self.output.write.side_effect = write
+        thread = threading.Thread(target=self.writer.put, args=(0, b'0'))
+        thread.start()
+        self.assertTrue(writing.wait(5))
+        # Segment 1 is ready while segment 0 is being written: it is left to the thread writing
+        self.writer.put(1, b'1')
+        self.assertEqual(self.written(), [b'0'])
+        release.set()
+        thread.join()
+        self.assertEqual(self.written(), [b'0', b'1'])
+        self.writer.wait_for(2)
+
+    def test_failure_wakes_the_producer(self):
+        thread = threading.Thread(target=lambda: (time.sleep(0.05), self.writer.fail(RuntimeError("boom"))))
+        thread.start()
+        with self.assertRaises(RuntimeError):
+            self.writer.wait_for(1)
+        thread.join()
+        with self.assertRaises(RuntimeError):
+            self.writer.wait_for_room(0)
+
+
+class TestAudioCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = AudioCache(os.path.join(self.test_dir, 'audio'))
+        self.output_filepath = os.path.join(self.test_dir, 'book.mp3')
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def synthesize(self, chunk, lang):
+        self.calls.append(chunk)
+        return f"<{chunk}>".encode('utf-8')
+
+    def convert(self, text):
+        success, message = convert_text_to_speech(text, self.output_filepath,
+                                                  backend=FunctionBackend(self.synthesize), cache=self.cache)
+        self.assertTrue(success, message)
+        with open(self.output_filepath, 'rb') as f:
+            return f.read()
+
+    def test_unchanged_book_makes_no_tts_calls(self):
+        text = "First paragraph.\nSecond paragraph.\nThird paragraph."
+        first = self.convert(text)
+        self.assertEqual(len(self.calls), 3)
+        self.calls.clear()
+        self.assertEqual(self.convert(text), first)
+        self.assertEqual(self.calls, [])
+
+    def test_edited_book_only_synthesizes_changed_paragraphs(self):
+        self.convert("First paragraph.\nSecond paragraph.\nThird paragraph.")
+        self.calls.clear()
+        audio = self.convert("First paragraph.\nSecond paragraph, fixed.\nThird paragraph.")
+        self.assertEqual(self.calls, ["Second paragraph, fixed."])
+        self.assertEqual(spoken(audio), b"<First paragraph.><Second paragraph, fixed.><Third paragraph.>")
+
+    def test_a_cache_that_cannot_be_written_is_a_miss(self):
+        # The cache directory is gone and a file is in its way, as on a disk that no longer takes writes
+        shutil.rmtree(self.cache.directory)
+        with open(self.cache.directory, 'wb'):
+            pass
+        with self.assertLogs('tts', level='WARNING'):
+            audio = self.convert("First paragraph.\nSecond paragraph.")
+        self.assertEqual(spoken(audio), b"<First paragraph.><Second paragraph.>")
+        self.assertEqual(self.calls, ["First paragraph.", "Second paragraph."])
+
+    def test_key_depends_on_text_lang_backend_and_voice(self):
+        key = AudioCache.key("Some  text.", 'en', 'gtts', {'slow': False})
+        self.assertEqual(key, AudioCache.key("Some text.", 'en', 'gtts', {'slow': False}))
+        self.assertNotEqual(key, AudioCache.key("Other text.", 'en', 'gtts', {'slow': False}))
+        self.assertNotEqual(key, AudioCache.key("Some text.", 'fr', 'gtts', {'slow': False}))
+        self.assertNotEqual(key, AudioCache.key("Some text.", 'en', 'stub', {'slow': False}))
+        self.assertNotEqual(key, AudioCache.key("Some text.", 'en', 'gtts', {'slow': True}))
+
+    @patch('backends.gTTS')
+    def test_gtts_segments_are_cached(self, mock_gtts_class):
+        mock_gtts_class.return_value._prepare_requests.return_value = []
+        for _ in range(2):
+            success, _ = convert_text_to_speech("Hello world", self.output_filepath, cache=self.cache)
+            self.assertTrue(success)
+        mock_gtts_class.assert_called_once_with(text="Hello world", lang='en', slow=False)
+        self.assertIsNotNone(self.cache.get(AudioCache.key("Hello world", 'en', 'gtts', {'slow': False})))
+
+    def test_segments_are_evicted_by_size(self):
+        cache = AudioCache(os.path.join(self.test_dir, 'small'), max_bytes=2000)
+        synthesize = cache.cached(lambda chunk, lang: b'x' * 600, 'stub')
+        for i in range(10):
+            synthesize(f"Paragraph {i}.", 'en')
+        sizes = [entry.stat().st_size for entry in os.scandir(cache.directory)]
+        self.assertLessEqual(sum(sizes), 2000)
+        self.assertEqual(synthesize("Paragraph 9.", 'en'), b'x' * 600)
+
+
+class TestConcurrencyController(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def controller(self, **kwargs):
+        kwargs.setdefault('clock', self.clock)
+        return ConcurrencyController(**kwargs)
+
+    def synthesize_taking(self, seconds):
+        def synthesize(chunk, lang):
+            self.now += seconds
+            return b''
+        return synthesize
+
+    def test_limit_grows_additively_while_in_use(self):
+        controller = self.controller(maximum=4, initial=1)
+        synthesize = self.synthesize_taking(1.0)
+        limits = []
+        for _ in range(8):
+            controller.run(synthesize, "x" * 100, 'en')
+            limits.append(controller.limit)
+        # One chunk at a time only uses the whole limit while it is 1
+        self.assertEqual(limits, [2] * 8)
+        self.assertEqual(controller.stats()['history'][0][1:], ('increase', 2))
+
+    def test_throttling_cuts_the_limit_multiplicatively_once_per_latency(self):
+        controller = self.controller(maximum=16, initial=8)
+        controller.run(self.synthesize_taking(2.0), "x" * 100, 'en')
+        controller.signal('throttled')
+        self.assertEqual(controller.limit, 4)
+        controller.signal('throttled')  # same congestion, reported by another chunk
+        self.assertEqual(controller.limit, 4)
+        self.now += 2.0
+        controller.signal('retry')
+        self.assertEqual(controller.limit, 2)
+        stats = controller.stats()
+        self.assertEqual((stats['throttled'], stats['retries'], stats['cuts']), (2, 1, 2))
+        self.assertEqual([event[1:] for event in stats['history']], [('throttled', 4), ('retry', 2)])
+
+    def test_latency_spike_cuts_the_limit(self):
+        controller = self.controller(maximum=8, initial=8, warmup=3)
+        for _ in range(5):
+            controller.run(self.synthesize_taking(1.0), "x" * 100, 'en')
+        # A long chunk is not a spike: latency is compared per 100 characters
+        controller.run(self.synthesize_taking(4.0), "x" * 400, 'en')
+        self.assertEqual(controller.limit, 8)
+        controller.run(self.synthesize_taking(10.0), "x" * 100, 'en')
+        self.assertEqual(controller.limit, 4)
+        self.assertEqual(controller.stats()['latency_spikes'], 1)
+
+    def test_failed_chunk_cuts_the_limit(self):
+        controller = self.controller(maximum=8, initial=4)
+
+        def synthesize(chunk, lang):
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            controller.run(synthesize, "x", 'en')
+        self.assertEqual(controller.limit, 2)
+        self.assertEqual(controller.stats()['errors'], 1)
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+    def test_limit_bounds_concurrent_syntheses(self):
+        controller = ConcurrencyController(maximum=8, initial=3, increase=0)
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def synthesize(chunk, lang):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.002)
+            with lock:
+                in_flight -= 1
+            return chunk.encode('utf-8')
+
+        output = MagicMock()
+        synthesize_chunks((str(i) for i in range(40)), output, 'en', synthesize=synthesize, workers=8,
+                          controller=controller)
+        self.assertEqual(peak, 3)
+        self.assertEqual(controller.stats()['completed'], 40)
+
+    def test_converges_below_the_capacity_of_a_throttling_backend(self):
+        backend = StubBackend(latency=0.004, capacity=3, throttle_delay=0.004)
+        controller = ConcurrencyController(maximum=16, initial=8)
+        text = "\n".join(f"Paragraph {i}." for i in range(200))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            success, _ = convert_text_to_speech(text, os.path.join(tmp_dir, "test_audio.mp3"), workers=16,
+                                                backend=backend, controller=controller)
+
+        self.assertTrue(success)
+        stats = controller.stats()
+        self.assertGreater(stats['throttled'], 0)
+        self.assertLessEqual(stats['limit'], 6)
+        self.assertEqual(stats['completed'], 200)
+        self.assertEqual(backend._listeners, [])
+
+
+class TestRequestHedging(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def straggler(self, slow_chunks, slow_seconds=2.0, fail_first=False):
+        """A synthesize function whose first attempt at each of slow_chunks is slow (or fails)."""
+        def synthesize(chunk, lang):
+            with self.lock:
+                attempt = self.attempts[chunk] = self.attempts.get(chunk, 0) + 1
+            if chunk in slow_chunks and attempt == 1:
+                if fail_first:
+                    time.sleep(0.05)
+                    raise RuntimeError("first attempt failed")
+                time.sleep(slow_seconds)
+                return b'late'
+            time.sleep(0.001)
+            return chunk.encode('utf-8')
+        return synthesize
+
+    def warm_up(self, synthesize, count=10):
+        for i in range(count):
+            self.assertEqual(synthesize(f"warm {i}", 'en'), f"warm {i}".encode('utf-8'))
+
+    def test_slow_chunk_is_hedged_and_the_hedge_wins(self):
+        hedging = RequestHedging(percentile=90, budget=0.5, min_samples=10)
+        synthesize = hedging.hedged(self.straggler({"slow"}), self.executor)
+        self.warm_up(synthesize)
+
+        started = time.perf_counter()
+        self.assertEqual(synthesize("slow", 'en'), b'slow')
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(self.attempts["slow"], 2)
+        self.assertEqual(hedging.stats(), {'requests': 11, 'fired': 1, 'won': 1, 'over_budget': 0,
+                                            'at_limit': 0})
+
+    def test_no_hedging_before_min_samples(self):
+        hedging = RequestHedging(budget=1.0, min_samples=10)
+        synthesize = hedging.hedged(self.straggler({"slow"}, slow_seconds=0.05), self.executor)
+        self.assertEqual(synthesize("slow", 'en'), b'late')
+        self.assertEqual(hedging.stats()['fired'], 0)
+
+    def test_budget_caps_hedges(self):
+        hedging = RequestHedging(percentile=50, budget=0.1, min_samples=10)
+        synthesize = hedging.hedged(self.straggler({"slow 1", "slow 2"}, slow_seconds=0.1), self.executor)
+        self.warm_up(synthesize)
+        synthesize("slow 1", 'en')  # 11 requests: budget for one hedge
+        synthesize("slow 2", 'en')  # 12 requests: still one
+        stats = hedging.stats()
+        self.assertEqual((stats['fired'], stats['over_budget']), (1, 1))
+        self.assertEqual(self.attempts["slow 2"], 1)
+
+    def test_hedges_are_counted_against_the_controller(self):
+        hedging = RequestHedging(percentile=50, budget=1.0, min_samples=10)
+        controller = ConcurrencyController(maximum=2, initial=1)
+        synthesize = hedging.hedged(self.straggler({"slow 1", "slow 2"}, slow_seconds=0.2), self.executor,
+                                    controller)
+        self.warm_up(lambda chunk, lang: controller.run(synthesize, chunk, lang))
+
+        # The request itself takes the one place under the limit: none frees up for a hedge before it ends
+        controller._limit = 1.0
+        self.assertEqual(controller.run(synthesize, "slow 1", 'en'), b'late')
+        self.assertEqual(self.attempts["slow 1"], 1)
+        self.assertEqual((hedging.stats()['fired'], hedging.stats()['at_limit']), (0, 1))
+
+        controller._limit = 2.0
+        self.assertEqual(controller.run(synthesize, "slow 2", 'en'), b'slow 2')
+        self.assertEqual(hedging.stats()['fired'], 1)
+        # The place the hedge took is given back, whichever request won
+        time.sleep(0.3)
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+    def test_failed_request_falls_back_to_the_hedge(self):
+        hedging = RequestHedging(percentile=50, budget=1.0, min_samples=10)
+        synthesize = hedging.hedged(self.straggler({"flaky"}, fail_first=True), self.executor)
+        self.warm_up(synthesize)
+        self.assertEqual(synthesize("flaky", 'en'), b'flaky')
+        self.assertEqual(hedging.stats()['won'], 1)
+
+    def test_error_is_raised_when_both_requests_fail(self):
+        hedging = RequestHedging(percentile=50, budget=1.0, min_samples=10)
+        broken = False
+
+        def synthesize(chunk, lang):
+            if broken:
+                time.sleep(0.05)
+                raise RuntimeError(chunk)
+            time.sleep(0.001)
+            return b''
+
+        hedged = hedging.hedged(synthesize, self.executor)
+        for i in range(10):
+            hedged(f"warm {i}", 'en')
+        broken = True
+        with self.assertRaisesRegex(RuntimeError, "doomed"):
+            hedged("doomed", 'en')
+        self.assertEqual(hedging.stats()['fired'], 1)
+
+    def test_convert_text_to_speech_with_hedging(self):
+        slow = {f"Paragraph {i}." for i in range(30, 200, 40)}
+        backend = FunctionBackend(self.straggler(slow, slow_seconds=3.0))
+        hedging = RequestHedging(percentile=90, budget=0.1, min_samples=20)
+        paragraphs = [f"Paragraph {i}." for i in range(200)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_filepath = os.path.join(tmp_dir, "hedged.mp3")
+            started = time.perf_counter()
+            # Started at its maximum, so that a place frees up for a hedge even with two stragglers in flight
+            controller = ConcurrencyController(maximum=4, initial=4)
+            success, _ = convert_text_to_speech("\n".join(paragraphs), output_filepath, workers=4,
+                                                backend=backend, hedging=hedging, controller=controller)
+            elapsed = time.perf_counter() - started
+            with open(output_filepath, 'rb') as f:
+                audio = f.read()
+
+        self.assertTrue(success)
+        self.assertEqual(spoken(audio), "".join(paragraphs).encode('utf-8'))
+        self.assertLess(elapsed, 3.0)
+        # Every straggler was rescued by its hedge (ordinary chunks past the percentile may be hedged too)
+        self.assertGreaterEqual(hedging.stats()['won'], len(slow))
+        self.assertLessEqual(hedging.stats()['fired'], 20)
+
 
 if __name__ == '__main__':
     unittest.main()
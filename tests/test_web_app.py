@@ -1,10 +1,34 @@
+import json
 import pytest
 import os
+import shutil
+import tempfile
+import threading
 from io import BytesIO
 # Add the parent directory to sys.path to allow imports from web_app
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from web_app import app as flask_app
+from web_app import app as flask_app, get_job_queue
+import web_app
+from jobs import Job, JobQueue, JobStore
+from parser import extract_text_from_fb2
+from checkpoint import parts_dir_for
+from tts import convert_text_to_speech
+from storage import StorageManager
+from backends import StubBackend
+from mp3 import parse_frame_header, silent_frame
+
+JOB_DATABASE = os.path.join(tempfile.mkdtemp(), 'jobs.sqlite3')
+
+
+@pytest.fixture(scope='module', autouse=True)
+def job_database():
+    """Removes the job database once the tests are done, with the queue that uses it."""
+    yield
+    if web_app._job_queue is not None:
+        web_app._job_queue.shutdown()
+        web_app._job_queue = None
+    shutil.rmtree(os.path.dirname(JOB_DATABASE), ignore_errors=True)
 
 @pytest.fixture
 def client():
@@ -13,6 +37,11 @@ def client():
     # This is important if your app writes files during tests, though these specific tests might not.
     flask_app.config['UPLOAD_FOLDER'] = 'test_uploads'
     flask_app.config['GENERATED_AUDIO_FOLDER'] = 'test_generated_audio'
+    # Fresh caches for every test, so no test is served what an earlier run cached
+    cache_dir = tempfile.mkdtemp()
+    flask_app.config['EXTRACTION_CACHE_DIR'] = os.path.join(cache_dir, 'extraction')
+    flask_app.config['AUDIO_CACHE_DIR'] = os.path.join(cache_dir, 'audio')
+    flask_app.config['JOB_DATABASE'] = JOB_DATABASE
     
     # Create test directories if they don't exist
     if not os.path.exists(flask_app.config['UPLOAD_FOLDER']):
@@ -22,13 +51,31 @@ def client():
 
     with flask_app.test_client() as client:
         yield client
-    
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
     # Clean up test directories after tests (optional, depending on needs)
-    # import shutil
     # shutil.rmtree(flask_app.config['UPLOAD_FOLDER'], ignore_errors=True)
     # shutil.rmtree(flask_app.config['GENERATED_AUDIO_FOLDER'], ignore_errors=True)
 
 
+def upload_and_wait(client, data, timeout=10):
+    """Uploads a file, waits for its conversion job and returns the job and the result page."""
+    response = client.post('/upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 302
+    job = get_job_queue().get(response.headers['Location'].rsplit('job_id=', 1)[-1])
+    assert job.wait(timeout)
+    return job, client.get(response.headers['Location'])
+
+
+def job_output(job_id):
+    return get_job_queue().get(job_id).output
+
+
+def download_url(job_id, filename):
+    """Returns the URL a job's audiobook is downloaded from, as `filename`."""
+    return f'/download/{web_app.audio_id_of(get_job_queue().get(job_id))}/{filename}'
+
+
 def test_index_page_loads(client):
     """Test that the index page loads correctly."""
     response = client.get('/')
@@ -47,3 +94,446 @@ def test_upload_unsupported_file_type(client):
     assert b"Error" in response.data # General error heading
     assert b"Unsupported file type: &#39;.txt&#39;." in response.data # Updated for HTML escaping
     assert b"Upload another file" in response.data
+
+def test_upload_corrupted_epub_shows_parser_error(client):
+    """Test that an extraction error is reported on the result page."""
+    data = {
+        'file': (BytesIO(b"this is not a zip archive"), 'broken.epub')
+    }
+    _, response = upload_and_wait(client, data)
+
+    assert response.status_code == 200
+    assert b"Error: Invalid or corrupted EPUB file." in response.data
+
+def test_upload_fb2_without_text(client):
+    """Test that a book without text is reported instead of being converted."""
+    fb2 = (b'<?xml version="1.0" encoding="utf-8"?>'
+           b'<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body><section/></body></FictionBook>')
+    data = {
+        'file': (BytesIO(fb2), 'empty.fb2')
+    }
+    _, response = upload_and_wait(client, data)
+
+    assert response.status_code == 200
+    assert b"No text content found in the uploaded file." in response.data
+
+def test_upload_fb2_with_stub_tts_backend(client, monkeypatch):
+    """Test a full conversion offline, with the stub text-to-speech backend."""
+    monkeypatch.setitem(flask_app.config, 'TTS_BACKEND', 'stub')
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    fb2 = (b'<?xml version="1.0" encoding="utf-8"?>'
+           b'<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body><section>'
+           b'<p>A paragraph read by the stub backend.</p></section></body></FictionBook>')
+    data = {
+        'file': (BytesIO(fb2), 'stub_story.fb2')
+    }
+    job, response = upload_and_wait(client, data)
+
+    assert response.status_code == 200
+    assert b"Audiobook generated successfully!" in response.data
+    assert f'href="{download_url(job.id, "stub_story.mp3")}"'.encode() in response.data
+    output_filepath = job_output(job.id)
+    with open(output_filepath, 'rb') as f:
+        assert f.read(2) == b'\xff\xf3'
+    os.remove(output_filepath)
+
+
+class FailingStubBackend(StubBackend):
+    """A stub backend, one request at a time, that fails on the chunks containing `word`."""
+
+    def __init__(self, word):
+        super().__init__(max_concurrency=1)
+        self.word = word
+
+    def synthesize(self, chunk, lang):
+        if self.word in chunk:
+            raise RuntimeError("The engine went away")
+        return super().synthesize(chunk, lang)
+
+
+class CountingStubBackend(StubBackend):
+    """A stub backend that keeps the chunks it synthesizes."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def synthesize(self, chunk, lang):
+        self.chunks.append(chunk)
+        return super().synthesize(chunk, lang)
+
+
+def test_upload_resumes_interrupted_conversions(client, monkeypatch):
+    """Test that a book uploaded again after its conversion was interrupted continues that conversion."""
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    fb2 = (b'<?xml version="1.0" encoding="utf-8"?>'
+           b'<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body><section>'
+           b'<p>The first paragraph.</p><p>The second paragraph.</p><p>The third paragraph.</p>'
+           b'</section></body></FictionBook>')
+    # A conversion of the book that stopped after its first chunk, as if its worker had been killed
+    book_path = os.path.join(tempfile.mkdtemp(), 'resumed_story.fb2')
+    with open(book_path, 'wb') as f:
+        f.write(fb2)
+    key = web_app.conversion_key(book_path, 'fb2', 'en', StubBackend())
+    output_filepath = os.path.join(flask_app.config['GENERATED_AUDIO_FOLDER'], f'{key}.mp3')
+    success, _ = convert_text_to_speech(extract_text_from_fb2(book_path), output_filepath, resume=True,
+                                        backend=FailingStubBackend('second'))
+    assert not success
+
+    backend = CountingStubBackend()
+    monkeypatch.setattr('web_app.create_backend', lambda name, **options: backend)
+    job, response = upload_and_wait(client, {'file': (BytesIO(fb2), 'resumed_story.fb2')})
+
+    assert b"Audiobook generated successfully!" in response.data
+    assert job.output == output_filepath
+    assert backend.chunks == ["The second paragraph.", "The third paragraph."]
+    with open(output_filepath, 'rb') as f:
+        resumed = f.read()
+    os.remove(output_filepath)
+    assert convert_text_to_speech(extract_text_from_fb2(book_path), output_filepath, backend=StubBackend())[0]
+    with open(output_filepath, 'rb') as f:
+        assert f.read() == resumed
+    os.remove(output_filepath)
+    shutil.rmtree(os.path.dirname(book_path))
+
+
+def stub_fb2_upload(name, text=b'A paragraph converted in the background.'):
+    fb2 = (b'<?xml version="1.0" encoding="utf-8"?>'
+           b'<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body><section>'
+           b'<p>' + text + b'</p></section></body></FictionBook>')
+    return {'file': (BytesIO(fb2), name)}
+
+
+def test_upload_returns_a_job_before_the_conversion_is_done(client, monkeypatch):
+    """Test that an upload is answered at once, with a job whose status can be polled."""
+    release = threading.Event()
+
+    def convert(text, output_filepath, **options):
+        assert release.wait(10)
+        with open(output_filepath, 'wb') as f:
+            f.write(b'audio')
+        return True, "Success"
+
+    monkeypatch.setattr('web_app.convert_text_to_speech', convert)
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    response = client.post('/upload', data=stub_fb2_upload('queued_story.fb2'), content_type='multipart/form-data',
+                           headers={'Accept': 'application/json'})
+
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert response.headers['Location'].endswith(f'/jobs/{job_id}')
+    assert client.get(f'/jobs/{job_id}').get_json()['state'] in ('queued', 'running')
+    assert b"Converting queued_story.fb2" in client.get(f'/result?job_id={job_id}').data
+
+    release.set()
+    assert get_job_queue().get(job_id).wait(10)
+    status = client.get(f'/jobs/{job_id}').get_json()
+    assert status['state'] == 'done'
+    assert status['download_url'] == download_url(job_id, 'queued_story.mp3')
+    os.remove(job_output(job_id))
+
+
+def test_failed_job_reports_its_error(client, monkeypatch):
+    """Test that the status of a failed job carries the error message."""
+    monkeypatch.setattr('web_app.convert_text_to_speech', lambda text, output_filepath, **options: (False, "Failed"))
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    response = client.post('/upload', data=stub_fb2_upload('failed_story.fb2'), content_type='multipart/form-data',
+                           headers={'Accept': 'application/json'})
+    job_id = response.get_json()['id']
+    assert get_job_queue().get(job_id).wait(10)
+
+    status = client.get(f'/jobs/{job_id}').get_json()
+    assert status['state'] == 'failed'
+    assert status['message'].startswith("Error during text-to-speech conversion.")
+    assert 'download_url' not in status
+
+
+def test_failed_conversions_leave_no_parts(client, monkeypatch):
+    """Test that the parts directory of a conversion that failed is deleted with it."""
+    monkeypatch.setattr('web_app.create_backend', lambda name, **options: FailingStubBackend('second'))
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    data = stub_fb2_upload('broken_story.fb2', b'The first sentence.</p><p>The second sentence.')
+    job, response = upload_and_wait(client, data)
+
+    assert job.state == 'failed'
+    assert not os.path.exists(parts_dir_for(job.output))
+    assert not os.path.exists(job.output)
+
+
+def test_unknown_job(client):
+    """Test that an unknown job id is reported as not found."""
+    assert client.get('/jobs/0123456789abcdef').status_code == 404
+    assert b"Unknown conversion job." in client.get('/result?job_id=0123456789abcdef').data
+
+
+def test_uploads_are_refused_when_the_queue_is_full(client, monkeypatch):
+    """Test that uploads beyond the queue limit are turned away instead of waiting."""
+    full_queue = JobQueue(workers=1, max_pending=0)
+    monkeypatch.setattr(web_app, '_job_queue', full_queue)
+    response = client.post('/upload', data=stub_fb2_upload('busy_story.fb2'), content_type='multipart/form-data',
+                           headers={'Accept': 'application/json'})
+    full_queue.shutdown()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '60'
+    assert "The server is busy" in response.get_json()['error']
+
+
+def read_events(response):
+    """Parses a Server-Sent Events stream into (id, event, data) tuples."""
+    events = []
+    for block in b''.join(response.response).decode('utf-8').split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_progress_is_streamed_as_server_sent_events(client, monkeypatch):
+    """Test that watchers of a job get its progress and its result as events."""
+    release = threading.Event()
+    convert_text_to_speech = web_app.convert_text_to_speech
+
+    def convert(text, output_filepath, **options):
+        assert release.wait(10)
+        return convert_text_to_speech(text, output_filepath, **options)
+
+    monkeypatch.setattr('web_app.convert_text_to_speech', convert)
+    monkeypatch.setitem(flask_app.config, 'TTS_BACKEND', 'stub')
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    paragraphs = b''.join(b'<p>' + b'A sentence of the streamed story. ' * 10 + b'</p>' for _ in range(3))
+    fb2 = (b'<?xml version="1.0" encoding="utf-8"?>'
+           b'<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body><section>'
+           + paragraphs + b'</section></body></FictionBook>')
+    response = client.post('/upload', data={'file': (BytesIO(fb2), 'streamed_story.fb2')},
+                           content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    job_id = response.get_json()['id']
+
+    stream = client.get(f'/jobs/{job_id}/events')
+    assert stream.mimetype == 'text/event-stream'
+    release.set()
+    events = read_events(stream)
+
+    assert events[0][1] == 'state'
+    assert events[0][2]['state'] in ('queued', 'running')
+    progress = [data for _, name, data in events if name == 'progress']
+    assert [(data['chunks_done'], data['chunks_total']) for data in progress] == [(0, 3), (1, 3), (2, 3), (3, 3)]
+    assert progress[-1]['eta'] == 0
+    output_filepath = job_output(job_id)
+    assert progress[-1]['bytes_written'] == os.path.getsize(output_filepath)
+    assert events[-1][1:] == ('state', client.get(f'/jobs/{job_id}').get_json())
+    assert events[-1][2]['download_url'] == download_url(job_id, 'streamed_story.mp3')
+
+    # A watcher that reconnects gets the events after the last one it saw
+    replayed = read_events(client.get(f'/jobs/{job_id}/events', headers={'Last-Event-ID': '1'}))
+    assert [name for _, name, _ in replayed] == ['extracted'] + ['progress'] * 4 + ['state']
+    assert replayed[0][2]['chapters'] == 1
+    assert replayed[-1] == events[-1]
+    os.remove(output_filepath)
+
+
+def test_events_of_unknown_job(client):
+    """Test that the event stream of an unknown job is not found."""
+    assert client.get('/jobs/0123456789abcdef/events').status_code == 404
+
+
+class GatedStubBackend(StubBackend):
+    """A stub backend that holds back every chunk after the first until `release` is set."""
+
+    def __init__(self, release):
+        super().__init__()
+        self.release = release
+        self.first = threading.Lock()
+
+    def synthesize(self, chunk, lang):
+        if not self.first.acquire(blocking=False):
+            assert self.release.wait(10)
+        return super().synthesize(chunk, lang)
+
+
+def test_audio_is_streamed_while_it_is_generated(client, monkeypatch):
+    """Test that the audio written so far is served, with ranges, and the rest follows as it is written."""
+    release = threading.Event()
+    monkeypatch.setattr('web_app.create_backend', lambda name, **options: GatedStubBackend(release))
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    paragraphs = b''.join(b'<p>' + b'A sentence of the streamed story. ' * 10 + b'</p>' for _ in range(3))
+    fb2 = (b'<?xml version="1.0" encoding="utf-8"?>'
+           b'<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0"><body><section>'
+           + paragraphs + b'</section></body></FictionBook>')
+    response = client.post('/upload', data={'file': (BytesIO(fb2), 'growing_story.fb2')},
+                           content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    job = get_job_queue().get(response.get_json()['id'])
+    assert client.get(f'/jobs/{job.id}/audio', headers={'Range': 'bytes=0-99'}).status_code == 206
+    first_chunk = job.progress['bytes_written']
+    assert job.progress['chunks_done'] == 1
+
+    ranged = client.get(f'/jobs/{job.id}/audio', headers={'Range': 'bytes=10-'})
+    assert ranged.status_code == 206
+    assert ranged.headers['Content-Range'] == f'bytes 10-{first_chunk - 1}/*'
+    assert len(ranged.data) == first_chunk - 10
+
+    stream = client.get(f'/jobs/{job.id}/audio')
+    assert stream.status_code == 200
+    assert stream.headers['Accept-Ranges'] == 'bytes'
+    chunks = iter(stream.response)
+    received = next(chunks)
+    release.set()
+    received += b''.join(chunks)
+    stream.close()
+
+    assert job.wait(10)
+    output_filepath = job_output(job.id)
+    with open(output_filepath, 'rb') as f:
+        finished = f.read()
+    # The same bytes as the finished file, but for its header frame, which was silent while streaming
+    header_length = parse_frame_header(finished).length
+    assert len(received) == len(finished)
+    assert received[header_length:] == finished[header_length:]
+    assert received[:header_length] == silent_frame(finished[:4])
+    assert finished[13:17] == b'Info'
+
+    # Once finished, the file is served like a download
+    done = client.get(f'/jobs/{job.id}/audio', headers={'Range': 'bytes=0-3'})
+    assert done.status_code == 206
+    assert done.headers['Content-Range'] == f'bytes 0-3/{len(finished)}'
+    done.close()
+    os.remove(output_filepath)
+
+
+def test_audio_of_failed_and_unknown_jobs(client, monkeypatch):
+    """Test that there is no audio to stream for unknown and failed jobs."""
+    assert client.get('/jobs/0123456789abcdef/audio').status_code == 404
+    monkeypatch.setattr('web_app.convert_text_to_speech', lambda text, output_filepath, **options: (False, "Failed"))
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    response = client.post('/upload', data=stub_fb2_upload('failed_stream.fb2'), content_type='multipart/form-data',
+                           headers={'Accept': 'application/json'})
+    job = get_job_queue().get(response.get_json()['id'])
+    assert job.wait(10)
+    assert client.get(f'/jobs/{job.id}/audio').status_code == 410
+
+
+def test_downloads_are_conditional(client):
+    """Test that downloads carry an ETag and are not sent again to clients that have them."""
+    audio_id = Job('etag_story.fb2').id
+    output_filepath = os.path.join(flask_app.config['GENERATED_AUDIO_FOLDER'], f'{audio_id}.mp3')
+    with open(output_filepath, 'wb') as f:
+        f.write(b'audio' * 100)
+    response = client.get(f'/download/{audio_id}/etag_story.mp3')
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename=etag_story.mp3'
+    etag = response.headers['ETag']
+    response.close()
+    assert client.get(f'/download/{audio_id}/etag_story.mp3', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/download/0123456789abcdef/missing_story.mp3').status_code == 404
+    assert client.get('/download/..%2Fweb_app.py/etag_story.mp3').status_code == 404
+    os.remove(output_filepath)
+
+
+def test_uploads_are_deleted_and_audio_is_kept_under_the_quota(client, monkeypatch):
+    """Test that a converted upload is deleted and older audiobooks are evicted beyond the quota."""
+    storage = StorageManager(flask_app.config['GENERATED_AUDIO_FOLDER'], max_bytes=10 ** 9)
+    monkeypatch.setattr(web_app, '_audio_storage', storage)
+    monkeypatch.setitem(flask_app.config, 'TTS_BACKEND', 'stub')
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    old_filepath = os.path.join(flask_app.config['GENERATED_AUDIO_FOLDER'], 'old_story.mp3')
+    with open(old_filepath, 'wb') as f:
+        f.write(b'old audio')
+    storage.add(old_filepath)
+    storage.max_bytes = storage.total_bytes
+
+    job, response = upload_and_wait(client, stub_fb2_upload('quota_story.fb2'))
+
+    assert b"Audiobook generated successfully!" in response.data
+    assert not os.path.exists(os.path.join(flask_app.config['UPLOAD_FOLDER'], f'{job.id}.fb2'))
+    output_filepath = job_output(job.id)
+    assert output_filepath in storage
+    assert not os.path.exists(old_filepath)
+    storage.remove(output_filepath)
+
+
+def test_uploads_with_the_same_name_do_not_collide(client, monkeypatch):
+    """Test that different books uploaded under the same name are converted to separate files."""
+    monkeypatch.setitem(flask_app.config, 'TTS_BACKEND', 'stub')
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    first = client.post('/upload', data=stub_fb2_upload('twin_story.fb2', b'The first twin.'),
+                        content_type='multipart/form-data', headers={'Accept': 'application/json'}).get_json()
+    second = client.post('/upload', data=stub_fb2_upload('twin_story.fb2', b'The second twin.'),
+                         content_type='multipart/form-data', headers={'Accept': 'application/json'}).get_json()
+    assert first['id'] != second['id']
+    for status in (first, second):
+        assert get_job_queue().get(status['id']).wait(10)
+        url = client.get(f"/jobs/{status['id']}").get_json()['download_url']
+        assert url == download_url(status['id'], 'twin_story.mp3')
+        assert client.get(url).status_code == 200
+        os.remove(job_output(status['id']))
+
+
+def test_jobs_of_other_processes_are_served(client):
+    """Test that the status, events and audio of a job run by another worker process are served."""
+    release = threading.Event()
+
+    def convert(job):
+        job.report('progress', {'chunks_done': 0, 'chunks_total': 1, 'bytes_written': 0})
+        assert release.wait(10)
+        with open(job.output, 'wb') as f:
+            f.write(b'remote audio')
+        return 'remote_story.mp3'
+
+    other = JobQueue(workers=1, store=JobStore(JOB_DATABASE))
+    job = Job('remote_story.fb2')
+    job.output = os.path.join(flask_app.config['GENERATED_AUDIO_FOLDER'], f'{job.id}.mp3')
+    other.submit(job, convert)
+    assert job.events.wait(1, timeout=5)
+
+    assert client.get(f'/jobs/{job.id}').get_json()['state'] == 'running'
+    stream = client.get(f'/jobs/{job.id}/events')
+    release.set()
+    events = read_events(stream)
+    other.shutdown()
+
+    assert [name for _, name, _ in events] == ['state', 'state']
+    assert events[0][0] == job.events.wait(0, timeout=0)[1][0]
+    assert events[-1][2]['download_url'] == f'/download/{job.id}/remote_story.mp3'
+    assert client.get(events[-1][2]['download_url']).data == b'remote audio'
+    os.remove(job.output)
+
+
+def test_identical_uploads_follow_the_same_conversion(client, monkeypatch):
+    """Test that a book uploaded again while it is being converted joins that conversion."""
+    release = threading.Event()
+    calls = []
+    convert_text_to_speech = web_app.convert_text_to_speech
+
+    def convert(text, output_filepath, **options):
+        calls.append(output_filepath)
+        assert release.wait(10)
+        return convert_text_to_speech(text, output_filepath, **options)
+
+    monkeypatch.setattr('web_app.convert_text_to_speech', convert)
+    monkeypatch.setitem(flask_app.config, 'TTS_BACKEND', 'stub')
+    monkeypatch.setitem(flask_app.config, 'AUDIO_CACHE_DIR', None)
+    uploads = set(os.listdir(flask_app.config['UPLOAD_FOLDER']))
+    first = client.post('/upload', data=stub_fb2_upload('popular_story.fb2', b'A popular story.'),
+                        content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    second = client.post('/upload', data=stub_fb2_upload('same_story.fb2', b'A popular story.'),
+                         content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    job_id = first.get_json()['id']
+    # The second upload is deleted at once; the first one is being converted
+    assert set(os.listdir(flask_app.config['UPLOAD_FOLDER'])) - uploads == {f'{job_id}.fb2'}
+    other_voice = {**flask_app.config['TTS_BACKEND_OPTIONS'], 'seconds_per_char': 0.1}
+    monkeypatch.setitem(flask_app.config, 'TTS_BACKEND_OPTIONS', other_voice)
+    third = client.post('/upload', data=stub_fb2_upload('popular_story.fb2', b'A popular story.'),
+                        content_type='multipart/form-data', headers={'Accept': 'application/json'})
+
+    assert second.status_code == 202
+    assert second.get_json()['id'] == job_id
+    assert second.headers['Location'].endswith(f'/jobs/{job_id}')
+    # The same book in another voice is another conversion
+    assert third.get_json()['id'] != job_id
+
+    release.set()
+    for status in (first.get_json(), third.get_json()):
+        assert get_job_queue().get(status['id']).wait(10)
+        os.remove(job_output(status['id']))
+    assert len(calls) == 2
+    assert client.get(f'/jobs/{job_id}').get_json()['download_url'] == download_url(job_id, 'popular_story.mp3')
@@ -0,0 +1,228 @@
+"""
+HTTP transport for the text-to-speech backends.
+
+An HTTPTransport sends requests over one pooled requests.Session, so
+keep-alive connections are reused across every chunk of every job, and
+takes a token from a TokenBucket before each request, so all the jobs in the
+process share one request rate. Transient failures (connection errors,
+timeouts, 429 and 5xx responses) are retried with jittered exponential
+backoff; a 429 also pauses the bucket, so the other workers back off too.
+Listeners are told about every throttled or retried request, e.g. so the
+synthesis engine can lower its concurrency.
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying: throttling and temporary server errors.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+THROTTLED_STATUS = 429
+
+# Events passed to transport listeners.
+EVENT_THROTTLED = 'throttled'  # a 429 response, to be retried
+EVENT_RETRY = 'retry'  # any other transient failure, to be retried
+
+# Defaults of the transport shared by GTTSBackend instances.
+DEFAULT_REQUESTS_PER_SECOND = 8.0
+DEFAULT_BURST = 16
+DEFAULT_POOL_SIZE = 16
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+
+    acquire() reserves its tokens immediately and then sleeps until they are
+    due, so callers are served in the order they arrive and none of them
+    polls. pause() stops the refill for a while, e.g. after a 429.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float, optional): Largest burst. Defaults to max(1, rate).
+        clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+        sleep (callable, optional): Defaults to time.sleep.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()  # tokens are counted as of this time, which may be in the future
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self, tokens=1):
+        """Takes `tokens` tokens, sleeping until they are available. Returns the time slept."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= tokens
+            ready = self._updated + max(0.0, -self._tokens) / self.rate
+        wait = max(0.0, ready - now)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """
+        Hands out no tokens for the next `seconds` seconds.
+
+        Any saved-up burst is dropped: one token is due when the pause ends,
+        and the rest come at the normal rate.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens = min(self._tokens, 1.0)
+            self._updated = max(self._updated, now + seconds)
+
+
+class RetryPolicy:
+    """
+    How often and how long to wait before retrying a transient failure.
+
+    The delay before retry n (counting from 0) is drawn uniformly from
+    [0, min(max_delay, base_delay * 2**n)] ("full jitter"), so workers that
+    failed together do not retry together.
+
+    Args:
+        attempts (int, optional): Tries per request, the first included. Defaults to 6.
+        base_delay (float, optional): Seconds. Defaults to 0.5.
+        max_delay (float, optional): Seconds. Defaults to 30.
+    """
+
+    def __init__(self, attempts=6, base_delay=0.5, max_delay=30.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+def retry_after(response):
+    """Returns the delay a response's Retry-After header asks for, in seconds, or 0."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class HTTPTransport:
+    """
+    Sends prepared requests with connection reuse, rate limiting and retries.
+
+    Args:
+        rate_limiter (TokenBucket, optional): Taken from before every attempt;
+            None for no limit.
+        retry (RetryPolicy, optional): Defaults to RetryPolicy().
+        pool_size (int, optional): Connections kept per host. Defaults to DEFAULT_POOL_SIZE.
+        session (requests.Session, optional): Defaults to a new session.
+        sleep (callable, optional): Defaults to time.sleep.
+    """
+
+    def __init__(self, rate_limiter=None, retry=None, pool_size=DEFAULT_POOL_SIZE, session=None, sleep=time.sleep):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.retry = retry or RetryPolicy()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._listeners = []
+        # Counters, for monitoring
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def add_listener(self, listener):
+        """Calls listener(event) with EVENT_THROTTLED or EVENT_RETRY before each retry."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def _notify(self, event):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(event)
+
+    def send(self, request, **kwargs):
+        """
+        Sends a requests.PreparedRequest and returns the response.
+
+        Transient failures are retried up to the policy's number of attempts;
+        the last response is returned whatever its status, and the last
+        connection error or timeout is raised. Other keyword arguments go to
+        Session.send.
+        """
+        for attempt in range(self.retry.attempts):
+            last_attempt = attempt == self.retry.attempts - 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            self._count('requests')
+            try:
+                response = self.session.send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                delay = self.retry.delay(attempt)
+                self._notify(EVENT_RETRY)
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                delay = max(self.retry.delay(attempt), retry_after(response))
+                if response.status_code == THROTTLED_STATUS:
+                    self._count('throttled')
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.pause(delay)
+                    self._notify(EVENT_THROTTLED)
+                else:
+                    self._notify(EVENT_RETRY)
+                response.close()
+            self._count('retries')
+            self._sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+def shared_transport():
+    """Returns the process-wide transport used by GTTSBackend, creating it on first use."""
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = HTTPTransport(TokenBucket(DEFAULT_REQUESTS_PER_SECOND, DEFAULT_BURST))
+        return _shared_transport
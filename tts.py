@@ -1,46 +1,745 @@
 """
 Text-to-Speech (TTS) module for converting text to audio files.
 
-This module uses the gTTS (Google Text-to-Speech) library to convert
-a given text string into an MP3 audio file. It includes error handling
-for common TTS-related issues.
+This module converts a given text string into an MP3 audio file with a
+text-to-speech backend (see backends.py), Google Text-to-Speech by default.
+The text is split into chunks on paragraph and sentence boundaries, the
+chunks are synthesized concurrently, and the MP3 segments are streamed to the
+output in order through a bounded reorder buffer, by way of a checkpoint that
+lets an interrupted conversion resume. How many chunks are synthesized at
+once is adapted to the backend's latency and throttling by a
+ConcurrencyController, and slow requests can be hedged with a duplicate
+(RequestHedging). Synthesized chunks can be kept in an AudioCache, so
+converting a book again only synthesizes the paragraphs that changed.
+It includes error handling for common TTS-related issues.
 """
-from gtts import gTTS, gTTSError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from gtts import gTTSError
+import hashlib
+from itertools import islice
+import json
+import logging
 import os
+import re
+import threading
+import time
+from typing import NamedTuple
 
-def convert_text_to_speech(text: str, output_filepath: str, lang: str = 'en'):
+from backends import GTTSBackend
+from checkpoint import ConversionCheckpoint, conversion_fingerprint
+from transport import EVENT_THROTTLED
+from cache import DiskCache, user_cache_dir
+from document import Document
+
+# Upper bound on the length of a chunk; longer paragraphs are split between sentences.
+DEFAULT_CHUNK_CHARS = 500
+# Most chunks synthesized at the same time (capped by the backend's max_concurrency).
+DEFAULT_TTS_WORKERS = 8
+# Chunks synthesized at the same time when a conversion starts.
+DEFAULT_INITIAL_CONCURRENCY = 2
+# Default size budget of the audio cache.
+DEFAULT_AUDIO_CACHE_BYTES = 1024 * 1024 * 1024
+# Seconds between checks of whether a request waiting for a place under the concurrency limit is still needed.
+_RESERVE_POLL_SECONDS = 0.01
+
+# End of a sentence: terminal punctuation, closing quotes or brackets, then whitespace.
+_SENTENCE_END_RE = re.compile(r'[.!?\u2026]+["\'\u00bb\u201d\u2019)\]]*\s+')
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionProgress(NamedTuple):
+    """How far a conversion is; chunks_done includes the chunks kept from an interrupted run."""
+    chunks_done: int
+    chunks_total: int
+    bytes_written: int
+
+
+def convert_text_to_speech(text, output_filepath: str, lang: str = 'en',
+                           workers: int = DEFAULT_TTS_WORKERS, backend=None, cache=None, controller=None,
+                           hedging=None, resume=False, on_progress=None):
     """
     Converts a text string to speech and saves it as an MP3 file.
 
+    The text is split with split_text_into_chunks into chunks no longer than
+    the backend's max_chunk_chars, which are synthesized concurrently; their
+    MP3 segments are written to the output in the original order, so the
+    file plays as one recording. The number of chunks synthesized at once is
+    adjusted by a ConcurrencyController, between 1 and `workers`.
+
+    The conversion is checkpointed (see checkpoint.py): segments are
+    appended to a partial file in `<output_filepath>.parts` as soon as they
+    are in order, and the partial file is renamed to output_filepath once all
+    of them are done, so the output never holds a torn MP3. If the
+    conversion is interrupted, running it again with resume=True synthesizes
+    only the chunks that are missing.
+
     Args:
-        text (str): The text to convert to speech.
+        text (str or Document): The text to convert to speech.
         output_filepath (str): The path to save the output MP3 file.
         lang (str, optional): The language of the text. Defaults to 'en'.
+        workers (int, optional): Most chunks synthesized concurrently, at
+            most the backend's max_concurrency. Defaults to DEFAULT_TTS_WORKERS.
+        backend (TTSBackend, optional): The engine to use. Defaults to a GTTSBackend.
+        cache (AudioCache, optional): Reuse and keep the audio of each chunk.
+        controller (ConcurrencyController, optional): Adapts the concurrency;
+            pass one to watch its stats(). Defaults to a new controller
+            whose maximum is `workers`.
+        hedging (RequestHedging, optional): Send a duplicate request for
+            chunks that take unusually long. Defaults to no hedging.
+        resume (bool, optional): Keep the chunks saved by an interrupted run of
+            the same conversion. Defaults to False, which starts over.
+        on_progress (callable, optional): Called with a ConversionProgress
+            once synthesis starts and after each chunk is written.
 
     Returns:
         bool: True if conversion was successful and file was saved, False otherwise.
         str: A message indicating success or failure.
     """
-    if not text:
+    if not text or (isinstance(text, str) and text.isspace()):
         return False, "Error: Input text cannot be empty."
     if not output_filepath.lower().endswith('.mp3'):
         return False, "Error: Output filepath must end with .mp3"
+    # Built once; the fingerprint, the chunks and the progress total all read this one
+    document = text if isinstance(text, Document) else Document.from_text(text)
 
     try:
-        tts = gTTS(text=text, lang=lang, slow=False)
-        tts.save(output_filepath)
+        backend = backend or GTTSBackend()
+        # Unsupported languages are reported before anything is synthesized.
+        backend.check_language(lang)
+        capabilities = backend.capabilities
+        if controller is None:
+            controller = ConcurrencyController(min(workers, capabilities.max_concurrency))
+        synthesize = backend.synthesize
+        hedge_executor = None
+        if hedging is not None:
+            # Requests and their hedges run here, so a worker can move on as soon as either finishes
+            hedge_executor = ThreadPoolExecutor(max_workers=2 * controller.maximum)
+            synthesize = hedging.hedged(synthesize, hedge_executor, controller)
+        if cache is not None:
+            synthesize = cache.cached(synthesize, backend.name, backend.voice)
+        fingerprint = conversion_fingerprint(document, lang, backend.name, backend.voice,
+                                             capabilities.max_chunk_chars)
+        checkpoint = ConversionCheckpoint(output_filepath, fingerprint, resume=resume)
+        # Chunks are split the same way every time, so the first missing chunk is the one after those done
+        chunks = islice(split_text_into_chunks(document, capabilities.max_chunk_chars), checkpoint.completed, None)
+        output = checkpoint
+        if on_progress is not None:
+            total = count_chunks(document, capabilities.max_chunk_chars)
+            output = ProgressReporter(checkpoint, total, on_progress)
+        backend.add_listener(controller.signal)
+        try:
+            synthesize_chunks(chunks, output, lang,
+                              synthesize=synthesize, workers=controller.maximum, controller=controller)
+            checkpoint.commit()
+        finally:
+            checkpoint.close()
+            backend.remove_listener(controller.signal)
+            if hedge_executor is not None:
+                # Do not wait for the requests that lost their race
+                hedge_executor.shutdown(wait=False, cancel_futures=True)
         return True, f"Successfully converted text to speech and saved to {output_filepath}"
     except gTTSError as e:
         # This can catch issues like language not supported or network errors if gTTS hits API limits or has issues.
         # Example: gTTSError: Failed to connect. Detail: All gTTS TLDs are blocked.
         return False, f"gTTS Error: {e}"
     except ValueError as e:
-        # Catch ValueError specifically, as gTTS raises this for unsupported languages
-        # when lang_check is True (default).
+        # Catch ValueError specifically: backends raise it for unsupported languages.
         return False, f"ValueError (likely unsupported language): {e}"
     except Exception as e:
         return False, f"An unexpected error occurred: {e}"
 
+def default_audio_cache_dir():
+    """Returns the per-user audio cache directory ($XDG_CACHE_HOME/morthy/audio)."""
+    return user_cache_dir('audio')
+
+class AudioCache(DiskCache):
+    """
+    Synthesized MP3 segments keyed by chunk text, language, backend and voice settings.
+
+    Entries are stored uncompressed (MP3 data does not compress) and are
+    evicted least-recently-used once they take more than max_bytes.
+
+    Args:
+        directory (str): Where entries are stored; created if missing.
+        max_bytes (int, optional): Size budget for all entries together.
+            Defaults to DEFAULT_AUDIO_CACHE_BYTES.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_AUDIO_CACHE_BYTES):
+        super().__init__(directory, max_bytes, compress=False)
+
+    @staticmethod
+    def key(chunk, lang, backend, voice=None):
+        """
+        Returns the cache key of a chunk.
+
+        Runs of whitespace in the text are collapsed first, since they do
+        not change the speech.
+        """
+        identity = [" ".join(chunk.split()), lang, backend, voice or {}]
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def cached(self, synthesize, backend, voice=None):
+        """
+        Wraps synthesize(chunk, lang) so that chunks are read from the cache when present.
+
+        An entry that cannot be read or written (e.g. on a full disk) is a
+        miss: the error is logged and the chunk is synthesized all the same.
+
+        Args:
+            synthesize (callable): synthesize(chunk, lang) -> MP3 bytes.
+            backend (str): Names the engine behind `synthesize`.
+            voice (dict, optional): Settings that change the engine's output.
+        """
+        def cached_synthesize(chunk, lang):
+            key = self.key(chunk, lang, backend, voice)
+            try:
+                audio = self.get(key)
+            except OSError as e:
+                logger.warning("Could not read the audio cache in %s: %s", self.directory, e)
+                audio = None
+            if audio is None:
+                audio = synthesize(chunk, lang)
+                try:
+                    self.put(key, audio)
+                except OSError as e:
+                    logger.warning("Could not write to the audio cache in %s: %s", self.directory, e)
+            return audio
+        return cached_synthesize
+
+def synthesize_chunks(chunks, output_file, lang, synthesize, workers=DEFAULT_TTS_WORKERS, controller=None):
+    """
+    Synthesizes chunks on a thread pool and writes their audio to output_file in order.
+
+    Each segment is written as soon as the segments before it have been (see
+    OrderedSegmentWriter). At most 2 * workers chunks are queued, being
+    synthesized or waiting for an earlier one at once; further chunks are
+    only taken from `chunks`, which may be a lazy iterable, as earlier ones
+    are written. If a chunk fails, chunks that have not started are
+    cancelled and the error is raised. With a controller, the pool's threads
+    take turns through controller.run, so fewer than `workers` chunks may be
+    synthesized at once.
+
+    Args:
+        chunks (iterable of str): The text chunks, in order.
+        output_file: A binary file object the MP3 segments are written to.
+        lang (str): The language of the text.
+        synthesize (callable): synthesize(chunk, lang) -> MP3 bytes, e.g. a backend's synthesize.
+        workers (int, optional): Number of threads.
+        controller (ConcurrencyController, optional): Limits the concurrent syntheses.
+
+    Returns:
+        int: The number of chunks written.
+    """
+    workers = max(1, workers)
+    writer = OrderedSegmentWriter(output_file, window=2 * workers)
+
+    def synthesize_segment(index, chunk):
+        try:
+            if controller is None:
+                audio = synthesize(chunk, lang)
+            else:
+                audio = controller.run(synthesize, chunk, lang)
+            writer.put(index, audio)
+        except BaseException as e:
+            writer.fail(e)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    count = 0
+    try:
+        for index, chunk in enumerate(chunks):
+            writer.wait_for_room(index)
+            executor.submit(synthesize_segment, index, chunk)
+            count = index + 1
+        writer.wait_for(count)
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    return count
+
+class ProgressReporter:
+    """
+    Writes segments to a ConversionCheckpoint and reports a ConversionProgress after each one.
+
+    The first report, of the chunks kept from an interrupted run, is made
+    when the reporter is created.
+    """
+
+    def __init__(self, checkpoint, chunks_total, on_progress):
+        self.checkpoint = checkpoint
+        self.chunks_total = chunks_total
+        self.on_progress = on_progress
+        self._report()
+
+    def write(self, audio):
+        self.checkpoint.write(audio)
+        self._report()
+
+    def _report(self):
+        self.on_progress(ConversionProgress(self.checkpoint.completed, self.chunks_total, self.checkpoint.size))
+
+class OrderedSegmentWriter:
+    """
+    Writes segments that are produced out of order to a file, in order.
+
+    put() writes a segment as soon as every segment before it has been
+    written, together with the later ones that were waiting for it; until
+    then it is held in a reorder buffer. The writes happen outside the lock
+    (writing may be slow, e.g. when it reports progress to a database), so
+    threads that finish a segment meanwhile only buffer it and return: the
+    one thread writing takes the segments that become ready in turn, which
+    keeps them in order. The producer calls wait_for_room()
+    before starting a segment, which blocks while the segment would be
+    `window` or more places after the next one to write, so at most `window`
+    segments are in progress or buffered, and a slow segment holds back the
+    producer instead of filling memory.
+
+    Args:
+        output_file: A binary file object.
+        window (int): Most segments in progress or buffered at once.
+    """
+
+    def __init__(self, output_file, window):
+        self.output_file = output_file
+        self.window = max(1, window)
+        self.next_index = 0  # of the next segment to write
+        self.peak_buffered = 0  # most segments held in the reorder buffer at once
+        self._buffer = {}
+        self._error = None
+        self._writing = False  # a thread is writing segments
+        self._condition = threading.Condition()
+
+    def put(self, index, audio):
+        """Writes segment `index`, or buffers it until the earlier ones are written."""
+        with self._condition:
+            self._buffer[index] = audio
+            self.peak_buffered = max(self.peak_buffered, len(self._buffer))
+            if self._writing:
+                return
+            self._writing = True
+        try:
+            while True:
+                with self._condition:
+                    ready = []
+                    while self._error is None and self.next_index + len(ready) in self._buffer:
+                        ready.append(self._buffer.pop(self.next_index + len(ready)))
+                    if not ready:
+                        self._writing = False
+                        return
+                for segment in ready:
+                    self.output_file.write(segment)
+                with self._condition:
+                    self.next_index += len(ready)
+                    self._condition.notify_all()
+        except BaseException:
+            with self._condition:
+                self._writing = False
+            raise
+
+    def fail(self, error):
+        """Makes wait_for_room() raise `error`, e.g. when a segment could not be produced."""
+        with self._condition:
+            if self._error is None:
+                self._error = error
+            self._buffer.clear()
+            self._condition.notify_all()
+
+    def wait_for_room(self, index):
+        """
+        Blocks until segment `index` fits in the window.
+
+        Raises:
+            The error passed to fail(), if any.
+        """
+        self._wait(lambda: index < self.next_index + self.window)
+
+    def wait_for(self, count):
+        """
+        Blocks until the first `count` segments are written.
+
+        Raises:
+            The error passed to fail(), if any.
+        """
+        self._wait(lambda: self.next_index >= count)
+
+    def _wait(self, predicate):
+        with self._condition:
+            self._condition.wait_for(lambda: self._error is not None or predicate())
+            if self._error is not None:
+                raise self._error
+
+class ConcurrencyController:
+    """
+    Adapts the number of chunks synthesized at once, AIMD-style.
+
+    The limit starts at `initial`. Every chunk that completes while the limit
+    was in use and whose latency is healthy adds increase / limit, so the
+    limit grows by about `increase` per round of chunks. A throttled
+    or retried request (signal()), a failed chunk or a latency spike, i.e. a
+    latency per 100 characters more than spike_factor times its moving
+    average, multiplies the limit by `decrease`. After a cut, further signals
+    are ignored for one average chunk latency, since the chunks already in
+    flight report the same congestion.
+
+    The counters and the latest events are available from stats().
+
+    Args:
+        maximum (int): Highest limit.
+        initial (int, optional): Starting limit. Defaults to DEFAULT_INITIAL_CONCURRENCY.
+        minimum (int, optional): Lowest limit. Defaults to 1.
+        increase (float, optional): Additive step. Defaults to 1.
+        decrease (float, optional): Multiplicative factor. Defaults to 0.5.
+        spike_factor (float, optional): Defaults to 3.
+        smoothing (float, optional): Weight of a new sample in the latency averages. Defaults to 0.2.
+        warmup (int, optional): Samples before spikes are detected. Defaults to 5.
+        history_size (int, optional): Limit changes kept for stats(). Defaults to 100.
+        clock (callable, optional): Defaults to time.monotonic.
+    """
+
+    def __init__(self, maximum, initial=DEFAULT_INITIAL_CONCURRENCY, minimum=1, increase=1.0, decrease=0.5,
+                 spike_factor=3.0, smoothing=0.2, warmup=5, history_size=100, clock=time.monotonic):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.spike_factor = spike_factor
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._reserving = 0  # extra requests waiting for a place
+        self._started = clock()
+        self._last_cut = None
+        self._latency = None  # moving average of seconds per chunk
+        self._unit_latency = None  # moving average of seconds per 100 characters
+        self._samples = 0
+        self._history = deque(maxlen=history_size)
+        self.completed = 0
+        self.errors = 0
+        self.throttled = 0
+        self.retries = 0
+        self.latency_spikes = 0
+        self.cuts = 0
+
+    @property
+    def limit(self):
+        """The number of chunks that may be synthesized at once."""
+        return int(self._limit)
+
+    def run(self, synthesize, chunk, lang):
+        """Calls synthesize(chunk, lang) once the limit allows it, and learns from its latency."""
+        with self._condition:
+            while self._in_flight >= int(self._limit) or self._reserving:
+                self._condition.wait()
+            self._in_flight += 1
+        started = self._clock()
+        try:
+            audio = synthesize(chunk, lang)
+        except BaseException:
+            self._finish(started, chunk, failed=True)
+            raise
+        self._finish(started, chunk)
+        return audio
+
+    def reserve(self, abandoned):
+        """
+        Takes a place for an extra request, e.g. a hedge, waiting until the
+        limit has room for it or abandoned() is true; returns whether it took
+        one. Chunks waiting in run() are held back meanwhile, so the place goes
+        to the extra request first. The place is given back with release().
+        """
+        with self._condition:
+            self._reserving += 1
+            try:
+                while self._in_flight >= int(self._limit):
+                    if abandoned():
+                        return False
+                    self._condition.wait(_RESERVE_POLL_SECONDS)
+                self._in_flight += 1
+                return True
+            finally:
+                self._reserving -= 1
+                self._condition.notify_all()
+
+    def release(self):
+        """Gives back a place taken with reserve()."""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def signal(self, event):
+        """Backend listener: a request was throttled ('throttled') or failed and will be retried ('retry')."""
+        with self._condition:
+            if event == EVENT_THROTTLED:
+                self.throttled += 1
+            else:
+                self.retries += 1
+            self._cut(event)
+
+    def _finish(self, started, chunk, failed=False):
+        latency = self._clock() - started
+        with self._condition:
+            at_limit = self._in_flight >= int(self._limit)
+            self._in_flight -= 1
+            if failed:
+                self.errors += 1
+                self._cut('error')
+            else:
+                self.completed += 1
+                unit_latency = latency / max(1.0, len(chunk) / 100)
+                spike = (self._samples >= self.warmup
+                         and unit_latency > self.spike_factor * self._unit_latency)
+                self._latency = self._average(self._latency, latency)
+                self._unit_latency = self._average(self._unit_latency, unit_latency)
+                self._samples += 1
+                if spike:
+                    self.latency_spikes += 1
+                    self._cut('latency')
+                elif at_limit and self._limit < self.maximum:
+                    # Only grow when the limit is what holds the synthesis back
+                    before = int(self._limit)
+                    self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+                    if int(self._limit) != before:
+                        self._record('increase')
+            self._condition.notify_all()
+
+    def _average(self, average, sample):
+        return sample if average is None else average + self.smoothing * (sample - average)
+
+    def _cut(self, reason):
+        now = self._clock()
+        if self._last_cut is not None and now - self._last_cut < (self._latency or 0):
+            return
+        self._last_cut = now
+        self.cuts += 1
+        self._limit = max(float(self.minimum), self._limit * self.decrease)
+        self._record(reason)
+
+    def _record(self, reason):
+        self._history.append((round(self._clock() - self._started, 3), reason, int(self._limit)))
+
+    def stats(self):
+        """
+        Returns a snapshot of the controller's state, e.g. for monitoring.
+
+        'history' lists the latest limit changes as (seconds since start,
+        reason, new limit), the reason being 'increase', 'throttled',
+        'retry', 'error' or 'latency'.
+        """
+        with self._condition:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'latency': self._latency,
+                'latency_per_100_chars': self._unit_latency,
+                'completed': self.completed,
+                'errors': self.errors,
+                'throttled': self.throttled,
+                'retries': self.retries,
+                'latency_spikes': self.latency_spikes,
+                'cuts': self.cuts,
+                'history': list(self._history),
+            }
+
+class RequestHedging:
+    """
+    Sends a second request for chunks that take much longer than usual.
+
+    Once `min_samples` chunks have been synthesized, a chunk that is still
+    running after the `percentile`-th percentile of recent latencies (per
+    100 characters, scaled to the chunk's length) gets a duplicate request.
+    Whichever finishes first is used; the other is cancelled if it has not
+    started, and its result is discarded otherwise. Hedges are capped at
+    `budget` times the number of chunks synthesized, so they add at most that
+    fraction of extra requests. With a ConcurrencyController, a hedge also
+    takes a place under its limit, ahead of the chunks waiting for one, and
+    is not sent if the request it doubles finishes first: when the engine
+    throttles and the limit is cut, hedging backs off with it.
+
+    The same RequestHedging can be used for several conversions; its
+    counters (fired, won, over_budget, at_limit) add up.
+
+    Args:
+        percentile (float, optional): Latency percentile after which to hedge. Defaults to 95.
+        budget (float, optional): Largest ratio of hedges to chunks. Defaults to 0.05.
+        min_samples (int, optional): Chunks observed before hedging starts. Defaults to 20.
+        window (int, optional): Recent latencies the percentile is taken from. Defaults to 200.
+    """
+
+    def __init__(self, percentile=95.0, budget=0.05, min_samples=20, window=200):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.over_budget = 0
+        self.at_limit = 0
+
+    def hedged(self, synthesize, executor, controller=None):
+        """
+        Returns synthesize(chunk, lang) with hedging; requests run on `executor`.
+
+        The hedges are counted against `controller`, if given, whose limit
+        the wrapped function's callers are expected to be running under.
+        """
+        def hedged_synthesize(chunk, lang):
+            return self._run(synthesize, executor, controller, chunk, lang)
+        return hedged_synthesize
+
+    def _threshold(self, units):
+        """Seconds after which a chunk of `units` hundred characters is hedged, or None."""
+        with self._lock:
+            self.requests += 1
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return latencies[index] * units
+
+    def _take_budget(self):
+        with self._lock:
+            if self.fired + 1 > self.budget * self.requests:
+                self.over_budget += 1
+                return False
+            self.fired += 1
+            return True
+
+    def _may_hedge(self, controller, primary):
+        """Takes a hedge from the budget and a place under the controller's limit; returns whether it may be sent."""
+        if not self._take_budget():
+            return False
+        if controller is None or controller.reserve(primary.done):
+            return True
+        with self._lock:
+            self.fired -= 1
+            self.at_limit += 1
+        return False
+
+    def _run(self, synthesize, executor, controller, chunk, lang):
+        units = max(1.0, len(chunk) / 100)
+        threshold = self._threshold(units)
+        started = time.monotonic()
+        primary = executor.submit(synthesize, chunk, lang)
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self._may_hedge(controller, primary):
+            audio = primary.result()
+            self._observe(time.monotonic() - started, units)
+            return audio
+
+        hedge = executor.submit(synthesize, chunk, lang)
+        if controller is not None:
+            # Called once the hedge has finished or was cancelled before it started
+            hedge.add_done_callback(lambda future: controller.release())
+        racing = {primary, hedge}
+        winner = None
+        while racing and winner is None:
+            done, racing = wait(racing, return_when=FIRST_COMPLETED)
+            # A failed request does not end the race while the other one may still succeed
+            winner = next((future for future in done if future.exception() is None), None)
+        if winner is None:
+            return primary.result()  # both failed: raises the first request's error
+        for loser in racing:
+            loser.cancel()
+        if winner is hedge:
+            with self._lock:
+                self.won += 1
+        self._observe(time.monotonic() - started, units)
+        return winner.result()
+
+    def _observe(self, latency, units):
+        with self._lock:
+            self._latencies.append(latency / units)
+
+    def stats(self):
+        """
+        Returns the counters: chunks requested, hedges fired, hedges won,
+        hedges refused by the budget and hedges that found no place under the
+        controller's limit before the request they doubled finished.
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'fired': self.fired,
+                'won': self.won,
+                'over_budget': self.over_budget,
+                'at_limit': self.at_limit,
+            }
+
+def split_text_into_chunks(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """
+    Splits text into chunks for synthesis.
+
+    Every paragraph (non-blank line) starts a new chunk. Paragraphs longer
+    than max_chars are split between sentences, packing consecutive sentences
+    into chunks of at most max_chars; a sentence that is longer on its own is
+    split between words, and a word longer than max_chars is cut.
+
+    Args:
+        text (str or Document): The text to split.
+        max_chars (int, optional): Maximum chunk length. Defaults to DEFAULT_CHUNK_CHARS.
+
+    Yields:
+        str: The chunks, in order.
+    """
+    document = text if isinstance(text, Document) else Document.from_text(text)
+    for paragraph in document.paragraphs():
+        if len(paragraph) <= max_chars:
+            yield paragraph
+        else:
+            yield from _pack_long_paragraph(paragraph, max_chars)
+
+def count_chunks(document, max_chars=DEFAULT_CHUNK_CHARS):
+    """
+    Returns the number of chunks split_text_into_chunks yields for a Document.
+
+    The count comes from the document's paragraph table: a paragraph that
+    fits in max_chars is one chunk, and only the longer ones are split.
+    """
+    count = 0
+    for start, end in document.paragraph_spans():
+        if end - start <= max_chars:
+            count += 1
+        else:
+            count += sum(1 for _ in _pack_long_paragraph(document.text[start:end], max_chars))
+    return count
+
+def _pack_long_paragraph(paragraph, max_chars):
+    """Yields the chunks of a paragraph longer than max_chars: its sentences, packed up to max_chars."""
+    chunk = ''
+    for piece in _split_long_paragraph(paragraph, max_chars):
+        if chunk and len(chunk) + 1 + len(piece) > max_chars:
+            yield chunk
+            chunk = piece
+        else:
+            chunk = f"{chunk} {piece}" if chunk else piece
+    if chunk:
+        yield chunk
+
+def _split_long_paragraph(paragraph, max_chars):
+    """Yields the sentences of a paragraph, splitting those longer than max_chars between words."""
+    start = 0
+    sentence_ends = [match.end() for match in _SENTENCE_END_RE.finditer(paragraph)]
+    for end in sentence_ends + [len(paragraph)]:
+        sentence = paragraph[start:end].strip()
+        start = end
+        if len(sentence) <= max_chars:
+            if sentence:
+                yield sentence
+            continue
+        for word in sentence.split():
+            while len(word) > max_chars:
+                yield word[:max_chars]
+                word = word[max_chars:]
+            yield word
+
 if __name__ == '__main__':
     sample_text = "Hello, this is a test of the text-to-speech conversion using gTTS."
     output_filename = "test_audio.mp3"
@@ -1,8 +1,22 @@
+import hashlib
+import json
 import os
-from flask import Flask, render_template, request, send_from_directory, redirect, url_for
+import threading
+import time
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, jsonify, stream_with_context
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from parser import extract_text_from_epub, extract_text_from_pdf, extract_text_from_fb2
-from tts import convert_text_to_speech
+from document import ExtractionError
+from cache import ExtractionCache, DEFAULT_EXTRACTION_CACHE_BYTES
+from checkpoint import parts_dir_for
+from tts import convert_text_to_speech, AudioCache, RequestHedging, DEFAULT_AUDIO_CACHE_BYTES
+from backends import create_backend
+from jobs import (Job, JobQueue, JobStore, JobError, QueueFullError, DONE, FAILED, DEFAULT_JOB_WORKERS,
+                  DEFAULT_MAX_PENDING_JOBS)
+from streaming import PartialAudio, follow, parse_byte_range, wait_for_audio
+from serving import send_audio, file_etag
+from storage import StorageManager, DEFAULT_GENERATED_AUDIO_BYTES
 
 app = Flask(__name__)
 
@@ -10,19 +24,152 @@ UPLOAD_FOLDER = 'uploads'
 GENERATED_AUDIO_FOLDER = 'generated_audio'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['GENERATED_AUDIO_FOLDER'] = GENERATED_AUDIO_FOLDER
+# Worker processes for EPUB chapter and PDF page extraction (0 = one per CPU core)
+EXTRACTION_JOBS = 1
+app.config['EXTRACTION_JOBS'] = EXTRACTION_JOBS
+# Caches and the job database are kept in the app's instance folder (instance/ next to this file) rather than
+# the working directory
+# Extracted text of previous uploads, keyed by file content (None disables the cache)
+EXTRACTION_CACHE_DIR = os.path.join(app.instance_path, 'extraction_cache')
+app.config['EXTRACTION_CACHE_DIR'] = EXTRACTION_CACHE_DIR
+app.config['EXTRACTION_CACHE_MAX_BYTES'] = DEFAULT_EXTRACTION_CACHE_BYTES
+# Synthesized speech of previous uploads, per paragraph (None disables the cache)
+AUDIO_CACHE_DIR = os.path.join(app.instance_path, 'audio_cache')
+app.config['AUDIO_CACHE_DIR'] = AUDIO_CACHE_DIR
+app.config['AUDIO_CACHE_MAX_BYTES'] = DEFAULT_AUDIO_CACHE_BYTES
+# Text-to-speech engine ('gtts' or 'stub' for offline testing) and its options
+TTS_BACKEND = 'gtts'
+app.config['TTS_BACKEND'] = TTS_BACKEND
+app.config['TTS_BACKEND_OPTIONS'] = {}
+# Latency percentile after which a slow TTS request is hedged with a duplicate (None disables hedging)
+TTS_HEDGE_PERCENTILE = None
+app.config['TTS_HEDGE_PERCENTILE'] = TTS_HEDGE_PERCENTILE
+# Conversions run in the background at the same time, and uploads waiting for one before new ones are refused
+JOB_WORKERS = DEFAULT_JOB_WORKERS
+app.config['JOB_WORKERS'] = JOB_WORKERS
+MAX_PENDING_JOBS = DEFAULT_MAX_PENDING_JOBS
+app.config['MAX_PENDING_JOBS'] = MAX_PENDING_JOBS
+# SQLite database of the jobs, shared by all the worker processes serving the app (None keeps jobs in the
+# process that runs them, which then has to serve all their requests)
+JOB_DATABASE = os.path.join(app.instance_path, 'jobs.sqlite3')
+app.config['JOB_DATABASE'] = JOB_DATABASE
+# Internal nginx location that serves GENERATED_AUDIO_FOLDER (e.g. '/protected/audio/'); when set, finished
+# audio is handed to nginx with X-Accel-Redirect. USE_X_SENDFILE does the same for X-Sendfile servers.
+AUDIO_ACCEL_REDIRECT = None
+app.config['AUDIO_ACCEL_REDIRECT'] = AUDIO_ACCEL_REDIRECT
+# Size budget of GENERATED_AUDIO_FOLDER; the least recently downloaded audiobooks are deleted beyond it
+GENERATED_AUDIO_MAX_BYTES = DEFAULT_GENERATED_AUDIO_BYTES
+app.config['GENERATED_AUDIO_MAX_BYTES'] = GENERATED_AUDIO_MAX_BYTES
 
 # Create directories if they don't exist
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 if not os.path.exists(GENERATED_AUDIO_FOLDER):
     os.makedirs(GENERATED_AUDIO_FOLDER)
+os.makedirs(app.instance_path, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'epub', 'pdf', 'fb2'}
+# Seconds between comments sent on an idle event stream, so proxies keep it open
+SSE_KEEPALIVE_SECONDS = 15
+# Seconds a request for audio that is not written yet waits for it
+STREAM_WAIT_SECONDS = 30
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Returns the queue of conversion jobs, created on first use from the app's config."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            store = JobStore(app.config['JOB_DATABASE']) if app.config['JOB_DATABASE'] else None
+            _job_queue = JobQueue(app.config['JOB_WORKERS'], app.config['MAX_PENDING_JOBS'], store=store)
+        return _job_queue
+
+_audio_storage = None
+_audio_storage_lock = threading.Lock()
+
+def get_audio_storage():
+    """Returns the quota manager of the generated audio, created on first use from the app's config."""
+    global _audio_storage
+    with _audio_storage_lock:
+        if _audio_storage is None:
+            _audio_storage = StorageManager(app.config['GENERATED_AUDIO_FOLDER'],
+                                            app.config['GENERATED_AUDIO_MAX_BYTES'])
+        return _audio_storage
+
+def remove_upload(input_filepath):
+    try:
+        os.remove(input_filepath)
+    except FileNotFoundError:
+        pass
+
+def wants_json():
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def convert_upload(job, input_filepath, file_ext, extract, extract_options, cache, output_filepath, tts_options):
+    """
+    Extracts the text of an uploaded book and converts it; runs as a background job.
+
+    The upload is deleted afterwards, whether or not the conversion succeeded,
+    and the output, pinned in the audio storage since the upload, is added to
+    it and unpinned. A failed conversion's parts directory is deleted too;
+    only one interrupted by a crash or restart is kept to be resumed.
+    """
+    try:
+        return extract_and_convert(job, input_filepath, file_ext, extract, extract_options, cache,
+                                   output_filepath, tts_options)
+    except Exception:
+        get_audio_storage().remove(parts_dir_for(output_filepath))
+        raise
+    finally:
+        remove_upload(input_filepath)
+        get_audio_storage().unpin(output_filepath)
+
+def extract_and_convert(job, input_filepath, file_ext, extract, extract_options, cache, output_filepath,
+                        tts_options):
+    try:
+        if cache is not None:
+            document = cache.extract(input_filepath, file_ext, extract, **extract_options)
+        else:
+            document = extract(input_filepath, **extract_options)
+    except ExtractionError as e:
+        raise JobError(f"Error: {e}") from e
+
+    if not document:
+        raise JobError("No text content found in the uploaded file.")
+    job.report('extracted', {'characters': len(document.text), 'chapters': len(document.chapters)})
+
+    # The ETA is extrapolated from the chunks synthesized so far in this run, not those resumed
+    first = None
+    def on_progress(progress):
+        nonlocal first
+        if first is None:
+            first = (progress.chunks_done, time.monotonic())
+        eta = None
+        chunks_synthesized = progress.chunks_done - first[0]
+        if chunks_synthesized > 0:
+            seconds_per_chunk = (time.monotonic() - first[1]) / chunks_synthesized
+            eta = round(seconds_per_chunk * (progress.chunks_total - progress.chunks_done), 1)
+        job.report('progress', {**progress._asdict(), 'eta': eta})
+
+    # Always resume: a conversion interrupted by a crash or restart continues where it
+    # stopped when it is run again for the same output, and the checkpoint is discarded
+    # if the book differs.
+    success_tts, _ = convert_text_to_speech(document, output_filepath, resume=True, on_progress=on_progress,
+                                            **tts_options)
+    if not success_tts:
+        raise JobError("Error during text-to-speech conversion. Please ensure the text is valid and try again.")
+    get_audio_storage().add(output_filepath)
+    # Hash the file now rather than on its first download
+    file_etag(output_filepath)
+    # The name the audiobook is downloaded as
+    return job.name.rsplit('.', 1)[0] + '.mp3'
+
 @app.route('/', endpoint='upload_page')
 def index():
     return render_template('index.html')
@@ -35,57 +182,214 @@ def upload_file():
     if file.filename == '':
         return redirect(url_for('show_result', success=False, error_message="No selected file"))
     if file and allowed_file(file.filename):
+        # Uploads are named after the job, so uploads of books with the same name never collide,
+        # whichever process serves them
         filename = secure_filename(file.filename)
-        input_filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(input_filepath)
-
         file_ext = filename.rsplit('.', 1)[1].lower()
-        extracted_text = None
-        error_message = None # Initialize error_message
+        job = Job(filename)
+        input_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f'{job.id}.{file_ext}')
+        file.save(input_filepath)
 
         if file_ext == 'epub':
-            extracted_text = extract_text_from_epub(input_filepath)
+            extract, options = extract_text_from_epub, {'jobs': app.config['EXTRACTION_JOBS']}
         elif file_ext == 'pdf':
-            extracted_text = extract_text_from_pdf(input_filepath)
-        elif file_ext == 'fb2':
-            extracted_text = extract_text_from_fb2(input_filepath)
-        
-        if not extracted_text or extracted_text.strip() == "" or extracted_text.startswith("Error:"):
-            if extracted_text and extracted_text.startswith("Error:"):
-                 error_message = extracted_text # Use the specific error from parser
-            elif not extracted_text or extracted_text.strip() == "":
-                 error_message = "No text content found in the uploaded file."
-            else:
-                 error_message = "Error during text extraction."
-            return redirect(url_for('show_result', success=False, error_message=error_message))
-
-        output_filename = filename.rsplit('.', 1)[0] + '.mp3'
-        output_filepath = os.path.join(app.config['GENERATED_AUDIO_FOLDER'], output_filename)
-        
-        # Assuming convert_text_to_speech returns True on success, False on failure
-        # and potentially logs errors or returns an error message.
-        # For now, we'll stick to a generic TTS error if it returns False.
-        success_tts = convert_text_to_speech(extracted_text, output_filepath, lang='en')
-        if success_tts:
-            return redirect(url_for('show_result', success=True, filename=output_filename))
+            extract, options = extract_text_from_pdf, {'jobs': app.config['EXTRACTION_JOBS']}
         else:
-            error_message = "Error during text-to-speech conversion. Please ensure the text is valid and try again."
+            extract, options = extract_text_from_fb2, {}
+
+        cache = None
+        if app.config['EXTRACTION_CACHE_DIR']:
+            try:
+                cache = ExtractionCache(app.config['EXTRACTION_CACHE_DIR'], app.config['EXTRACTION_CACHE_MAX_BYTES'])
+            except OSError as e:
+                app.logger.warning("Extracting without the cache: %s", e)
+
+        backend = create_backend(app.config['TTS_BACKEND'], **app.config['TTS_BACKEND_OPTIONS'])
+        tts_options = {'lang': 'en', 'backend': backend}
+        if app.config['AUDIO_CACHE_DIR']:
+            try:
+                tts_options['cache'] = AudioCache(app.config['AUDIO_CACHE_DIR'], app.config['AUDIO_CACHE_MAX_BYTES'])
+            except OSError as e:
+                app.logger.warning("Synthesizing without the audio cache: %s", e)
+        if app.config['TTS_HEDGE_PERCENTILE']:
+            tts_options['hedging'] = RequestHedging(app.config['TTS_HEDGE_PERCENTILE'])
+
+        # The conversion runs in the background; the client follows it at /jobs/<id>. An upload of a
+        # book that is already being converted the same way follows that conversion instead.
+        job.key = conversion_key(input_filepath, file_ext, tts_options['lang'], backend)
+        # The audiobook is named after what it is converted from, so the same book uploaded again after a
+        # conversion was interrupted resumes from its checkpoint
+        job.output = os.path.join(app.config['GENERATED_AUDIO_FOLDER'], f'{job.key}.mp3')
+        get_audio_storage().pin(job.output)
+        try:
+            queued = get_job_queue().submit(job, convert_upload, input_filepath, file_ext, extract, options, cache,
+                                            job.output, tts_options)
+        except QueueFullError:
+            get_audio_storage().unpin(job.output)
+            remove_upload(input_filepath)
+            error_message = "The server is busy converting other books. Please try again in a few minutes."
+            if wants_json():
+                return jsonify(error=error_message), 503, {'Retry-After': '60'}
             return redirect(url_for('show_result', success=False, error_message=error_message))
+        if queued is not job:
+            get_audio_storage().unpin(job.output)
+            remove_upload(input_filepath)
+            job = queued
+        if wants_json():
+            return jsonify(describe_job(job)), 202, {'Location': url_for('job_status', job_id=job.id)}
+        return redirect(url_for('show_result', job_id=job.id))
     else:
         file_ext_provided = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else "none"
         error_message = f"Unsupported file type: '.{file_ext_provided}'. Supported types are EPUB, PDF, and FB2."
         return redirect(url_for('show_result', success=False, error_message=error_message))
 
+def conversion_key(input_filepath, file_ext, lang, backend):
+    """Identifies the audiobook an upload is converted to: the book's content, its language and the voice."""
+    identity = [ExtractionCache.key(input_filepath, file_ext), lang, backend.name, backend.voice,
+                backend.capabilities.max_chunk_chars]
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+def audio_id_of(job):
+    """Returns the name of a job's audiobook in GENERATED_AUDIO_FOLDER, without its extension."""
+    return os.path.splitext(os.path.basename(job.output))[0]
+
+def describe_job(job):
+    status = job.to_dict()
+    if job.state == DONE:
+        status['download_url'] = url_for('download_file', audio_id=audio_id_of(job), filename=job.result)
+    return status
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    return jsonify(describe_job(job))
+
+def server_sent_event(name, data, event_id):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    Streams a job's events as Server-Sent Events until it is finished.
+
+    A new watcher first gets a 'state' event with the job's current status;
+    one that reconnects with Last-Event-ID gets the events it missed. Then
+    come 'extracted', 'progress' (chunks done and total, bytes written,
+    ETA in seconds) and 'state' events, the last of which reports the job
+    done, with its download URL, or failed.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    try:
+        after = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        after = 0
+
+    def stream():
+        nonlocal after
+        yield "retry: 3000\n\n"
+        if after == 0:
+            after = job.events.last_id
+            yield server_sent_event('state', describe_job(job), after)
+        while True:
+            events = job.events.wait(after, SSE_KEEPALIVE_SECONDS)
+            if not events:
+                if job.events.closed:
+                    return
+                yield ": keepalive\n\n"
+                continue
+            for event_id, name, data in events:
+                if name == 'state' and data['state'] == DONE:
+                    data = describe_job(job)
+                yield server_sent_event(name, data, event_id)
+                after = event_id
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/audio')
+def stream_audio(job_id):
+    """
+    Serves the audio of a job, including while it is being converted.
+
+    A finished job's file is served like a download. While the job runs, a
+    request without a Range (or for 'bytes=0-') gets the audio written so far
+    and then the rest as it is written, in one response that lasts until the
+    conversion ends. A single byte range gets the part of it that is written,
+    with an unknown complete length ('bytes 100-999/*'), after waiting up to
+    STREAM_WAIT_SECONDS for its first byte if necessary.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    if job.state == FAILED:
+        return jsonify(error=job.message), 410
+    byte_range = parse_byte_range(request.headers.get('Range'))
+    start = byte_range[0] if byte_range else 0
+    available = wait_for_audio(job, start, STREAM_WAIT_SECONDS)
+    audio = None
+    if job.state != DONE:
+        try:
+            audio = PartialAudio(job.output)
+        except FileNotFoundError:
+            pass
+    if audio is None:
+        # The conversion finished (and its partial file was renamed) or has not written anything yet
+        if job.state == DONE:
+            return send_generated_audio(audio_id_of(job), job.result, as_attachment=False)
+        if job.state == FAILED:
+            return jsonify(error=job.message), 410
+        return jsonify(error="No audio has been generated yet."), 503, {'Retry-After': '5'}
+    if available <= start:
+        audio.close()
+        return Response(status=416, headers={'Content-Range': 'bytes */*'})
+
+    headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+    if byte_range and byte_range != (0, None):
+        end = available - 1 if byte_range[1] is None else min(byte_range[1], available - 1)
+        headers['Content-Range'] = f'bytes {start}-{end}/*'
+        headers['Content-Length'] = str(end - start + 1)
+        response = Response(follow(job, audio, start, end, STREAM_WAIT_SECONDS), status=206,
+                            mimetype='audio/mpeg', headers=headers)
+    else:
+        response = Response(follow(job, audio, 0, None, STREAM_WAIT_SECONDS), mimetype='audio/mpeg',
+                            headers=headers)
+    response.call_on_close(audio.close)
+    return response
+
 @app.route('/result')
 def show_result():
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return render_template('result.html', success=False, error_message="Unknown conversion job.")
+        if not job.is_finished:
+            return render_template('result.html', job=job)
+        return render_template('result.html', job=job, success=job.state == DONE,
+                               download_url=describe_job(job).get('download_url'), error_message=job.message)
     success = request.args.get('success') == 'True'
-    filename = request.args.get('filename')
     error_message = request.args.get('error_message')
-    return render_template('result.html', success=success, filename=filename, error_message=error_message)
+    return render_template('result.html', success=success, error_message=error_message)
+
+@app.route('/download/<audio_id>/<filename>')
+def download_file(audio_id, filename):
+    """
+    Serves an audiobook as `filename`; any process can, and after its job is
+    forgotten, as the URL names the file rather than the job.
+    """
+    return send_generated_audio(audio_id, filename, as_attachment=True)
 
-@app.route('/download/<filename>')
-def download_file(filename):
-    return send_from_directory(app.config['GENERATED_AUDIO_FOLDER'], filename, as_attachment=True)
+def send_generated_audio(audio_id, download_name, as_attachment):
+    filepath = safe_join(app.config['GENERATED_AUDIO_FOLDER'], f'{audio_id}.mp3')
+    if filepath is None or not os.path.isfile(filepath):
+        abort(404)
+    get_audio_storage().touch(filepath)
+    return send_audio(filepath, download_name=secure_filename(download_name) or None, as_attachment=as_attachment,
+                      accel_redirect=app.config['AUDIO_ACCEL_REDIRECT'])
 
 if __name__ == '__main__':
     app.run(debug=True)